@@ -1,5 +1,10 @@
 import os
+import time
 import logging
+
+# Marca o início do import para medir o custo de cold start
+_IMPORT_STARTED = time.perf_counter()
+
 from dotenv import load_dotenv
 
 # Carrega variáveis de ambiente ANTES de qualquer outra coisa
@@ -30,7 +35,7 @@ logging.getLogger('urllib3').setLevel(logging.WARNING)
 logging.getLogger('werkzeug').setLevel(logging.INFO)
 
 # Agora importa as bibliotecas
-from flask import Flask, jsonify
+from flask import Flask, jsonify, g
 from flask_cors import CORS
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, OperationFailure
@@ -51,6 +56,9 @@ try:
 except ImportError:
     HAS_LIMITER = False
 
+# Tempo gasto importando Flask, PyMongo e demais dependências do app
+_IMPORT_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+
 def _should_use_tls(uri: str) -> bool:
     """Define se deve usar TLS/CA (Atlas / SRV / URIs com tls=true)."""
     if not uri:
@@ -65,6 +73,7 @@ def _should_use_tls(uri: str) -> bool:
 
 def create_app():
     """Factory function para criar a aplicação Flask"""
+    create_started = time.perf_counter()
     
     # Carrega variáveis de ambiente
     load_dotenv()
@@ -72,6 +81,14 @@ def create_app():
     # Cria a instância Flask
     app = Flask(__name__)
     
+    # Métricas de inicialização (expostas em /api/health)
+    app.startup_metrics = {
+        'imports_ms': _IMPORT_MS,
+        'blueprints_ms': {},
+        'create_app_ms': None,
+        'first_request_ms': None,
+    }
+    
     # Configurações básicas
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
     app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16777216))  # 16MB
@@ -82,6 +99,14 @@ def create_app():
     # Configura o logger da aplicação (logging já configurado no topo do módulo)
     app.logger.setLevel(_log_level)
     
+    # Atrás de proxy (ex.: Vercel) o IP do cliente vem do X-Forwarded-For: remote_addr
+    # passa a ser o IP real para o rate limiting e o throttling de login
+    trusted_proxies = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+    if trusted_proxies > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+        app.logger.info(f"✅ X-Forwarded-For confiável ({trusted_proxies} proxy(s))")
+    
     # Compressão de resposta (gzip)
     if HAS_COMPRESS:
         Compress(app)
@@ -90,14 +115,16 @@ def create_app():
     # Rate Limiting para endpoints sensíveis
     limiter = None
     if HAS_LIMITER:
+        # Storage compartilhado entre workers via RATELIMIT_STORAGE_URI (padrão: memória do processo)
+        from .services.rate_limiting import limiter_options
+        limiter_config = limiter_options(app)
         limiter = Limiter(
             key_func=get_remote_address,
             app=app,
-            default_limits=["200 per day", "50 per hour"],
-            storage_uri="memory://",
+            **limiter_config,
         )
         app.limiter = limiter
-        app.logger.info("✅ Rate limiting habilitado")
+        app.logger.info(f"✅ Rate limiting habilitado ({limiter_config['storage_uri']})")
     else:
         app.limiter = None
     
@@ -211,6 +238,47 @@ def create_app():
     else:
         print("⚠️  MONGODB_URI não configurado - funcionando sem banco")
     
+    # Lista de revogação de tokens JWT (logout, troca de senha)
+    from .services.token_revocation import init_token_revocation
+    init_token_revocation(app)
+    
+    # Throttling de login (falhas por conta e por IP, com lockout exponencial)
+    from .services.login_throttle import init_login_throttle
+    init_login_throttle(app)
+    
+    # Reconciliação periódica do resumo materializado de usuários
+    from .services.user_stats import init_user_stats
+    init_user_stats(app)
+    
+    # Arquivamento periódico dos produtos vendidos
+    from .services.product_archive import init_product_archive
+    init_product_archive(app)
+    
+    # Índice de autocomplete em memória (carregado agora, reconstruído periodicamente)
+    from .services.autocomplete import init_autocomplete
+    init_autocomplete(app)
+    
+    # Remoções de imagens em lote e GC de imagens órfãs
+    from .services.storage_maintenance import init_storage_maintenance
+    init_storage_maintenance(app)
+    
+    # Templates de email compilados uma única vez
+    try:
+        from .services.email_service import email_templates
+        print(f"✅ {len(email_templates.load())} templates de email carregados")
+    except Exception as e:
+        print(f"⚠️  Erro ao carregar templates de email: {e}")
+    
+    # Fila de emails transacionais (envio em segundo plano)
+    from .services.mail_queue import init_mail_queue
+    if init_mail_queue(app):
+        print("✅ Fila de emails em segundo plano ativa")
+    
+    # Fila de processamento de imagens (opcional, IMAGE_QUEUE_ENABLED)
+    from .services.image_queue import init_image_queue
+    if init_image_queue(app):
+        print("✅ Fila de imagens em segundo plano ativa")
+    
     # Rota raiz
     @app.route('/', methods=['GET'])
     def index():
@@ -248,17 +316,27 @@ def create_app():
     
     for module_path, blueprint_name, url_prefix in blueprints_to_register:
         try:
+            blueprint_started = time.perf_counter()
             module = __import__(module_path, fromlist=[blueprint_name])
             blueprint = getattr(module, blueprint_name)
             app.register_blueprint(blueprint, url_prefix=url_prefix)
-            print(f"✅ {blueprint_name} registrado em {url_prefix}")
+            elapsed_ms = round((time.perf_counter() - blueprint_started) * 1000, 1)
+            app.startup_metrics['blueprints_ms'][blueprint_name] = elapsed_ms
+            print(f"✅ {blueprint_name} registrado em {url_prefix} ({elapsed_ms} ms)")
         except ImportError as e:
             print(f"⚠️  Erro ao importar {module_path}: {e}")
         except AttributeError as e:
             print(f"⚠️  Blueprint {blueprint_name} não encontrado em {module_path}: {e}")
         except Exception as e:
             print(f"❌ Erro inesperado ao registrar {blueprint_name}: {e}")
-    
+
+    # Limites por blueprint (RATELIMIT_<BLUEPRINT>)
+    if limiter is not None:
+        from .services.rate_limiting import apply_blueprint_limits
+        blueprint_limits = apply_blueprint_limits(limiter, app)
+        if blueprint_limits:
+            print(f"✅ Limites por blueprint: {', '.join(f'{k}={v}' for k, v in blueprint_limits.items())}")
+
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -306,6 +384,30 @@ def create_app():
             'max_size': '16MB'
         }), 413
     
+    # Comandos de manutenção (flask <comando>)
+    from .cli import register_cli
+    register_cli(app)
+    
+    # Latência da primeira requisição (inclui inicializações sob demanda)
+    @app.before_request
+    def start_first_request_timer():
+        if app.startup_metrics['first_request_ms'] is None:
+            g.request_started = time.perf_counter()
+    
+    @app.after_request
+    def record_first_request(response):
+        started = g.pop('request_started', None)
+        if started is not None and app.startup_metrics['first_request_ms'] is None:
+            app.startup_metrics['first_request_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            app.logger.info(f"⏱️  Primeira requisição: {app.startup_metrics['first_request_ms']} ms")
+        return response
+    
+    app.startup_metrics['create_app_ms'] = round((time.perf_counter() - create_started) * 1000, 1)
+    slowest = sorted(app.startup_metrics['blueprints_ms'].items(), key=lambda item: item[1], reverse=True)[:3]
+    print(
+        f"⏱️  Imports: {_IMPORT_MS} ms | create_app: {app.startup_metrics['create_app_ms']} ms | "
+        f"blueprints mais lentos: {', '.join(f'{name}={ms} ms' for name, ms in slowest)}"
+    )
     print("🚀 Aplicação Flask criada com sucesso!")
     
     return app
\ No newline at end of file
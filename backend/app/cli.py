@@ -0,0 +1,76 @@
+"""
+Comandos de manutenção da aplicação (Flask CLI).
+
+Uso:
+    flask --app index storage-gc            # relatório (dry-run)
+    flask --app index storage-gc --apply    # remove as imagens órfãs
+    flask --app index user-stats            # recalcula o resumo de usuários
+    flask --app index favorite-counts       # recalcula favorite_count dos produtos
+    flask --app index archive-sold          # move vendidos antigos para products_archive
+"""
+import json
+from datetime import timedelta
+
+import click
+from flask import current_app
+
+
+def register_cli(app):
+    """Registra os comandos de manutenção na aplicação."""
+
+    @app.cli.command("storage-gc")
+    @click.option("--apply", "apply_changes", is_flag=True, help="Remove as imagens órfãs (padrão: apenas relatório).")
+    @click.option("--grace-minutes", default=60, show_default=True, help="Ignora objetos mais novos que isso.")
+    def storage_gc_command(apply_changes, grace_minutes):
+        """Procura (e opcionalmente remove) imagens sem produto associado."""
+        from .services.storage_maintenance import collect_orphans
+
+        if current_app.db is None:
+            raise click.ClickException("banco de dados indisponível")
+        if not current_app.deletion_queue.storage.is_available():
+            raise click.ClickException("serviço de storage indisponível")
+
+        report = collect_orphans(
+            current_app.db,
+            current_app.deletion_queue.storage,
+            dry_run=not apply_changes,
+            grace=timedelta(minutes=grace_minutes),
+        )
+        click.echo(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+
+    @app.cli.command("user-stats")
+    def user_stats_command():
+        """Recalcula o resumo materializado de usuários e mostra a divergência corrigida."""
+        from .services.user_stats import reconcile_user_stats
+
+        if current_app.db is None:
+            raise click.ClickException("banco de dados indisponível")
+
+        report = reconcile_user_stats(current_app.db)
+        click.echo(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+
+    @app.cli.command("favorite-counts")
+    @click.option("--batch-size", default=500, show_default=True, help="Atualizações por bulk_write.")
+    def favorite_counts_command(batch_size):
+        """Recalcula o contador de favoritos (favorite_count) de todos os produtos."""
+        from .models.favorite_model import recount_favorite_counts
+
+        if current_app.db is None:
+            raise click.ClickException("banco de dados indisponível")
+
+        report = recount_favorite_counts(current_app.db, batch_size=batch_size)
+        click.echo(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+
+    @app.cli.command("archive-sold")
+    @click.option("--days", default=None, type=int, help="Dias desde a venda (padrão: PRODUCT_ARCHIVE_AFTER_DAYS).")
+    @click.option("--batch-size", default=500, show_default=True, help="Produtos movidos por lote.")
+    def archive_sold_command(days, batch_size):
+        """Move os produtos vendidos para a coleção products_archive."""
+        from .services.product_archive import archive_sold_products, DEFAULT_ARCHIVE_AFTER
+
+        if current_app.db is None:
+            raise click.ClickException("banco de dados indisponível")
+
+        older_than = DEFAULT_ARCHIVE_AFTER if days is None else timedelta(days=days)
+        report = archive_sold_products(current_app.db, older_than=older_than, batch_size=batch_size)
+        click.echo(json.dumps(report, indent=2, ensure_ascii=False, default=str))
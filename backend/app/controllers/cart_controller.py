@@ -11,6 +11,7 @@ from ..models.cart_model import (
     normalize_cart,
     validate_cart_item,
 )
+from ..services.image_urls import resolve_product_images
 
 
 def get_user_cart(user_id: int):
@@ -37,7 +38,7 @@ def get_user_cart(user_id: int):
         product_ids = [item.get("product_id") for item in cart.get("items", [])]
         
         # Uma única query para todos os produtos
-        products = list(products_coll.find(
+        products = resolve_product_images(products_coll.find(
             {"id": {"$in": product_ids}},
             {"_id": 0, "id": 1, "titulo": 1, "preco": 1, "imagem": 1, "status": 1, "categoria": 1}
         ))
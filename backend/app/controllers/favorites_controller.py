@@ -5,20 +5,28 @@ Endpoints:
 - POST /favorites - Adiciona produto aos favoritos
 - DELETE /favorites/<product_id> - Remove produto dos favoritos
 - GET /favorites/check/<product_id> - Verifica se produto está favoritado
+- POST /favorites/check - Verifica vários produtos de uma vez
 """
 from flask import request, jsonify, current_app
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from functools import wraps
 
 from ..models.favorite_model import (
     add_favorite,
     remove_favorite,
-    get_user_favorites,
+    toggle_favorite_state,
+    get_user_favorites_page,
+    count_user_favorites,
     is_favorited,
+    get_favorited_ids,
     validate_favorite_payload,
+    MAX_CHECK_IDS,
+    DEFAULT_PAGE_SIZE,
     ensure_indexes
 )
-from ..models.product_model import get_collection as get_products_collection
+from ..services.image_urls import resolve_product_images
+from ..services.jwt_service import authenticate_request
+from ..utils.cache import product_exists
 
 
 def _serialize(doc: Dict[str, Any]) -> Dict[str, Any]:
@@ -46,13 +54,30 @@ def require_auth(f):
     return decorated_function
 
 
+def current_favorites_user() -> Optional[str]:
+    """
+    Usuário dos favoritos na requisição atual: header X-User-Id ou, sem ele,
+    o usuário do token JWT (se houver).
+    """
+    user_id = request.headers.get('X-User-Id')
+    if user_id:
+        return user_id
+    payload, _ = authenticate_request()
+    if payload and payload.get('sub') is not None:
+        return str(payload['sub'])
+    return None
+
+
 def list_user_favorites(user_id: str):
     """
-    Lista todos os favoritos do usuário com detalhes dos produtos.
+    Lista os favoritos do usuário, paginados, com os dados de card dos produtos.
     
-    GET /favorites
+    GET /favorites?page_size=20&cursor=<next_cursor>&lookup=1
     Headers: X-User-Id: <user_id>
     
+    - cursor: ``next_cursor`` da página anterior (omitido na primeira página)
+    - lookup=1: junta os produtos no banco com uma agregação ``$lookup``
+    
     Response:
     {
         "favorites": [
@@ -61,49 +86,44 @@ def list_user_favorites(user_id: str):
                 "user_id": "...",
                 "product_id": 1,
                 "created_at": "...",
-                "product": { ... }  // Detalhes do produto
+                "product": { ... }  // Campos do card do produto (null se removido)
             }
         ],
-        "total": 5
+        "total": 5,
+        "next_cursor": "..."  // null na última página
     }
     """
     db = current_app.db
     if db is None:
         return jsonify(message="Banco de dados indisponível"), 503
     
-    # Buscar favoritos
-    success, error, favorites = get_user_favorites(db, user_id)
+    try:
+        page_size = int(request.args.get("page_size", DEFAULT_PAGE_SIZE) or DEFAULT_PAGE_SIZE)
+        success, error, favorites, next_cursor = get_user_favorites_page(
+            db,
+            user_id,
+            page_size=page_size,
+            cursor=request.args.get("cursor") or None,
+            use_lookup=request.args.get("lookup", "").lower() in ("1", "true"),
+        )
+    except ValueError as e:
+        return jsonify(message=f"Parâmetros inválidos: {e}"), 400
     
     if not success:
         return jsonify(message=error), 500
     
-    # Buscar detalhes dos produtos
-    products_coll = get_products_collection(db)
-    product_ids = [fav['product_id'] for fav in favorites]
-    
-    products = list(products_coll.find({"id": {"$in": product_ids}}))
-    products_dict = {p['id']: p for p in products}
-    
-    # Combinar favoritos com produtos
+    # Resolve as imagens de todos os produtos da página em lote
+    products = resolve_product_images(fav['product'] for fav in favorites)
     result = []
-    for fav in favorites:
+    for fav, product in zip(favorites, products):
         fav_data = _serialize(fav)
-        product = products_dict.get(fav['product_id'])
-        
-        if product:
-            # Remover _id do produto
-            product_data = dict(product)
-            product_data.pop('_id', None)
-            fav_data['product'] = product_data
-        else:
-            # Produto não existe mais, mas mantém o favorito
-            fav_data['product'] = None
-        
+        fav_data['product'] = product
         result.append(fav_data)
     
     return jsonify(
         favorites=result,
-        total=len(result)
+        total=count_user_favorites(db, user_id),
+        next_cursor=next_cursor
     ), 200
 
 
@@ -136,11 +156,8 @@ def add_to_favorites(user_id: str):
     
     product_id = payload['product_id']
     
-    # Verificar se produto existe
-    products_coll = get_products_collection(db)
-    product = products_coll.find_one({"id": product_id})
-    
-    if not product:
+    # Verificar se produto existe (conjunto de IDs em cache)
+    if not product_exists(db, product_id):
         return jsonify(message="Produto não encontrado"), 404
     
     # Adicionar favorito
@@ -206,6 +223,39 @@ def check_favorite(user_id: str, product_id: int):
     return jsonify(is_favorited=favorited), 200
 
 
+def check_favorites_batch(user_id: str):
+    """
+    Verifica vários produtos de uma vez (ex.: ícones de uma grade de produtos).
+    
+    POST /favorites/check
+    Headers: X-User-Id: <user_id>
+    Body: { "product_ids": [1, 2, 3] }
+    
+    Response:
+    {
+        "favorites": { "1": true, "2": false, "3": true }
+    }
+    """
+    db = current_app.db
+    if db is None:
+        return jsonify(message="Banco de dados indisponível"), 503
+    
+    payload = request.get_json(silent=True)
+    product_ids = payload.get('product_ids') if isinstance(payload, dict) else None
+    if not isinstance(product_ids, list):
+        return jsonify(message="product_ids deve ser uma lista"), 400
+    if len(product_ids) > MAX_CHECK_IDS:
+        return jsonify(message=f"Máximo de {MAX_CHECK_IDS} produtos por verificação"), 400
+    if not all(isinstance(pid, int) and not isinstance(pid, bool) for pid in product_ids):
+        return jsonify(message="product_ids deve conter apenas números inteiros"), 400
+    
+    success, error, favorited = get_favorited_ids(db, user_id, product_ids)
+    if not success:
+        return jsonify(message=error), 500
+    
+    return jsonify(favorites={str(pid): pid in favorited for pid in product_ids}), 200
+
+
 def toggle_favorite(user_id: str):
     """
     Alterna o estado de favorito (adiciona se não existe, remove se existe).
@@ -235,34 +285,22 @@ def toggle_favorite(user_id: str):
     
     product_id = payload['product_id']
     
-    # Verificar se produto existe
-    products_coll = get_products_collection(db)
-    product = products_coll.find_one({"id": product_id})
-    
-    if not product:
+    # Verificar se produto existe (conjunto de IDs em cache)
+    if not product_exists(db, product_id):
         return jsonify(message="Produto não encontrado"), 404
     
-    # Verificar se já está favoritado
-    favorited = is_favorited(db, user_id, product_id)
+    success, error, favorited, favorite = toggle_favorite_state(db, user_id, product_id)
+    if not success:
+        return jsonify(message=error), 500
     
-    if favorited:
-        # Remover
-        success, error = remove_favorite(db, user_id, product_id)
-        if not success:
-            return jsonify(message=error), 500
-        
+    if not favorited:
         return jsonify(
             message="Produto removido dos favoritos",
             is_favorited=False
         ), 200
-    else:
-        # Adicionar
-        success, error, favorite = add_favorite(db, user_id, product_id)
-        if not success:
-            return jsonify(message=error), 500
-        
-        return jsonify(
-            message="Produto adicionado aos favoritos",
-            is_favorited=True,
-            favorite=_serialize(favorite)
-        ), 201
+    
+    return jsonify(
+        message="Produto adicionado aos favoritos",
+        is_favorited=True,
+        favorite=_serialize(favorite)
+    ), 201
@@ -1,10 +1,13 @@
 """
 Controller para gerenciamento de imagens de produtos
-Integra com Supabase Storage
+Integra com o backend de storage configurado (STORAGE_BACKEND)
 """
 from flask import request, jsonify, current_app
 from werkzeug.datastructures import FileStorage
-from app.services.supabase_storage import storage_service
+from datetime import timedelta
+from app.services.storage import storage_service
+from app.services.storage_maintenance import collect_orphans
+from app.services.image_urls import resolve_image_urls
 from typing import Tuple, Any
 
 def upload_product_image() -> Tuple[Any, int]:
@@ -39,9 +42,12 @@ def upload_product_image() -> Tuple[Any, int]:
         success, result = storage_service.upload_image(file, product_id)
         
         if success:
+            # image_url é o caminho no storage (valor salvo no produto);
+            # preview_url é a URL assinada para exibição imediata
             return jsonify({
                 "message": "Imagem enviada com sucesso",
                 "image_url": result,
+                "preview_url": resolve_image_urls([result]).get(result, result),
                 "product_id": product_id
             }), 201
         else:
@@ -195,3 +201,80 @@ def upload_multiple_images() -> Tuple[Any, int]:
     except Exception as e:
         current_app.logger.error(f"Erro no upload múltiplo: {e}")
         return jsonify({"error": "Erro interno no servidor"}), 500
+
+# Imagem exibida enquanto o processamento em segundo plano não termina
+PLACEHOLDER_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="480" height="480" viewBox="0 0 480 480">'
+    '<rect width="480" height="480" fill="#f3f0eb"/>'
+    '<text x="240" y="248" font-family="sans-serif" font-size="22" fill="#9a8f80" '
+    'text-anchor="middle">Processando imagem...</text>'
+    '</svg>'
+)
+
+def get_image_job(job_id: str) -> Tuple[Any, int]:
+    """
+    Consulta o estado de um job de processamento de imagem
+    GET /api/images/jobs/<job_id>
+    """
+    queue = getattr(current_app, 'image_queue', None)
+    if queue is None:
+        return jsonify({"error": "Fila de imagens desabilitada"}), 404
+    
+    try:
+        job = queue.get_status(job_id)
+        if not job:
+            return jsonify({"error": "Job não encontrado"}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        current_app.logger.error(f"Erro ao consultar job de imagem: {e}")
+        return jsonify({"error": "Erro interno no servidor"}), 500
+
+def image_placeholder():
+    """
+    Placeholder usado por produtos com imagem em processamento
+    GET /api/images/placeholder
+    """
+    response = current_app.response_class(PLACEHOLDER_SVG, mimetype="image/svg+xml")
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    return response
+
+def serve_image_file(path: str):
+    """
+    Serve um arquivo dos backends local/memória (suporta Range e cache condicional)
+    GET /api/images/files/<path>
+    """
+    response = storage_service.send(path)
+    if response is None:
+        return jsonify({"error": "Imagem não encontrada"}), 404
+    return response
+
+def run_storage_gc() -> Tuple[Any, int]:
+    """
+    Procura imagens órfãs (sem produto associado) e opcionalmente as remove
+    POST /api/images/gc
+
+    JSON Body (opcional):
+    - dry_run: apenas relatório (padrão: true)
+    - grace_minutes: ignora objetos mais novos que isso (padrão: 60)
+    """
+    db = current_app.db
+    if db is None:
+        return jsonify({"error": "banco de dados indisponível"}), 503
+
+    if not storage_service.is_available():
+        return jsonify({"error": "Serviço de storage indisponível"}), 503
+
+    payload = request.get_json(silent=True) or {}
+    dry_run = payload.get("dry_run", True) is not False
+    try:
+        grace_minutes = int(payload.get("grace_minutes", 60))
+    except (TypeError, ValueError):
+        return jsonify({"error": "grace_minutes deve ser um número"}), 400
+
+    try:
+        report = collect_orphans(db, storage_service, dry_run=dry_run,
+                                 grace=timedelta(minutes=max(grace_minutes, 0)))
+        return jsonify(report), 200
+    except Exception as e:
+        current_app.logger.error(f"Erro no GC de imagens: {e}")
+        return jsonify({"error": "Erro interno no servidor"}), 500
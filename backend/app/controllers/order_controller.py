@@ -3,7 +3,8 @@ Controller para gerenciamento de pedidos.
 """
 from flask import jsonify, request, current_app
 from datetime import datetime
-from typing import Dict, Any
+from pymongo import UpdateOne
+from typing import Dict, Any, List
 
 from ..models.order_model import (
     get_collection,
@@ -13,6 +14,28 @@ from ..models.order_model import (
     ORDER_STATUS,
 )
 from ..models.cart_model import get_collection as get_cart_collection
+from ..services.image_urls import resolve_product_images
+from ..services.email_service import send_order_status_notifications
+from ..utils.cache import invalidate_search_cache
+from ..services.product_archive import restore_archived_product
+from ..services.autocomplete import remove_product as remove_suggestions, refresh_product as refresh_suggestions
+
+# Máximo de pedidos por atualização de status em lote
+BULK_STATUS_MAX_ORDERS = 500
+
+
+def _serialize_orders(orders) -> list:
+    """Normaliza pedidos resolvendo as imagens de todos os itens em um único lote."""
+    normalized = [normalize_order(order) for order in orders]
+    items = resolve_product_images(
+        item for order in normalized for item in order.get("items", [])
+    )
+    position = 0
+    for order in normalized:
+        count = len(order.get("items", []))
+        order["items"] = items[position:position + count]
+        position += count
+    return normalized
 
 
 def get_user_orders(user_id: int):
@@ -39,7 +62,7 @@ def get_user_orders(user_id: int):
         orders = list(coll.find(query).sort("created_at", -1).skip(skip).limit(page_size))
         
         return jsonify({
-            "orders": [normalize_order(order) for order in orders],
+            "orders": _serialize_orders(orders),
             "pagination": {
                 "page": page,
                 "page_size": page_size,
@@ -65,7 +88,7 @@ def get_order_by_id(order_id: int):
         if not order:
             return jsonify(message="Pedido não encontrado"), 404
         
-        return jsonify(normalize_order(order))
+        return jsonify(_serialize_orders([order])[0])
 
     except Exception as e:
         current_app.logger.error(f"Erro ao obter pedido: {e}")
@@ -144,7 +167,7 @@ def create_order(user_id: int):
                         for product_id in product_ids_to_update:
                             products_coll.update_one(
                                 {"id": product_id},
-                                {"$set": {"status": "vendido"}},
+                                {"$set": {"status": "vendido", "vendido_em": now}},
                                 session=session
                             )
                         
@@ -164,9 +187,14 @@ def create_order(user_id: int):
             # Sem suporte a transações
             _create_order_without_transaction(coll, products_coll, cart_coll, order, product_ids_to_update, user_id, now)
 
+        # Produtos vendidos mudam o resultado das buscas (filtro de status)
+        invalidate_search_cache()
+        for product_id in product_ids_to_update:
+            remove_suggestions(product_id)
+
         return jsonify({
             "message": "Pedido criado com sucesso",
-            "order": normalize_order(order),
+            "order": _serialize_orders([order])[0],
         }), 201
 
     except Exception as e:
@@ -181,7 +209,7 @@ def _create_order_without_transaction(coll, products_coll, cart_coll, order, pro
     for product_id in product_ids:
         products_coll.update_one(
             {"id": product_id},
-            {"$set": {"status": "vendido"}}
+            {"$set": {"status": "vendido", "vendido_em": now}}
         )
     
     cart_coll.update_one(
@@ -227,6 +255,112 @@ def update_order_status(order_id: int):
         return jsonify(message="Erro interno do servidor"), 500
 
 
+def bulk_update_order_status():
+    """
+    Atualiza o status de vários pedidos de uma vez (uso administrativo).
+
+    Os pedidos são alterados com um único ``update_many`` e, se ``notify``
+    (padrão), os clientes recebem o email de status em lote. O resultado de
+    cada notificação é devolvido e registrado no pedido (``status_notification``).
+    """
+    db = current_app.db
+    if db is None:
+        return jsonify(message="banco de dados indisponível"), 503
+
+    try:
+        payload = request.get_json()
+        if not payload:
+            return jsonify(message="Payload JSON é obrigatório"), 400
+
+        new_status = payload.get("status")
+        if not new_status or new_status not in ORDER_STATUS:
+            return jsonify(message=f"Status inválido. Valores permitidos: {', '.join(ORDER_STATUS)}"), 400
+
+        order_ids = payload.get("order_ids")
+        if (not isinstance(order_ids, list) or not order_ids
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in order_ids)):
+            return jsonify(message="order_ids deve ser uma lista de IDs de pedidos"), 400
+        order_ids = list(dict.fromkeys(order_ids))
+        if len(order_ids) > BULK_STATUS_MAX_ORDERS:
+            return jsonify(message=f"Máximo de {BULK_STATUS_MAX_ORDERS} pedidos por requisição"), 400
+
+        notify = payload.get("notify", True) is not False
+
+        coll = get_collection(db)
+        now = datetime.utcnow()
+
+        orders = list(coll.find(
+            {"id": {"$in": order_ids}},
+            {"_id": 0, "id": 1, "user_id": 1, "status": 1}
+        ))
+        found = {order["id"]: order for order in orders}
+        not_found = [order_id for order_id in order_ids if order_id not in found]
+        unchanged = [order_id for order_id in order_ids
+                     if order_id in found and found[order_id].get("status") == new_status]
+        to_update = [order_id for order_id in order_ids
+                     if order_id in found and found[order_id].get("status") != new_status]
+
+        updated: List[int] = []
+        if to_update:
+            coll.update_many(
+                {"id": {"$in": to_update}, "status": {"$ne": new_status}},
+                {"$set": {"status": new_status, "updated_at": now}}
+            )
+            # Relê os pedidos com o updated_at desta escrita: só eles mudaram de fato
+            # (outro processo pode ter aplicado o mesmo status entre a leitura e o update)
+            changed = {order["id"] for order in coll.find(
+                {"id": {"$in": to_update}, "status": new_status, "updated_at": now}, {"_id": 0, "id": 1}
+            )}
+            updated = [order_id for order_id in to_update if order_id in changed]
+            unchanged += [order_id for order_id in to_update if order_id not in changed]
+
+        notifications = []
+        if notify and updated:
+            notifications = _notify_status_change(db, [found[order_id] for order_id in updated], new_status, now)
+
+        return jsonify({
+            "message": f"{len(updated)} pedido(s) atualizado(s)",
+            "status": new_status,
+            "updated": updated,
+            "unchanged": unchanged,
+            "not_found": not_found,
+            "notifications": notifications,
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Erro ao atualizar status em lote: {e}")
+        return jsonify(message="Erro interno do servidor"), 500
+
+
+def _notify_status_change(db, orders: List[Dict[str, Any]], status: str, now: datetime) -> List[Dict[str, Any]]:
+    """Envia o email de status aos donos dos pedidos e registra o resultado em cada pedido."""
+    user_ids = list({order.get("user_id") for order in orders})
+    users = {
+        user["id"]: user
+        for user in db["users"].find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "nome": 1, "email": 1})
+    }
+
+    results = send_order_status_notifications([
+        {
+            "order_id": order["id"],
+            "to_email": users.get(order.get("user_id"), {}).get("email"),
+            "nome": users.get(order.get("user_id"), {}).get("nome"),
+            "status": status,
+        }
+        for order in orders
+    ])
+
+    # Um único bulk_write; o mail_id liga o pedido ao email na fila de envio
+    if results:
+        get_collection(db).bulk_write([
+            UpdateOne({"id": r["order_id"]}, {"$set": {"status_notification": {
+                "status": status, "sent": r["sent"], "mail_id": r.get("mail_id"), "at": now,
+            }}})
+            for r in results
+        ], ordered=False)
+    return results
+
+
 def cancel_order(order_id: int):
     """Cancela um pedido."""
     db = current_app.db
@@ -251,10 +385,15 @@ def cancel_order(order_id: int):
 
         # Restaura status dos produtos para disponível
         for item in order.get("items", []):
-            products_coll.update_one(
+            result = products_coll.update_one(
                 {"id": item.get("product_id")},
-                {"$set": {"status": "disponivel"}}
+                {"$set": {"status": "disponivel"}, "$unset": {"vendido_em": ""}}
             )
+            if not result.matched_count:
+                # Produto já arquivado: volta para a coleção principal
+                restore_archived_product(db, item.get("product_id"))
+            refresh_suggestions(db, item.get("product_id"))
+        invalidate_search_cache()
 
         # Atualiza status do pedido
         coll.update_one(
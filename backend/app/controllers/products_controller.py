@@ -10,7 +10,8 @@ from ..models.product_model import (
     validate_product,
     normalize_product,
 )
-from ..services.supabase_storage import storage_service
+from ..services.storage import storage_service
+from ..utils.cache import discard_cached_product_id
 
 
 def _serialize(doc: Dict[str, Any]) -> Dict[str, Any]:
@@ -149,6 +150,8 @@ def update_product(id: int):
     merged.pop("_id", None)
     merged.update(payload)
     merged = normalize_product(merged)
+    # favorite_count é mantido por $inc no modelo de favoritos: nunca entra no $set
+    merged.pop("favorite_count", None)
 
     ok, errors = validate_product(merged, db)  # Passa db para validação dinâmica
     if not ok:
@@ -171,6 +174,7 @@ def delete_product(id: int):
     res = coll.delete_one({"id": int(id)})
     if res.deleted_count == 0:
         return jsonify(message="produto não encontrado"), 404
+    discard_cached_product_id(int(id))
     return jsonify(message="produto excluído"), 200
 
 
@@ -331,7 +335,7 @@ def update_product_image(id: int):
         
         # Deleta imagem antiga se existir
         old_image_url = current_product.get('imagem')
-        if old_image_url and old_image_url.startswith('http'):
+        if old_image_url:
             storage_service.delete_image(old_image_url)
         
         # Atualiza produto com nova URL
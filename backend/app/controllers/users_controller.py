@@ -1,4 +1,4 @@
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g
 from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
 from typing import Any, Dict
@@ -15,13 +15,35 @@ from ..models.user_model import (
     verify_password,
     hash_password,
     validate_password,
+    password_needs_rehash,
+    build_search_filter,
+    build_cursor_filter,
+    encode_list_cursor,
+    USER_LIST_PROJECTION,
+    USER_LIST_SORT,
     USER_TYPES,
 )
 from ..services.email_service import send_confirmation_email, send_welcome_email, send_password_reset_email, send_account_deletion_code
-from ..services.jwt_service import create_access_token, create_refresh_token, refresh_access_token, JWT_ACCESS_TOKEN_EXPIRES
+from ..services.jwt_service import create_access_token, create_refresh_token, refresh_access_token, decode_token, authenticate_request, JWT_ACCESS_TOKEN_EXPIRES
+from ..services.token_revocation import revoke_tokens, revoke_user_tokens
+from ..services.password_hasher import PasswordHasherBusy
+from ..services.user_stats import record_user_change, get_user_stats
 import random
 
 
+def _password_busy_response(error: PasswordHasherBusy):
+    """503 com Retry-After quando o pool de senhas está cheio."""
+    return (
+        jsonify(message="Muitas requisições de autenticação no momento. Tente novamente em instantes."),
+        503,
+        {"Retry-After": str(error.retry_after)},
+    )
+
+
+# Tamanho máximo de página na listagem de usuários
+MAX_USERS_PAGE_SIZE = 100
+
+
 def _serialize(doc: Dict[str, Any]) -> Dict[str, Any]:
     """Serializa documento removendo campos internos."""
     if not doc:
@@ -30,7 +52,12 @@ def _serialize(doc: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def list_users():
-    """Lista usuários com paginação e filtros."""
+    """
+    Lista usuários com paginação e filtros.
+    
+    Paginação por ``page`` (com total) ou por ``cursor`` (keyset: use o
+    ``next_cursor`` da resposta anterior; ``cursor=`` vazio inicia a listagem).
+    """
     db = current_app.db
     if db is None:
         return jsonify(message="banco de dados indisponível"), 503
@@ -39,8 +66,9 @@ def list_users():
 
     try:
         # Parâmetros de paginação
-        page = int(request.args.get("page", 1))
-        page_size = int(request.args.get("page_size", 20))
+        page = max(int(request.args.get("page", 1) or 1), 1)
+        page_size = min(max(int(request.args.get("page_size", 20) or 20), 1), MAX_USERS_PAGE_SIZE)
+        cursor_token = request.args.get("cursor")
         
         # Parâmetros de filtro
         tipo = request.args.get("tipo")
@@ -57,27 +85,28 @@ def list_users():
             filter_query["ativo"] = ativo.lower() == "true"
         
         if search:
-            filter_query["$or"] = [
-                {"nome": {"$regex": search, "$options": "i"}},
-                {"email": {"$regex": search, "$options": "i"}}
-            ]
-
-        # Contagem total
-        total = coll.count_documents(filter_query)
-
-        # Busca com paginação
-        skip = (page - 1) * page_size
-        cursor = coll.find(filter_query).sort("data_criacao", -1).skip(skip).limit(page_size)
+            filter_query.update(build_search_filter(search))
+
+        pagination = {"page_size": page_size}
+        query = filter_query
+        if cursor_token is not None:
+            if cursor_token:
+                after = build_cursor_filter(cursor_token)
+                query = {"$and": [filter_query, after]} if filter_query else after
+            cursor = coll.find(query, USER_LIST_PROJECTION).sort(USER_LIST_SORT).limit(page_size)
+        else:
+            pagination["page"] = page
+            pagination["total"] = coll.count_documents(filter_query)
+            skip = (page - 1) * page_size
+            cursor = coll.find(query, USER_LIST_PROJECTION).sort(USER_LIST_SORT).skip(skip).limit(page_size)
         
-        users = [_serialize(doc) for doc in cursor]
+        docs = list(cursor)
+        users = [_serialize(doc) for doc in docs]
+        pagination["next_cursor"] = encode_list_cursor(docs[-1]) if len(docs) == page_size else None
 
         return jsonify({
             "items": users,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total": total
-            }
+            "pagination": pagination
         })
 
     except ValueError as e:
@@ -135,6 +164,7 @@ def create_user():
 
         # Insere no banco
         result = coll.insert_one(user_data)
+        record_user_change(db, None, user_data)
         
         # Busca usuário criado
         created_user = coll.find_one({"_id": result.inserted_id})
@@ -165,6 +195,8 @@ def create_user():
         if "email" in str(e):
             return jsonify(message="Email já está em uso"), 409
         return jsonify(message="Dados duplicados"), 409
+    except PasswordHasherBusy as e:
+        return _password_busy_response(e)
     except Exception as e:
         current_app.logger.error(f"Erro ao criar usuário: {e}")
         return jsonify(message="Erro interno do servidor"), 500
@@ -216,6 +248,7 @@ def update_user(id: int):
 
         # Busca usuário atualizado
         updated_user = coll.find_one({"id": id})
+        record_user_change(db, existing_user, updated_user)
 
         return jsonify({
             "message": "Usuário atualizado com sucesso",
@@ -226,6 +259,8 @@ def update_user(id: int):
         if "email" in str(e):
             return jsonify(message="Email já está em uso"), 409
         return jsonify(message="Dados duplicados"), 409
+    except PasswordHasherBusy as e:
+        return _password_busy_response(e)
     except Exception as e:
         current_app.logger.error(f"Erro ao atualizar usuário {id}: {e}")
         return jsonify(message="Erro interno do servidor"), 500
@@ -264,6 +299,11 @@ def delete_user(id: int):
         if result.matched_count == 0:
             return jsonify(message="Usuário não encontrado"), 404
 
+        record_user_change(db, existing_user, {**existing_user, "ativo": False})
+
+        # Sessões abertas do usuário desativado deixam de valer
+        revoke_user_tokens(id)
+
         return jsonify(message="Usuário desativado com sucesso")
 
     except Exception as e:
@@ -288,18 +328,32 @@ def authenticate_user():
         if not email or not senha:
             return jsonify(message="Email e senha são obrigatórios"), 400
 
+        # Conta ou IP bloqueados por excesso de falhas: recusa antes do bcrypt
+        throttle = getattr(current_app, "login_throttle", None)
+        client_ip = request.remote_addr
+        if throttle is not None:
+            retry_after = throttle.check(email, client_ip)
+            if retry_after:
+                return (
+                    jsonify(message=f"Muitas tentativas de login. Tente novamente em {retry_after} segundos."),
+                    429,
+                    {"Retry-After": str(retry_after)},
+                )
+
         coll = get_collection(db)
 
         # Busca usuário por email
         user = coll.find_one({"email": email.strip().lower()})
 
-        if not user:
-            return jsonify(message="Credenciais inválidas"), 401
-
         # Verifica senha
-        if not verify_password(senha, user["senha_hash"]):
+        if not user or not verify_password(senha, user["senha_hash"]):
+            if throttle is not None:
+                throttle.record_failure(email, client_ip)
             return jsonify(message="Credenciais inválidas"), 401
 
+        if throttle is not None:
+            throttle.record_success(email)
+
         # Verifica se o email foi confirmado
         if not user.get("email_confirmado", False):
             return jsonify(
@@ -311,6 +365,13 @@ def authenticate_user():
         if not user.get("ativo", False):
             return jsonify(message="Conta desativada. Entre em contato com o suporte."), 403
 
+        # Refaz o hash se o custo do bcrypt mudou (BCRYPT_ROUNDS)
+        if password_needs_rehash(user["senha_hash"]):
+            try:
+                coll.update_one({"id": user["id"]}, {"$set": {"senha_hash": hash_password(senha)}})
+            except PasswordHasherBusy:
+                pass  # Fica para o próximo login
+
         # Gera tokens JWT
         access_token = create_access_token(
             user_id=user['id'],
@@ -328,6 +389,8 @@ def authenticate_user():
             "expires_in": int(JWT_ACCESS_TOKEN_EXPIRES.total_seconds())
         })
 
+    except PasswordHasherBusy as e:
+        return _password_busy_response(e)
     except Exception as e:
         current_app.logger.error(f"Erro na autenticação: {e}")
         return jsonify(message="Erro interno do servidor"), 500
@@ -360,6 +423,38 @@ def refresh_token_endpoint():
         return jsonify(message="Erro interno do servidor"), 500
 
 
+def logout_user():
+    """
+    Encerra a sessão: revoga o access token atual e, se enviado, o refresh token.
+    Com ``"all": true`` revoga todas as sessões do usuário.
+    """
+    try:
+        claims, error = authenticate_request()
+        if error:
+            return jsonify(message=error), 401
+
+        payload = request.get_json(silent=True) or {}
+
+        if payload.get("all"):
+            revoke_user_tokens(claims["sub"])
+            return jsonify(message="Todas as sessões foram encerradas")
+
+        tokens = [claims]
+        refresh_token = payload.get("refresh_token")
+        if refresh_token:
+            success, refresh_claims, _ = decode_token(refresh_token)
+            if (success and refresh_claims.get("token_type") == "refresh"
+                    and refresh_claims.get("sub") == claims.get("sub")):
+                tokens.append(refresh_claims)
+
+        revoked = revoke_tokens(tokens)
+        return jsonify(message="Sessão encerrada com sucesso", revoked=revoked)
+
+    except Exception as e:
+        current_app.logger.error(f"Erro ao encerrar sessão: {e}")
+        return jsonify(message="Erro interno do servidor"), 500
+
+
 def change_password(id: int):
     """Altera senha do usuário."""
     db = current_app.db
@@ -389,7 +484,6 @@ def change_password(id: int):
             return jsonify(message="Senha atual incorreta"), 400
 
         # Valida nova senha
-        from ..models.user_model import validate_password, hash_password
         is_valid, error_msg = validate_password(senha_nova)
         if not is_valid:
             return jsonify(message=error_msg), 400
@@ -406,8 +500,22 @@ def change_password(id: int):
         if result.matched_count == 0:
             return jsonify(message="Usuário não encontrado"), 404
 
-        return jsonify(message="Senha alterada com sucesso")
+        # Encerra as sessões abertas com a senha antiga
+        revoke_user_tokens(id)
+
+        response = {"message": "Senha alterada com sucesso"}
+        if g.get("user_id") == id:
+            # O próprio usuário continua logado com novos tokens
+            response.update({
+                "access_token": create_access_token(user_id=id, user_type=user["tipo"], email=user["email"]),
+                "refresh_token": create_refresh_token(user_id=id),
+                "token_type": "Bearer",
+                "expires_in": int(JWT_ACCESS_TOKEN_EXPIRES.total_seconds()),
+            })
+        return jsonify(response)
 
+    except PasswordHasherBusy as e:
+        return _password_busy_response(e)
     except Exception as e:
         current_app.logger.error(f"Erro ao alterar senha do usuário {id}: {e}")
         return jsonify(message="Erro interno do servidor"), 500
@@ -422,39 +530,24 @@ def get_user_types():
 
 
 def get_users_summary():
-    """Retorna resumo de usuários por tipo."""
+    """
+    Retorna resumo de usuários por tipo.
+    Lê o resumo materializado (atualizado a cada alteração e reconciliado periodicamente).
+    """
     db = current_app.db
     if db is None:
         return jsonify(message="banco de dados indisponível"), 503
 
     try:
-        coll = get_collection(db)
-
-        # Contagem por tipo
-        pipeline = [
-            {"$match": {"ativo": True}},
-            {"$group": {
-                "_id": "$tipo",
-                "count": {"$sum": 1}
-            }}
-        ]
-
-        result = list(coll.aggregate(pipeline))
-        
-        summary = {}
-        for item in result:
-            summary[item["_id"]] = item["count"]
-
-        # Garante que todos os tipos apareçam
-        for user_type in USER_TYPES:
-            if user_type not in summary:
-                summary[user_type] = 0
-
-        total_users = sum(summary.values())
+        stats = get_user_stats(db)
+        summary = stats["ativos"]
 
         return jsonify({
             "summary": summary,
-            "total": total_users,
+            "inactive": stats["inativos"],
+            "total": sum(summary.values()),
+            "updated_at": stats["updated_at"].isoformat() if stats["updated_at"] else None,
+            "reconciled_at": stats["reconciled_at"].isoformat() if stats["reconciled_at"] else None,
             "message": "Resumo de usuários obtido com sucesso"
         })
 
@@ -502,6 +595,8 @@ def confirm_email(token: str):
         if result.matched_count == 0:
             return jsonify(message="Erro ao confirmar email"), 500
 
+        record_user_change(db, user, {**user, "ativo": True})
+
         # Envia email de boas-vindas
         send_welcome_email(user["email"], user["nome"])
 
@@ -673,10 +768,14 @@ def reset_password():
         if result.matched_count == 0:
             return jsonify(message="Erro ao redefinir senha"), 500
 
+        revoke_user_tokens(user["id"])
+
         current_app.logger.info(f"Senha redefinida com sucesso para usuário ID {user['id']}")
         
         return jsonify(message="Senha redefinida com sucesso")
 
+    except PasswordHasherBusy as e:
+        return _password_busy_response(e)
     except Exception as e:
         current_app.logger.error(f"Erro ao redefinir senha: {e}")
         return jsonify(message="Erro interno do servidor"), 500
@@ -785,6 +884,10 @@ def confirm_account_deletion():
         if result.deleted_count == 0:
             return jsonify(message="Erro ao excluir conta"), 500
 
+        record_user_change(db, user, None)
+
+        revoke_user_tokens(int(user_id))
+
         current_app.logger.info(f"Conta do usuário ID {user_id} excluída permanentemente")
         
         return jsonify({
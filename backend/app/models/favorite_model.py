@@ -4,13 +4,52 @@ Modelo e utilidades para a coleção de favoritos.
 - Garante índices no MongoDB
 - Valida payloads de favoritos
 """
-from typing import Dict, Any, List, Optional, Tuple
-from pymongo import ASCENDING
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from bson import ObjectId
 from datetime import datetime
+import base64
+import json
+
+from ..services.storage_backend import THUMBNAIL_SIZE
+from ..utils.cache import invalidate_search_cache_by_sort
+from .product_model import POPULAR_SORT_KEY
 
 COLLECTION_NAME = "favorites"
 
+# Máximo de produtos por verificação em lote
+MAX_CHECK_IDS = 100
+
+# Página da listagem de favoritos (padrão e máximo)
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Ordenação da listagem: mais recentes primeiro (product_id desempata, é único por usuário)
+FAVORITES_SORT = [("created_at", DESCENDING), ("product_id", DESCENDING)]
+
+# Índice da listagem: mesmas chaves e direções de FAVORITES_SORT (paginação sem sort em memória)
+USER_FAVORITES_INDEX = "user_created"
+USER_FAVORITES_INDEX_KEYS = [("user_id", ASCENDING), *FAVORITES_SORT]
+
+# Códigos do MongoDB para índice existente com outras chaves/opções
+_INDEX_CONFLICT_CODES = (85, 86)
+
+# Campos do produto exibidos no card de favoritos (só a miniatura da imagem)
+PRODUCT_CARD_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "titulo": 1,
+    "preco": 1,
+    "categoria": 1,
+    "tamanho": 1,
+    "condicao": 1,
+    "status": 1,
+    "destaque": 1,
+    "imagem": 1,
+    f"imagens.{THUMBNAIL_SIZE}": 1,
+}
+
 
 def ensure_indexes(db) -> None:
     """Garante que os índices necessários existam na coleção de favoritos."""
@@ -26,11 +65,14 @@ def ensure_indexes(db) -> None:
         name="user_product_unique"
     )
     
-    # Índice para buscar favoritos por usuário
-    collection.create_index(
-        [("user_id", ASCENDING), ("created_at", ASCENDING)],
-        name="user_created"
-    )
+    # Índice da listagem paginada por usuário; a versão antiga (sem product_id) é recriada
+    try:
+        collection.create_index(USER_FAVORITES_INDEX_KEYS, name=USER_FAVORITES_INDEX)
+    except OperationFailure as e:
+        if e.code not in _INDEX_CONFLICT_CODES:
+            raise
+        collection.drop_index(USER_FAVORITES_INDEX)
+        collection.create_index(USER_FAVORITES_INDEX_KEYS, name=USER_FAVORITES_INDEX)
     
     # Índice para buscar por produto (útil para estatísticas)
     collection.create_index(
@@ -81,6 +123,22 @@ def create_favorite_document(user_id: str, product_id: int) -> Dict[str, Any]:
     }
 
 
+def _adjust_favorite_counts(db, product_ids: List[int], delta: int) -> None:
+    """Aplica ``$inc`` no ``favorite_count`` dos produtos (divergências são corrigidas por recount_favorite_counts)."""
+    if not product_ids:
+        return
+    try:
+        products = db["products"]
+        if len(product_ids) == 1:
+            products.update_one({"id": product_ids[0]}, {"$inc": {"favorite_count": delta}})
+        else:
+            products.update_many({"id": {"$in": product_ids}}, {"$inc": {"favorite_count": delta}})
+    except Exception as e:
+        print(f"Erro ao atualizar contador de favoritos: {e}")
+    # Só a busca por popularidade depende do favorite_count; as demais expiram pelo TTL
+    invalidate_search_cache_by_sort(POPULAR_SORT_KEY)
+
+
 def add_favorite(db, user_id: str, product_id: int) -> Tuple[bool, Optional[str], Optional[Dict]]:
     """
     Adiciona um produto aos favoritos do usuário.
@@ -99,24 +157,16 @@ def add_favorite(db, user_id: str, product_id: int) -> Tuple[bool, Optional[str]
     try:
         collection = db[COLLECTION_NAME]
         
-        # Verificar se já existe
-        existing = collection.find_one({
-            "user_id": user_id,
-            "product_id": product_id
-        })
-        
-        if existing:
-            return False, "Produto já está nos favoritos", None
-        
-        # Criar documento
+        # O índice único user_product_unique rejeita duplicados (sem consulta prévia)
         favorite_doc = create_favorite_document(user_id, product_id)
-        
-        # Inserir
         result = collection.insert_one(favorite_doc)
         favorite_doc['_id'] = result.inserted_id
+        _adjust_favorite_counts(db, [product_id], 1)
         
         return True, None, favorite_doc
         
+    except DuplicateKeyError:
+        return False, "Produto já está nos favoritos", None
     except Exception as e:
         return False, f"Erro ao adicionar favorito: {str(e)}", None
 
@@ -147,12 +197,43 @@ def remove_favorite(db, user_id: str, product_id: int) -> Tuple[bool, Optional[s
         if result.deleted_count == 0:
             return False, "Favorito não encontrado"
         
+        _adjust_favorite_counts(db, [product_id], -1)
         return True, None
         
     except Exception as e:
         return False, f"Erro ao remover favorito: {str(e)}"
 
 
+def toggle_favorite_state(db, user_id: str, product_id: int) -> Tuple[bool, Optional[str], bool, Optional[Dict]]:
+    """
+    Alterna o favorito com operações atômicas: tenta inserir e, se o índice
+    único acusar duplicado, remove. Adicionar custa uma ida ao banco;
+    remover, duas.
+    
+    Args:
+        db: Instância do banco de dados
+        user_id: ID do usuário
+        product_id: ID do produto
+        
+    Returns:
+        Tupla (sucesso, mensagem_erro, favoritado_depois, documento_inserido)
+    """
+    if db is None:
+        return False, "Banco de dados não disponível", False, None
+    
+    success, error, favorite = add_favorite(db, user_id, product_id)
+    if success:
+        return True, None, True, favorite
+    if error != "Produto já está nos favoritos":
+        return False, error, False, None
+    
+    success, error = remove_favorite(db, user_id, product_id)
+    if not success and error != "Favorito não encontrado":
+        return False, error, True, None
+    # "Não encontrado": outra requisição removeu no meio tempo; o estado final é o mesmo
+    return True, None, False, None
+
+
 def get_user_favorites(db, user_id: str) -> Tuple[bool, Optional[str], List[Dict]]:
     """
     Busca todos os favoritos de um usuário.
@@ -184,6 +265,114 @@ def get_user_favorites(db, user_id: str) -> Tuple[bool, Optional[str], List[Dict
         return False, f"Erro ao buscar favoritos: {str(e)}", []
 
 
+def encode_favorites_cursor(favorite: Dict[str, Any]) -> str:
+    """Cursor opaco a partir do último favorito da página."""
+    created = favorite.get("created_at")
+    payload = {
+        "t": created.isoformat() if isinstance(created, datetime) else created,
+        "p": favorite.get("product_id"),
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_favorites_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Filtro dos favoritos após o cursor (mesma ordem de ``FAVORITES_SORT``).
+    
+    Raises:
+        ValueError: Cursor inválido
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        created = datetime.fromisoformat(payload["t"])
+        product_id = int(payload["p"])
+    except Exception:
+        raise ValueError("cursor inválido") from None
+    
+    return {
+        "$or": [
+            {"created_at": {"$lt": created}},
+            {"created_at": created, "product_id": {"$lt": product_id}},
+        ]
+    }
+
+
+def get_user_favorites_page(db, user_id: str, page_size: int = DEFAULT_PAGE_SIZE,
+                            cursor: Optional[str] = None,
+                            use_lookup: bool = False) -> Tuple[bool, Optional[str], List[Dict], Optional[str]]:
+    """
+    Busca uma página de favoritos do usuário com os dados de card do produto.
+    
+    A página percorre o índice (user_id, created_at, product_id), na mesma
+    ordem de ``FAVORITES_SORT``, sem ordenação em memória. Por padrão são duas
+    consultas (favoritos da página + produtos com ``$in``); com ``use_lookup``
+    a junção é feita no servidor em uma única agregação ``$lookup``.
+    
+    Args:
+        db: Instância do banco de dados
+        user_id: ID do usuário
+        page_size: Favoritos por página (limitado a MAX_PAGE_SIZE)
+        cursor: ``next_cursor`` da página anterior (None = primeira página)
+        use_lookup: Junta os produtos com ``$lookup``
+        
+    Returns:
+        Tupla (sucesso, mensagem_erro, favoritos, próximo_cursor).
+        Cada favorito tem ``product`` (None se o produto não existe mais).
+    
+    Raises:
+        ValueError: Cursor inválido
+    """
+    if db is None:
+        return False, "Banco de dados não disponível", [], None
+    
+    page_size = min(max(int(page_size), 1), MAX_PAGE_SIZE)
+    query: Dict[str, Any] = {"user_id": user_id}
+    if cursor:
+        query.update(decode_favorites_cursor(cursor))
+    
+    try:
+        collection = db[COLLECTION_NAME]
+        
+        if use_lookup:
+            pipeline = [
+                {"$match": query},
+                {"$sort": dict(FAVORITES_SORT)},
+                {"$limit": page_size},
+                {"$lookup": {
+                    "from": "products",
+                    "let": {"product_id": "$product_id"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$eq": ["$id", "$$product_id"]}}},
+                        {"$project": PRODUCT_CARD_PROJECTION},
+                    ],
+                    "as": "product",
+                }},
+                {"$set": {"product": {"$ifNull": [{"$arrayElemAt": ["$product", 0]}, None]}}},
+            ]
+            favorites = list(collection.aggregate(pipeline))
+        else:
+            favorites = list(collection.find(query).sort(FAVORITES_SORT).limit(page_size))
+            product_ids = [fav["product_id"] for fav in favorites]
+            products = {}
+            if product_ids:
+                products = {
+                    p["id"]: p
+                    for p in db["products"].find({"id": {"$in": product_ids}}, PRODUCT_CARD_PROJECTION)
+                }
+            for fav in favorites:
+                fav["product"] = products.get(fav["product_id"])
+        
+        for fav in favorites:
+            fav['_id'] = str(fav['_id'])
+        
+        next_cursor = encode_favorites_cursor(favorites[-1]) if len(favorites) == page_size else None
+        return True, None, favorites, next_cursor
+        
+    except Exception as e:
+        return False, f"Erro ao buscar favoritos: {str(e)}", [], None
+
+
 def is_favorited(db, user_id: str, product_id: int) -> bool:
     """
     Verifica se um produto está nos favoritos do usuário.
@@ -213,6 +402,58 @@ def is_favorited(db, user_id: str, product_id: int) -> bool:
         return False
 
 
+def get_favorited_ids(db, user_id: str, product_ids: Iterable[int]) -> Tuple[bool, Optional[str], Set[int]]:
+    """
+    Verifica de uma vez quais produtos estão nos favoritos do usuário.
+    Uma consulta ``$in`` coberta pelo índice user_product_unique.
+    
+    Args:
+        db: Instância do banco de dados
+        user_id: ID do usuário
+        product_ids: IDs dos produtos
+        
+    Returns:
+        Tupla (sucesso, mensagem_erro, ids_favoritados)
+    """
+    if db is None:
+        return False, "Banco de dados não disponível", set()
+    
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return True, None, set()
+    
+    try:
+        collection = db[COLLECTION_NAME]
+        cursor = collection.find(
+            {"user_id": user_id, "product_id": {"$in": product_ids}},
+            {"_id": 0, "product_id": 1}
+        )
+        return True, None, {doc["product_id"] for doc in cursor}
+        
+    except Exception as e:
+        return False, f"Erro ao verificar favoritos: {str(e)}", set()
+
+
+def count_user_favorites(db, user_id: str) -> int:
+    """
+    Conta os favoritos do usuário (índice user_created).
+    
+    Args:
+        db: Instância do banco de dados
+        user_id: ID do usuário
+        
+    Returns:
+        Número de favoritos
+    """
+    if db is None:
+        return 0
+    
+    try:
+        return db[COLLECTION_NAME].count_documents({"user_id": user_id})
+    except Exception:
+        return 0
+
+
 def get_favorite_count_by_product(db, product_id: int) -> int:
     """
     Conta quantos usuários favoritaram um produto.
@@ -251,9 +492,63 @@ def clear_user_favorites(db, user_id: str) -> Tuple[bool, Optional[str], int]:
     try:
         collection = db[COLLECTION_NAME]
         
-        result = collection.delete_many({"user_id": user_id})
+        product_ids = [doc["product_id"] for doc in collection.find({"user_id": user_id}, {"_id": 0, "product_id": 1})]
+        if not product_ids:
+            return True, None, 0
+        # Só remove os favoritos lidos: um favorito criado no meio tempo mantém o contador
+        result = collection.delete_many({"user_id": user_id, "product_id": {"$in": product_ids}})
+        _adjust_favorite_counts(db, product_ids, -1)
         
         return True, None, result.deleted_count
         
     except Exception as e:
         return False, f"Erro ao limpar favoritos: {str(e)}", 0
+
+
+def recount_favorite_counts(db, batch_size: int = 500) -> Dict[str, Any]:
+    """
+    Recalcula o ``favorite_count`` de todos os produtos a partir da coleção
+    de favoritos (uma agregação + escritas em lote).
+    
+    Args:
+        db: Instância do banco de dados
+        batch_size: Atualizações por ``bulk_write``
+        
+    Returns:
+        Relatório com produtos atualizados e zerados
+    """
+    started = datetime.utcnow()
+    counts = {
+        item["_id"]: item["count"]
+        for item in db[COLLECTION_NAME].aggregate([
+            {"$group": {"_id": "$product_id", "count": {"$sum": 1}}}
+        ])
+    }
+    
+    products = db["products"]
+    updated = 0
+    batch = []
+    for product_id, count in counts.items():
+        # Só escreve quando o contador diverge
+        batch.append(UpdateOne({"id": product_id, "favorite_count": {"$ne": count}},
+                               {"$set": {"favorite_count": count}}))
+        if len(batch) >= batch_size:
+            updated += products.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += products.bulk_write(batch, ordered=False).modified_count
+    
+    # Produtos sem favoritos (ou sem o campo ainda)
+    zeroed = products.update_many(
+        {"id": {"$nin": list(counts)}, "favorite_count": {"$ne": 0}},
+        {"$set": {"favorite_count": 0}}
+    ).modified_count
+    if updated or zeroed:
+        invalidate_search_cache_by_sort(POPULAR_SORT_KEY)
+    
+    return {
+        "products_with_favorites": len(counts),
+        "updated": updated,
+        "zeroed": zeroed,
+        "duration_ms": round((datetime.utcnow() - started).total_seconds() * 1000, 1),
+    }
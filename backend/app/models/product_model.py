@@ -4,14 +4,36 @@ Modelo e utilidades para a coleção de produtos.
 - Valida payloads de produto
 - Garante validator e índices no MongoDB
 """
-from typing import Dict, Any, Tuple
-from pymongo import ASCENDING, TEXT
+import os
+from typing import Dict, Any, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING, TEXT
 from pymongo.collection import ReturnDocument
+from pymongo.errors import OperationFailure
+from ..services.storage_backend import is_storage_path, storage_path_product_id
 
 COLLECTION_NAME = "products"
+# Produtos vendidos saem da coleção principal após PRODUCT_ARCHIVE_AFTER_DAYS
+ARCHIVE_COLLECTION_NAME = "products_archive"
 COUNTERS_COLLECTION = "counters"
 COUNTER_KEY_PRODUCTS = "products"
 
+# Ordenação por popularidade (sort=popular): mais favoritados primeiro (id desempata)
+POPULAR_SORT_KEY = "popular"
+POPULAR_SORT = [("favorite_count", DESCENDING), ("id", ASCENDING)]
+
+# Status de produto; o disponível é o exibido por padrão nas listagens (índices parciais abaixo)
+PRODUCT_STATUSES = ("disponivel", "indisponivel", "vendido")
+AVAILABLE_STATUS = "disponivel"
+SOLD_STATUS = "vendido"
+
+# Idioma do analisador do índice de texto (stemming e stop words)
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "portuguese")
+TEXT_INDEX_NAME = "txt_titulo_descricao"
+TEXT_INDEX_KEYS = [("titulo", TEXT), ("descricao", TEXT)]
+
+# Códigos do MongoDB para índice existente com outras opções
+_INDEX_CONFLICT_CODES = (85, 86)
+
 def get_allowed_categories(db) -> set:
     """Busca categorias ativas do cache ou banco de dados."""
     if db is None:
@@ -69,7 +91,11 @@ def create_dynamic_schema(db) -> Dict[str, Any]:
                 "imagem": {
                     "bsonType": "string",
                     "minLength": 1,
-                    "description": "URL da imagem do produto (obrigatório)"
+                    "description": "Caminho no storage ou URL da imagem do produto (obrigatório)"
+                },
+                "imagens": {
+                    "bsonType": ["object", "null"],
+                    "description": "Variações responsivas da imagem: largura -> caminho no storage (opcional)"
                 },
                 "status": {
                     "bsonType": "string",
@@ -136,10 +162,19 @@ def validate_product(payload: Dict[str, Any], db=None) -> Tuple[bool, Dict[str,
         imagem = data["imagem"]
         if len(imagem) < 5:
             errors["imagem"] = "URL da imagem deve ter pelo menos 5 caracteres"
-        # Validação básica de URL
-        if not (imagem.startswith("http://") or imagem.startswith("https://") or imagem.startswith("/")):
+        # URL (http/https ou relativa) ou caminho do objeto no storage
+        if not (imagem.startswith("http://") or imagem.startswith("https://")
+                or imagem.startswith("/") or is_storage_path(imagem)):
             errors["imagem"] = "deve ser uma URL válida"
 
+    # Variações responsivas (opcional): {"160": url, "480": url, ...}
+    imagens = data.get("imagens")
+    if imagens is not None:
+        if not isinstance(imagens, dict) or not all(
+            str(k).isdigit() and isinstance(v, str) and v for k, v in imagens.items()
+        ):
+            errors["imagens"] = "deve mapear larguras (números) para URLs ou caminhos do storage"
+
     # Tipos
     if "preco" in data and not isinstance(data.get("preco"), (int, float)):
         errors["preco"] = "deve ser um número"
@@ -156,9 +191,8 @@ def validate_product(payload: Dict[str, Any], db=None) -> Tuple[bool, Dict[str,
     # Status permitido
     status = data.get("status")
     if status:
-        allowed_status = ["disponivel", "indisponivel", "vendido"]
-        if status not in allowed_status:
-            errors["status"] = f"deve ser um dos seguintes: {', '.join(allowed_status)}"
+        if status not in PRODUCT_STATUSES:
+            errors["status"] = f"deve ser um dos seguintes: {', '.join(PRODUCT_STATUSES)}"
 
     return (len(errors) == 0), errors
 
@@ -167,6 +201,10 @@ def get_collection(db):
     return db[COLLECTION_NAME]
 
 
+def get_archive_collection(db):
+    return db[ARCHIVE_COLLECTION_NAME]
+
+
 def ensure_products_collection(db):
     """Garante que a coleção exista com validator e índices úteis.
     - Cria coleção com validator se não existir
@@ -217,13 +255,62 @@ def ensure_products_collection(db):
         print(f"Erro ao criar índice em 'categoria': {e}")
 
     try:
-        coll.create_index([("titulo", TEXT), ("descricao", TEXT)], name="txt_titulo_descricao")
+        ensure_text_index(coll)
     except Exception as e:
         print(f"Erro ao criar índice de texto: {e}")
 
+    # Filtros e ordenação por preço (com e sem categoria)
+    try:
+        coll.create_index([("preco", ASCENDING)], name="idx_preco")
+        coll.create_index([("categoria", ASCENDING), ("preco", ASCENDING)], name="idx_categoria_preco")
+    except Exception as e:
+        print(f"Erro ao criar índices de preço: {e}")
+
+    # Listagem padrão (apenas disponíveis, por título), com e sem categoria
+    try:
+        available = {"status": AVAILABLE_STATUS}
+        coll.create_index([("categoria", ASCENDING), ("titulo", ASCENDING)], name="idx_disponivel_categoria_titulo",
+                          partialFilterExpression=available)
+        coll.create_index([("titulo", ASCENDING)], name="idx_disponivel_titulo",
+                          partialFilterExpression=available)
+    except Exception as e:
+        print(f"Erro ao criar índices parciais de disponíveis: {e}")
+
+    # Vendidos aguardando arquivamento
+    try:
+        coll.create_index([("vendido_em", ASCENDING)], name="idx_vendido_em",
+                          partialFilterExpression={"status": "vendido"})
+    except Exception as e:
+        print(f"Erro ao criar índice de vendidos: {e}")
+
+    try:
+        get_archive_collection(db).create_index([("id", ASCENDING)], unique=True, name="uniq_id")
+    except Exception as e:
+        print(f"Erro ao criar índice do arquivo de produtos: {e}")
+
+    # Ordenação por popularidade (sort=popular), com e sem filtro de categoria
+    try:
+        coll.create_index(POPULAR_SORT, name="idx_popular")
+        coll.create_index([("categoria", ASCENDING), *POPULAR_SORT], name="idx_categoria_popular")
+    except Exception as e:
+        print(f"Erro ao criar índices de popularidade: {e}")
+
     return coll
 
 
+def ensure_text_index(coll):
+    """Cria o índice de texto com o idioma SEARCH_LANGUAGE.
+    Um índice antigo com outro idioma é removido e recriado.
+    """
+    try:
+        coll.create_index(TEXT_INDEX_KEYS, name=TEXT_INDEX_NAME, default_language=SEARCH_LANGUAGE)
+    except OperationFailure as e:
+        if e.code not in _INDEX_CONFLICT_CODES:
+            raise
+        coll.drop_index(TEXT_INDEX_NAME)
+        coll.create_index(TEXT_INDEX_KEYS, name=TEXT_INDEX_NAME, default_language=SEARCH_LANGUAGE)
+
+
 def ensure_counters_collection(db):
     """Garante a coleção de contadores e documento base para produtos."""
     if db is None:
@@ -256,20 +343,56 @@ def get_next_sequence(db, name: str) -> int:
     return int(doc["seq"]) if doc and "seq" in doc else 1
 
 
+def allocate_product_id(db) -> int:
+    """Reserva o próximo id de produto.
+    Útil quando o id precisa existir antes do documento (ex.: caminho das imagens no storage).
+    """
+    ensure_counters_collection(db)
+    return get_next_sequence(db, COUNTER_KEY_PRODUCTS)
+
+
+def validate_image_owner(data: Dict[str, Any], current: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """
+    Imagens do storage devem estar no prefixo do próprio produto (``product_<id>/``).
+
+    Valores já salvos em ``current`` são aceitos (ex.: prefixos temporários antigos),
+    para que editar outros campos de um produto legado continue funcionando.
+
+    Returns:
+        Erros por campo (vazio se válido)
+    """
+    product_id = data.get("id")
+    kept = set()
+    if current:
+        kept = {current.get("imagem"), *(current.get("imagens") or {}).values()}
+
+    def foreign(value: Any) -> bool:
+        owner = storage_path_product_id(value)
+        return owner is not None and owner != product_id and value not in kept
+
+    errors = {}
+    if foreign(data.get("imagem")):
+        errors["imagem"] = "deve ser uma imagem deste produto"
+    imagens = data.get("imagens")
+    if isinstance(imagens, dict) and any(foreign(v) for v in imagens.values()):
+        errors["imagens"] = "devem ser imagens deste produto"
+    return errors
+
+
 def prepare_new_product(db, payload: Dict[str, Any]) -> Tuple[bool, Dict[str, str], Dict[str, Any]]:
     """Normaliza, valida e atribui id sequencial se necessário.
     Retorna (ok, erros, documento_pronto).
     """
     data = normalize_product(payload)
     ok, errors = validate_product(data, db)  # Passa db para validação dinâmica
-    if not ok:
+    errors.update(validate_image_owner(data))
+    if errors:
         return False, errors, {}
 
     # Gera id se não informado
     if "id" not in data:
         try:
-            ensure_counters_collection(db)
-            data["id"] = get_next_sequence(db, COUNTER_KEY_PRODUCTS)
+            data["id"] = allocate_product_id(db)
         except Exception as e:
             errors["id"] = f"falha ao gerar id: {e}"
             return False, errors, {}
@@ -278,6 +401,9 @@ def prepare_new_product(db, payload: Dict[str, Any]) -> Tuple[bool, Dict[str, st
     if "status" not in data or not data["status"]:
         data["status"] = "disponivel"
 
+    # Contador de favoritos mantido por $inc (favorite_model)
+    data["favorite_count"] = 0
+
     # Coerção de tipos: preço como float
     if isinstance(data.get("preco"), int):
         data["preco"] = float(data["preco"])
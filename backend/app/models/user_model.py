@@ -5,15 +5,20 @@ Modelo e utilidades para a coleção de usuários.
 - Garante validator e índices no MongoDB
 - Gerencia hash de senhas
 - Gerencia confirmação de email
+- Mantém os campos de busca (prefixos indexados) dos usuários
 """
-from typing import Dict, Any, Tuple, Optional
-from pymongo import ASCENDING, TEXT
+from typing import Dict, Any, List, Tuple, Optional
+from pymongo import ASCENDING, DESCENDING, TEXT, UpdateOne
 from pymongo.collection import ReturnDocument
-import bcrypt
 import re
+import json
+import base64
 import secrets
+import unicodedata
 from datetime import datetime, timedelta
 
+from ..services import password_hasher
+
 COLLECTION_NAME = "users"
 COUNTERS_COLLECTION = "counters"
 COUNTER_KEY_USERS = "users"
@@ -21,6 +26,27 @@ COUNTER_KEY_USERS = "users"
 # Tipos de usuário permitidos
 USER_TYPES = ["Administrador", "Cliente"]
 
+# Tamanho máximo do termo de busca de usuários
+MAX_SEARCH_LENGTH = 100
+
+# Campos devolvidos na listagem (segredos e tokens nunca saem do banco)
+USER_LIST_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "nome": 1,
+    "email": 1,
+    "tipo": 1,
+    "ativo": 1,
+    "email_confirmado": 1,
+    "telefone": 1,
+    "endereco": 1,
+    "data_criacao": 1,
+    "data_atualizacao": 1,
+}
+
+# Ordenação da listagem (mais recentes primeiro; id desempata)
+USER_LIST_SORT = [("data_criacao", DESCENDING), ("id", DESCENDING)]
+
 def validate_email(email: str) -> bool:
     """Valida formato do email."""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -47,13 +73,22 @@ def validate_password(password: str) -> Tuple[bool, str]:
     return True, "Senha válida"
 
 def hash_password(password: str) -> str:
-    """Gera hash da senha usando bcrypt."""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    """
+    Gera hash da senha usando bcrypt (no pool de senhas, custo BCRYPT_ROUNDS).
+    Lança PasswordHasherBusy se o pool estiver cheio.
+    """
+    return password_hasher.hash_password(password)
 
 def verify_password(password: str, hashed: str) -> bool:
-    """Verifica se a senha corresponde ao hash."""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    """
+    Verifica se a senha corresponde ao hash (no pool de senhas).
+    Lança PasswordHasherBusy se o pool estiver cheio.
+    """
+    return password_hasher.verify_password(password, hashed)
+
+def password_needs_rehash(hashed: str) -> bool:
+    """Indica se o hash usa um custo diferente do configurado."""
+    return password_hasher.needs_rehash(hashed)
 
 def generate_confirmation_token() -> str:
     """Gera token único para confirmação de email."""
@@ -136,6 +171,11 @@ def create_schema() -> Dict[str, Any]:
                 "data_atualizacao": {
                     "bsonType": "date",
                     "description": "Data da última atualização"
+                },
+                "nome_tokens": {
+                    "bsonType": "array",
+                    "items": {"bsonType": "string"},
+                    "description": "Palavras do nome normalizadas para busca por prefixo"
                 }
             }
         }
@@ -232,6 +272,7 @@ def prepare_new_user(payload: Dict[str, Any], db) -> Dict[str, Any]:
     user_data = {
         "id": get_next_id(db),
         "nome": payload["nome"].strip(),
+        "nome_tokens": build_name_tokens(payload["nome"]),
         "email": payload["email"].strip().lower(),
         "senha_hash": hash_password(payload["senha"]),
         "tipo": payload["tipo"],
@@ -267,6 +308,7 @@ def prepare_user_update(payload: Dict[str, Any]) -> Dict[str, Any]:
         if field in payload:
             if field == "nome" and payload[field]:
                 update_data[field] = payload[field].strip()
+                update_data["nome_tokens"] = build_name_tokens(payload[field])
             elif field == "email" and payload[field]:
                 update_data[field] = payload[field].strip().lower()
             elif field == "endereco" and payload[field]:
@@ -283,6 +325,102 @@ def prepare_user_update(payload: Dict[str, Any]) -> Dict[str, Any]:
     
     return update_data
 
+def normalize_search_text(value: str) -> str:
+    """Normaliza texto para busca: minúsculas e sem acentos."""
+    decomposed = unicodedata.normalize("NFKD", value or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
+
+def build_name_tokens(nome: str) -> List[str]:
+    """Palavras do nome normalizadas (ex.: "João da Silva" -> ["joao", "da", "silva"])."""
+    tokens = []
+    for word in re.split(r"[\s\-']+", normalize_search_text(nome)):
+        if word and word not in tokens:
+            tokens.append(word)
+    return tokens
+
+def build_search_filter(search: str) -> Dict[str, Any]:
+    """
+    Monta o filtro de busca de usuários.
+    
+    - Um termo: prefixo do nome (``nome_tokens``) ou do email, com regex
+      ancorada e sem ``$options`` para usar os índices;
+    - Várias palavras: índice de texto do nome (palavras completas).
+    
+    Args:
+        search: Termo digitado pelo usuário
+    
+    Returns:
+        Filtro MongoDB (vazio se o termo for vazio)
+    """
+    term = normalize_search_text(search)[:MAX_SEARCH_LENGTH]
+    words = term.split()
+    if not words:
+        return {}
+    
+    if len(words) > 1:
+        # Cada palavra entre aspas: todas precisam estar no nome
+        return {"$text": {"$search": " ".join(f'"{word}"' for word in words)}}
+    
+    prefix = "^" + re.escape(words[0])
+    return {
+        "$or": [
+            {"nome_tokens": {"$regex": prefix}},
+            {"email": {"$regex": prefix}},
+        ]
+    }
+
+def encode_list_cursor(user: Dict[str, Any]) -> str:
+    """Cursor opaco da listagem a partir do último usuário da página."""
+    created = user.get("data_criacao")
+    payload = {
+        "t": created.isoformat() if isinstance(created, datetime) else created,
+        "id": user.get("id"),
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+def build_cursor_filter(cursor: str) -> Dict[str, Any]:
+    """
+    Filtro dos usuários após o cursor (mesma ordem de ``USER_LIST_SORT``).
+    
+    Raises:
+        ValueError: Cursor inválido
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        created = datetime.fromisoformat(payload["t"])
+        last_id = int(payload["id"])
+    except Exception:
+        raise ValueError("cursor inválido") from None
+    
+    return {
+        "$or": [
+            {"data_criacao": {"$lt": created}},
+            {"data_criacao": created, "id": {"$lt": last_id}},
+        ]
+    }
+
+def backfill_name_tokens(db, batch_size: int = 500) -> int:
+    """
+    Preenche ``nome_tokens`` dos usuários criados antes da busca por prefixo.
+    
+    Returns:
+        Quantidade de usuários atualizados
+    """
+    collection = get_collection(db)
+    cursor = collection.find({"nome_tokens": {"$exists": False}}, {"_id": 1, "nome": 1})
+    
+    updated = 0
+    batch = []
+    for user in cursor:
+        batch.append(UpdateOne({"_id": user["_id"]}, {"$set": {"nome_tokens": build_name_tokens(user.get("nome", ""))}}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
 def normalize_user(user: Dict[str, Any]) -> Dict[str, Any]:
     """Normaliza dados do usuário para resposta (remove campos sensíveis)."""
     if not user:
@@ -293,6 +431,7 @@ def normalize_user(user: Dict[str, Any]) -> Dict[str, Any]:
     normalized.pop("senha_hash", None)  # Remove hash da senha por segurança
     normalized.pop("token_confirmacao", None)  # Remove token por segurança
     normalized.pop("token_expiracao", None)  # Remove expiração do token
+    normalized.pop("nome_tokens", None)  # Campo interno de busca
     
     # Converte datas para string ISO
     if "data_criacao" in normalized:
@@ -330,11 +469,22 @@ def ensure_users_collection(db):
         # Índice para status ativo
         collection.create_index([("ativo", ASCENDING)])
         
-        # Índice para busca por nome
+        # Índice para a listagem paginada (ordenação + cursor)
+        collection.create_index(USER_LIST_SORT)
+        
+        # Índice para busca por nome (palavras completas)
         collection.create_index([("nome", TEXT)])
         
+        # Índice para busca por prefixo do nome
+        collection.create_index([("nome_tokens", ASCENDING)])
+        
         print(f"✅ Índices criados para a coleção '{COLLECTION_NAME}'")
         
+        # Preenche campos de busca de usuários antigos
+        updated = backfill_name_tokens(db)
+        if updated:
+            print(f"✅ Campos de busca preenchidos para {updated} usuários")
+        
         # Cria usuário administrador padrão se não existir
         create_default_admin(db)
         
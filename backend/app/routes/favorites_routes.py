@@ -8,6 +8,7 @@ from app.controllers.favorites_controller import (
     add_to_favorites,
     remove_from_favorites,
     check_favorite,
+    check_favorites_batch,
     toggle_favorite,
     require_auth
 )
@@ -32,5 +33,8 @@ def remove_favorite_route(user_id, product_id):
 def check_favorite_route(user_id, product_id):
     return check_favorite(user_id, product_id)
 
+# Verificar vários produtos de uma vez
+favorites_bp.route("/check", methods=["POST"])(require_auth(check_favorites_batch))
+
 # Alternar favorito (toggle)
 favorites_bp.route("/toggle", methods=["POST"])(require_auth(toggle_favorite))
@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, current_app
 from flask_cors import cross_origin
 import os
 import psutil
@@ -7,6 +7,20 @@ import datetime
 # Cria o blueprint das rotas de health
 health_bp = Blueprint('health', __name__)
 
+def _storage_status():
+    """Status do storage; o teste de conectividade fica em cache no serviço."""
+    try:
+        from app.services.storage import storage_service
+        return storage_service.check_connection()
+    except Exception as e:
+        return {'status': 'DOWN', 'error': str(e)}
+
+def _auth_metrics():
+    """Métricas de verificação de tokens JWT e do pool de senhas (bcrypt)."""
+    from app.services.jwt_service import get_auth_metrics
+    from app.services.password_hasher import get_password_hasher
+    return {**get_auth_metrics(), 'password_hasher': get_password_hasher().get_stats()}
+
 @health_bp.route('/health', methods=['GET'], strict_slashes=False)
 @cross_origin()
 def health_check():
@@ -26,7 +40,10 @@ def health_check():
             },
             'environment': os.environ.get('FLASK_ENV', 'production'),
             'debug': os.environ.get('FLASK_DEBUG', 'False').lower() == 'true',
-            'version': '1.0.0'
+            'version': '1.0.0',
+            'startup': getattr(current_app, 'startup_metrics', None),
+            'storage': _storage_status(),
+            'auth': _auth_metrics()
         }
         
         return jsonify({
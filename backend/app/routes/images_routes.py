@@ -1,6 +1,6 @@
 """
 Rotas para gerenciamento de imagens de produtos
-Integração com Supabase Storage
+Integração com o backend de storage configurado (Supabase, local ou memória)
 """
 from flask import Blueprint
 from app.controllers.images_controller import (
@@ -8,8 +8,13 @@ from app.controllers.images_controller import (
     delete_product_image,
     list_product_images,
     get_image_info,
-    upload_multiple_images
+    upload_multiple_images,
+    get_image_job,
+    image_placeholder,
+    serve_image_file,
+    run_storage_gc
 )
+from app.services.jwt_service import admin_required
 
 images_bp = Blueprint("images", __name__)
 
@@ -27,3 +32,15 @@ images_bp.route("/product/<int:product_id>", methods=["GET"])(list_product_image
 
 # Informações sobre uma imagem
 images_bp.route("/info", methods=["POST"])(get_image_info)
+
+# Estado de um job de processamento em segundo plano
+images_bp.route("/jobs/<string:job_id>", methods=["GET"])(get_image_job)
+
+# Placeholder exibido enquanto a imagem é processada
+images_bp.route("/placeholder", methods=["GET"])(image_placeholder)
+
+# Arquivos dos backends local/memória
+images_bp.route("/files/<path:path>", methods=["GET"])(serve_image_file)
+
+# Limpeza de imagens órfãs (apenas admin)
+images_bp.route("/gc", methods=["POST"])(admin_required(run_storage_gc))
@@ -2,11 +2,13 @@
 Rotas para gerenciamento de pedidos.
 """
 from flask import Blueprint
+from app.services.jwt_service import admin_required
 from app.controllers.order_controller import (
     get_user_orders,
     get_order_by_id,
     create_order,
     update_order_status,
+    bulk_update_order_status,
     cancel_order,
 )
 
@@ -31,6 +33,13 @@ def create(user_id):
     return create_order(user_id)
 
 
+@order_bp.route("/status", methods=["PUT"])
+@admin_required
+def bulk_update_status():
+    """Atualiza o status de vários pedidos e notifica os clientes (apenas admin)."""
+    return bulk_update_order_status()
+
+
 @order_bp.route("/<int:order_id>/status", methods=["PUT"])
 def update_status(order_id):
     """Atualiza o status de um pedido."""
@@ -1,37 +1,152 @@
 from flask import Blueprint, request, jsonify, current_app
 from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
-from typing import Any, Dict
-from marshmallow import Schema, fields, ValidationError
-import time
+from datetime import datetime
+from typing import Any, Dict, List
+from marshmallow import Schema, fields, validate, ValidationError
 from functools import wraps
 
 from ..services.jwt_service import jwt_optional, admin_required
+from ..services.product_search import search_products, parse_status_filter, SORT_OPTIONS
+from ..services.autocomplete import (
+    get_suggestions,
+    index_product,
+    remove_product as remove_suggestions,
+    DEFAULT_LIMIT,
+    MAX_LIMIT,
+)
+
+def _validate_status(value):
+    """Marshmallow validator for the comma-separated status filter"""
+    try:
+        parse_status_filter(value)
+    except ValueError as err:
+        raise ValidationError(str(err))
 
 class ProductQuerySchema(Schema):
     page = fields.Integer(load_default=1, validate=lambda x: 1 <= x <= 1000)
     page_size = fields.Integer(load_default=20, validate=lambda x: 1 <= x <= 100)
     categoria = fields.String(load_default=None, allow_none=True, validate=lambda x: len(x) <= 50 if x else True)
     q = fields.String(load_default=None, allow_none=True, validate=lambda x: len(x) <= 100 if x else True)
+    with_favorites = fields.Boolean(load_default=False)
+    sort = fields.String(load_default=None, allow_none=True, validate=validate.OneOf(SORT_OPTIONS))
+    status = fields.String(load_default=None, allow_none=True, validate=_validate_status)
+    tamanho = fields.String(load_default=None, allow_none=True, validate=validate.Length(max=100))
+    condicao = fields.String(load_default=None, allow_none=True, validate=validate.Length(max=100))
+    marca = fields.String(load_default=None, allow_none=True, validate=validate.Length(max=100))
+    preco_min = fields.Float(load_default=None, allow_none=True, validate=validate.Range(min=0))
+    preco_max = fields.Float(load_default=None, allow_none=True, validate=validate.Range(min=0))
+    facets = fields.Boolean(load_default=False)
+
+class SuggestQuerySchema(Schema):
+    prefix = fields.String(required=True, validate=validate.Length(min=1, max=100))
+    limit = fields.Integer(load_default=DEFAULT_LIMIT, validate=validate.Range(min=1, max=MAX_LIMIT))
 
 from ..models.product_model import (
     get_collection,
+    allocate_product_id,
     prepare_new_product,
     validate_product,
+    validate_image_owner,
     normalize_product,
+    SOLD_STATUS,
 )
-from ..services.supabase_storage import storage_service
+from ..services.storage import storage_service
+from ..services.storage_backend import IMAGE_SIZES, THUMBNAIL_SIZE, is_storage_path, storage_path_product_id
+from ..services.image_urls import resolve_product_images
+from ..services.storage_maintenance import schedule_image_deletion
+from ..services.product_archive import find_product
+from ..services.image_queue import IMAGE_PLACEHOLDER_URL, JOB_PENDING
+from ..utils.cache import discard_cached_product_id, invalidate_search_cache
+from ..models.favorite_model import get_favorited_ids
+from ..controllers.favorites_controller import current_favorites_user
 
 # Create the Blueprint
 products_bp = Blueprint('products', __name__)
 
+@products_bp.after_request
+def _invalidate_search_on_write(response):
+    """Drop cached searches after any successful product write"""
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        invalidate_search_cache()
+    return response
+
+# Maximum accepted size for a product image upload
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+_SIZE_CHECK_CHUNK = 64 * 1024
+
+# Listings only need the thumbnail variant; larger ones are fetched on the detail page
+LISTING_PROJECTION: Dict[str, int] = {
+    "_id": 0,
+    **{f"imagens.{size}": 0 for size in IMAGE_SIZES if size != THUMBNAIL_SIZE},
+}
+
 def _serialize(doc: Dict[str, Any]) -> Dict[str, Any]:
     """Helper function to serialize MongoDB documents"""
     if not doc:
         return {}
-    d = dict(doc)
-    d.pop("_id", None)
-    return d
+    return _serialize_many([doc])[0]
+
+def _serialize_many(docs) -> List[Dict[str, Any]]:
+    """Serialize several products, resolving their image URLs in one batch"""
+    items = []
+    for doc in docs:
+        d = dict(doc)
+        d.pop("_id", None)
+        items.append(d)
+    return resolve_product_images(items)
+
+def _image_fields(paths: Dict[str, str]) -> Dict[str, Any]:
+    """Build the product image fields from an upload_image_set result (storage paths)"""
+    largest = max(paths, key=int)
+    return {"imagem": paths[largest], "imagens": paths}
+
+def _image_within_limit(file, limit: int = MAX_IMAGE_BYTES) -> bool:
+    """Check the upload size without loading the whole file into memory.
+
+    The request Content-Length is an upper bound for the file, so small requests
+    are accepted right away. Otherwise the stream is read in chunks and the check
+    stops as soon as the limit is exceeded; the stream is rewound afterwards.
+    """
+    if request.content_length is not None and request.content_length <= limit:
+        return True
+
+    if file.content_length:
+        return file.content_length <= limit
+
+    total = 0
+    try:
+        while total <= limit:
+            chunk = file.stream.read(_SIZE_CHECK_CHUNK)
+            if not chunk:
+                break
+            total += len(chunk)
+    finally:
+        file.stream.seek(0)
+    return total <= limit
+
+def _stored_image_urls(doc: Dict[str, Any]) -> List[str]:
+    """Collect the storage paths (or legacy URLs) of a product, skipping objects under another product's prefix"""
+    urls = set((doc.get("imagens") or {}).values())
+    if doc.get("imagem"):
+        urls.add(doc["imagem"])
+    return [
+        u for u in urls if isinstance(u, str) and (
+            u.startswith("http")
+            or (is_storage_path(u) and storage_path_product_id(u) in (None, doc.get("id")))
+        )
+    ]
+
+def _annotate_favorites(db, items: List[Dict[str, Any]]) -> None:
+    """Set ``is_favorited`` on each item for the current user (one query for the page)"""
+    user_id = current_favorites_user()
+    if not user_id:
+        return
+    success, _, favorited = get_favorited_ids(db, user_id, [item["id"] for item in items if "id" in item])
+    if not success:
+        return
+    for item in items:
+        item["is_favorited"] = item.get("id") in favorited
 
 @products_bp.route('/', methods=['GET'])
 def list_products():
@@ -50,40 +165,48 @@ def list_products():
     if db is None:
         return jsonify(message="banco de dados indisponível"), 503
 
-    coll = get_collection(db)
-
-    categoria = args.get("categoria")
-    q = args.get("q")
-    page = args['page']
-    page_size = args['page_size']
-
-    query: Dict[str, Any] = {}
-    if categoria:
-        query["categoria"] = categoria
-    if q:
-        query["$text"] = {"$search": q}
-
-    cursor = coll.find(query)
+    if args.get("preco_min") is not None and args.get("preco_max") is not None \
+            and args["preco_min"] > args["preco_max"]:
+        return jsonify({
+            'success': False,
+            'message': 'Parâmetros inválidos',
+            'errors': {'preco_min': ['deve ser menor ou igual a preco_max']}
+        }), 400
 
-    if q:
-        cursor = cursor.sort([("score", {"$meta": "textScore"})])
-    else:
-        cursor = cursor.sort("titulo", 1)
+    # Filters, ranking, facets and result caching live in the search service
+    result = search_products(db, args, LISTING_PROJECTION)
 
-    total = coll.count_documents(query)
+    items = _serialize_many(result["items"])
 
-    items = [
-        _serialize(doc) for doc in cursor.skip((page - 1) * page_size).limit(page_size)
-    ]
+    if args['with_favorites']:
+        _annotate_favorites(db, items)
 
-    return jsonify(
-        items=items,
-        pagination={
-            "page": page,
-            "page_size": page_size,
-            "total": total,
+    response = {
+        "items": items,
+        "pagination": {
+            "page": args['page'],
+            "page_size": args['page_size'],
+            "total": result["total"],
         },
-    )
+    }
+    if "facets" in result:
+        response["facets"] = result["facets"]
+    return jsonify(response)
+
+@products_bp.route('/suggest', methods=['GET'])
+def suggest_products():
+    """Autocomplete for the search box, served from the in-memory index"""
+    try:
+        args = SuggestQuerySchema().load(request.args)
+    except ValidationError as err:
+        return jsonify({
+            'success': False,
+            'message': 'Parâmetros inválidos',
+            'errors': err.messages
+        }), 400
+
+    suggestions = get_suggestions(current_app.db, args['prefix'], args['limit'])
+    return jsonify(prefix=args['prefix'], suggestions=suggestions)
 
 @products_bp.route('/<int:id>', methods=['GET'])
 def get_product(id: int):
@@ -92,8 +215,8 @@ def get_product(id: int):
     if db is None:
         return jsonify(message="banco de dados indisponível"), 503
     
-    coll = get_collection(db)
-    doc = coll.find_one({"id": int(id)})
+    # Sold products moved to the archive are still reachable by id
+    doc = find_product(db, int(id))
     
     if not doc:
         return jsonify(message="produto não encontrado"), 404
@@ -120,6 +243,7 @@ def create_product():
     except DuplicateKeyError:
         return jsonify(message="ID já existente"), 409
 
+    index_product(doc)
     return jsonify(_serialize(doc)), 201
 
 @products_bp.route('/<int:id>', methods=['PUT'])
@@ -143,16 +267,48 @@ def update_product(id: int):
     merged.pop("_id", None)
     merged.update(payload)
     merged = normalize_product(merged)
+    # favorite_count is maintained by $inc in the favorites model: never part of the $set
+    merged.pop("favorite_count", None)
 
     ok, errors = validate_product(merged, db)
-    if not ok:
+    errors.update(validate_image_owner({**merged, "id": current["id"]}, current))
+    if errors:
         return jsonify(message="erro de validação", errors=errors), 400
 
     # Não permitir troca de id
     merged["id"] = current["id"]
 
-    coll.update_one({"id": int(id)}, {"$set": merged})
+    update: Dict[str, Any] = {"$set": merged}
+    unset: Dict[str, str] = {}
+
+    # vendido_em drives archiving: stamped when the product becomes sold, cleared when it stops being sold
+    merged.pop("vendido_em", None)
+    if merged.get("status") == SOLD_STATUS:
+        if current.get("status") != SOLD_STATUS:
+            merged["vendido_em"] = datetime.utcnow()
+        elif current.get("vendido_em"):
+            merged["vendido_em"] = current["vendido_em"]
+    elif "vendido_em" in current:
+        unset["vendido_em"] = ""
+    stale_images: List[str] = []
+    if "imagem" in payload and merged.get("imagem") != current.get("imagem"):
+        # The responsive variants belong to the previous image: drop them unless new ones were sent
+        if "imagens" not in payload:
+            merged.pop("imagens", None)
+            unset["imagens"] = ""
+        kept = {merged.get("imagem"), *(merged.get("imagens") or {}).values()}
+        stale_images = [url for url in _stored_image_urls(current) if url not in kept]
+
+    if unset:
+        update["$unset"] = unset
+    coll.update_one({"id": int(id)}, update)
+    if stale_images:
+        try:
+            schedule_image_deletion(stale_images)
+        except Exception as e:
+            current_app.logger.warning(f"Erro ao deletar imagem: {e}")
     updated = coll.find_one({"id": int(id)})
+    index_product(updated)
     
     return jsonify(_serialize(updated))
 
@@ -171,10 +327,11 @@ def delete_product(id: int):
     if not current:
         return jsonify(message="produto não encontrado"), 404
     
-    # Delete associated image if exists
-    if current.get('imagem') and current['imagem'].startswith('http'):
+    # Delete associated images (main + responsive variants) if they exist
+    image_urls = _stored_image_urls(current)
+    if image_urls:
         try:
-            storage_service.delete_image(current['imagem'])
+            schedule_image_deletion(image_urls)
         except Exception as e:
             current_app.logger.warning(f"Erro ao deletar imagem: {e}")
     
@@ -182,6 +339,8 @@ def delete_product(id: int):
     res = coll.delete_one({"id": int(id)})
     if res.deleted_count == 0:
         return jsonify(message="erro ao excluir produto"), 500
+    discard_cached_product_id(int(id))
+    remove_suggestions(int(id))
     
     return jsonify(message="produto excluído"), 200
 
@@ -224,15 +383,12 @@ def create_product_with_image():
                 errors={"image": f"Apenas os formatos {', '.join(allowed_extensions)} são permitidos"}
             ), 400
             
-        # Validate file size (max 5MB)
-        file_content = file.read()
-        if len(file_content) > 5 * 1024 * 1024:  # 5MB in bytes
+        # Validate file size (max 5MB) without buffering the whole file
+        if not _image_within_limit(file):
             return jsonify(
                 message="Arquivo muito grande",
                 errors={"image": "O tamanho máximo permitido é 5MB"}
             ), 400
-            
-        file.seek(0)  # Reset file pointer after reading
         
         # Get product data from form
         form_data = {
@@ -268,45 +424,66 @@ def create_product_with_image():
         except (ValueError, TypeError):
             return jsonify(message="Preço deve ser um número válido"), 400
         
-        # First upload image to get URL
-        # Use temporary ID for upload
-        temp_id = int(time.time() * 1000)  # Timestamp as temporary ID
-        success, result = storage_service.upload_image(file, temp_id)
+        # Validate everything but the image before touching storage,
+        # so invalid products never cost an upload
+        ok, errors = validate_product({**form_data, "imagem": "/pending"}, db)
+        if not ok:
+            return jsonify(message="erro de validação", errors=errors), 400
         
-        if not success:
-            return jsonify(message=f"Erro no upload da imagem: {result}"), 400
+        # Reserve the real id first so the image is stored once under product_<id>/
+        coll = get_collection(db)
+        form_data['id'] = allocate_product_id(db)
         
-        # Add image URL to product data
-        form_data['imagem'] = result
+        queue = getattr(current_app, 'image_queue', None)
+        job_id = None
+        uploaded_urls: List[str] = []
+        if queue is not None:
+            # Background processing: product starts with a placeholder image
+            job_id = queue.new_job_id()
+            form_data.update({
+                "imagem": IMAGE_PLACEHOLDER_URL,
+                "imagem_status": JOB_PENDING,
+                "imagem_job": job_id,
+            })
+        else:
+            success, result = storage_service.upload_image_set(file, form_data['id'])
+            
+            if not success:
+                return jsonify(message=f"Erro no upload da imagem: {result}"), 400
+            
+            # Add image URLs (main + responsive variants) to product data
+            form_data.update(_image_fields(result))
+            uploaded_urls = list(result.values())
         
-        # Now prepare product with all data (including image)
-        coll = get_collection(db)
         ok, errors, product_doc = prepare_new_product(db, form_data)
         if not ok:
-            # If validation fails, remove already uploaded image
-            storage_service.delete_image(result)
+            # If validation still fails, remove already uploaded images
+            if uploaded_urls:
+                schedule_image_deletion(uploaded_urls)
             return jsonify(message="erro de validação", errors=errors), 400
         
-        # Rename file to use real product ID
-        product_id = product_doc['id']
-        if temp_id != product_id:
-            # Upload again with correct ID
-            file.stream.seek(0)  # Reset file stream
-            success_final, final_url = storage_service.upload_image(file, product_id)
-            if success_final:
-                # Remove temporary file and use new URL
-                storage_service.delete_image(result)
-                product_doc['imagem'] = final_url
-            # If re-upload fails, keep temporary but it still works
-        
         # Insert product into database
         try:
             coll.insert_one(product_doc)
         except DuplicateKeyError:
-            # If it fails, try to delete uploaded image
-            storage_service.delete_image(result)
+            # If it fails, try to delete uploaded images
+            if uploaded_urls:
+                schedule_image_deletion(uploaded_urls)
             return jsonify(message="ID já existente"), 409
         
+        index_product(product_doc)
+        
+        if job_id:
+            job = queue.submit(
+                file.stream.read(), file.filename, file.content_type,
+                product_doc['id'], job_id=job_id,
+            )
+            return jsonify({
+                "message": "Produto criado. Imagem em processamento",
+                "product": _serialize(product_doc),
+                "image_job": job,
+            }), 202
+        
         return jsonify({
             "message": "Produto criado com sucesso",
             "product": _serialize(product_doc)
@@ -346,21 +523,38 @@ def update_product_image(id: int):
         return jsonify(message="Nenhuma imagem selecionada"), 400
     
     try:
-        # Upload new image
-        success, result = storage_service.upload_image(file, id)
+        queue = getattr(current_app, 'image_queue', None)
+        if queue is not None:
+            # Keep the current image until the worker swaps in the new one
+            job_id = queue.new_job_id()
+            coll.update_one(
+                {"id": int(id)},
+                {"$set": {"imagem_status": JOB_PENDING, "imagem_job": job_id}}
+            )
+            job = queue.submit(
+                file.stream.read(), file.filename, file.content_type, int(id),
+                replace_urls=_stored_image_urls(current_product), job_id=job_id,
+            )
+            return jsonify({
+                "message": "Imagem em processamento",
+                "image_job": job,
+            }), 202
+        
+        # Upload new image (all responsive variants)
+        success, result = storage_service.upload_image_set(file, id)
         
         if not success:
             return jsonify(message=f"Erro no upload: {result}"), 400
         
-        # Delete old image if it exists
-        old_image_url = current_product.get('imagem')
-        if old_image_url and old_image_url.startswith('http'):
-            storage_service.delete_image(old_image_url)
+        # Delete old images (main + variants) if they exist
+        old_image_urls = _stored_image_urls(current_product)
+        if old_image_urls:
+            schedule_image_deletion(old_image_urls)
         
-        # Update product with new URL
+        # Update product with new URLs
         coll.update_one(
             {"id": int(id)}, 
-            {"$set": {"imagem": result}}
+            {"$set": _image_fields(result)}
         )
         
         # Return updated product
@@ -386,13 +580,22 @@ def get_products_by_category(categoria: str):
     page = max(int(request.args.get("page", 1) or 1), 1)
     page_size = min(max(int(request.args.get("page_size", 20) or 20), 1), 100)
 
-    query = {"categoria": categoria}
-    cursor = coll.find(query).sort("titulo", 1)
+    # Same default and validation as list_products: available items only, unless status=todos
+    try:
+        statuses = parse_status_filter(request.args.get("status") or None)
+    except ValueError as err:
+        return jsonify({
+            'success': False,
+            'message': 'Parâmetros inválidos',
+            'errors': {'status': [str(err)]}
+        }), 400
+    query: Dict[str, Any] = {"categoria": categoria}
+    if statuses:
+        query["status"] = statuses[0] if len(statuses) == 1 else {"$in": statuses}
+    cursor = coll.find(query, LISTING_PROJECTION).sort("titulo", 1)
     total = coll.count_documents(query)
 
-    items = [
-        _serialize(doc) for doc in cursor.skip((page - 1) * page_size).limit(page_size)
-    ]
+    items = _serialize_many(cursor.skip((page - 1) * page_size).limit(page_size))
 
     if not items:
         return jsonify(message="nenhum produto encontrado para essa categoria"), 404
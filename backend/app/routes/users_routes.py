@@ -16,6 +16,7 @@ from app.controllers.users_controller import (
     request_account_deletion,
     confirm_account_deletion,
     refresh_token_endpoint,
+    logout_user,
 )
 from app.services.jwt_service import jwt_required, admin_required, owner_or_admin_required
 
@@ -82,6 +83,12 @@ def auth_endpoint():
         return limited_auth()
     return authenticate_user()
 
+@users_bp.route("/logout", methods=["POST"])
+@jwt_required
+def logout_endpoint():
+    """Encerra a sessão revogando os tokens."""
+    return logout_user()
+
 @users_bp.route("/<int:id>/change-password", methods=["PUT"])
 @owner_or_admin_required('id')
 def change_password_endpoint(id):
@@ -0,0 +1,416 @@
+"""
+Autocomplete da busca de produtos.
+
+Índice em memória (trie de palavras) montado a partir do ``titulo`` e da
+``categoria`` dos produtos à venda. Cada palavra normalizada (minúsculas,
+sem acentos) aponta para as sugestões que a contêm; a consulta percorre a
+trie pelo prefixo digitado e, se houver poucos resultados, completa com
+palavras a até 1-2 edições de distância do prefixo (tolerância a erros de
+digitação), calculadas sobre a própria trie.
+
+O índice é carregado na inicialização (ou na primeira consulta), atualizado
+incrementalmente pelas escritas de produtos e reconstruído periodicamente
+para absorver alterações feitas por outros processos.
+"""
+import os
+import re
+import time
+import logging
+import threading
+import unicodedata
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..models.product_model import get_collection
+
+logger = logging.getLogger(__name__)
+
+# Limites de memória: produtos indexados e tamanho das palavras
+MAX_INDEXED_PRODUCTS = int(os.getenv("AUTOCOMPLETE_MAX_PRODUCTS", "100000"))
+MAX_TOKEN_LENGTH = 32
+# Sugestões candidatas examinadas por consulta (antes da ordenação)
+MAX_CANDIDATES = 200
+# Nós da trie visitados na busca aproximada (limita o pior caso)
+MAX_FUZZY_NODES = 5000
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+# Produtos com estes status não são sugeridos
+HIDDEN_STATUS = ("vendido",)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+SuggestionKey = Tuple[str, Any]
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas e sem acentos ("Calçado" -> "calcado")."""
+    decomposed = unicodedata.normalize("NFKD", str(text or "").lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Palavras normalizadas do texto (sem repetições, na ordem)."""
+    seen: Dict[str, None] = {}
+    for token in _TOKEN_RE.findall(normalize_text(text)):
+        seen.setdefault(token[:MAX_TOKEN_LENGTH], None)
+    return list(seen)
+
+
+def _max_edits(prefix: str) -> int:
+    """Edições toleradas: nenhuma até 2 letras, 1 até 5 e 2 a partir daí."""
+    if len(prefix) < 3:
+        return 0
+    return 1 if len(prefix) <= 5 else 2
+
+
+def _prefix_distance(prefix: str, word: str, max_edits: int) -> int:
+    """Menor distância de edição entre ``prefix`` e um início de ``word``."""
+    if word.startswith(prefix):
+        return 0
+    if not max_edits or prefix[:1] != word[:1]:
+        return max_edits + 1
+    row = list(range(len(word) + 1))
+    for i, char in enumerate(prefix, 1):
+        previous, row = row, [i]
+        for j, other in enumerate(word, 1):
+            cost = 0 if char == other else 1
+            row.append(min(row[j - 1] + 1, previous[j] + 1, previous[j - 1] + cost))
+    return min(row)
+
+
+class _Node:
+    __slots__ = ("children", "keys")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.keys: Set[SuggestionKey] = set()
+
+
+class SuggestionIndex:
+    """Trie de palavras -> sugestões (produtos e categorias)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.loaded = False
+
+    def _reset(self):
+        self._root = _Node()
+        self._nodes = 1
+        # chave -> texto exibido e suas palavras; produto -> categoria; categoria -> nº de produtos
+        self._texts: Dict[SuggestionKey, str] = {}
+        self._words: Dict[SuggestionKey, Tuple[str, ...]] = {}
+        self._product_category: Dict[int, str] = {}
+        self._category_refs: Dict[str, int] = {}
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+    def _insert(self, key: SuggestionKey, text: str):
+        self._texts[key] = text
+        self._words[key] = tuple(tokenize(text))
+        for token in self._words[key]:
+            node = self._root
+            for char in token:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                    self._nodes += 1
+                node = child
+            node.keys.add(key)
+
+    def _delete(self, key: SuggestionKey):
+        if self._texts.pop(key, None) is None:
+            return
+        for token in self._words.pop(key):
+            path = [self._root]
+            for char in token:
+                node = path[-1].children.get(char)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                path[-1].keys.discard(key)
+                # Remove os nós que ficaram vazios
+                for depth in range(len(token), 0, -1):
+                    node = path[depth]
+                    if node.keys or node.children:
+                        break
+                    del path[depth - 1].children[token[depth - 1]]
+                    self._nodes -= 1
+
+    def add_product(self, doc: Dict[str, Any]) -> bool:
+        """
+        Indexa (ou reindexa) um produto.
+
+        Returns:
+            False se o produto não pode ser sugerido ou o limite foi atingido
+        """
+        product_id = doc.get("id")
+        titulo = doc.get("titulo")
+        if product_id is None:
+            return False
+        with self._lock:
+            self.remove_product(product_id)
+            if not titulo or doc.get("status") in HIDDEN_STATUS:
+                return False
+            if len(self._product_category) >= MAX_INDEXED_PRODUCTS:
+                return False
+
+            self._insert(("produto", product_id), titulo)
+            categoria = doc.get("categoria") or ""
+            self._product_category[product_id] = categoria
+            if categoria:
+                refs = self._category_refs.get(categoria, 0)
+                if refs == 0:
+                    self._insert(("categoria", categoria), categoria)
+                self._category_refs[categoria] = refs + 1
+            return True
+
+    def remove_product(self, product_id: int):
+        """Remove um produto (e a categoria, se era o último dela)."""
+        with self._lock:
+            if product_id not in self._product_category:
+                return
+            categoria = self._product_category.pop(product_id)
+            self._delete(("produto", product_id))
+            if categoria:
+                refs = self._category_refs.get(categoria, 0) - 1
+                if refs <= 0:
+                    self._category_refs.pop(categoria, None)
+                    self._delete(("categoria", categoria))
+                else:
+                    self._category_refs[categoria] = refs
+
+    def rebuild(self, docs: Iterable[Dict[str, Any]]) -> int:
+        """Reconstrói o índice a partir dos produtos informados."""
+        fresh = SuggestionIndex()
+        for doc in docs:
+            fresh.add_product(doc)
+        with self._lock:
+            self._root = fresh._root
+            self._nodes = fresh._nodes
+            self._texts = fresh._texts
+            self._words = fresh._words
+            self._product_category = fresh._product_category
+            self._category_refs = fresh._category_refs
+            self.loaded = True
+            return len(self._product_category)
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+    def _find_node(self, prefix: str) -> Optional[_Node]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def _collect(node: _Node, found: Dict[SuggestionKey, int], distance: int):
+        """Adiciona as chaves da subárvore (até MAX_CANDIDATES)."""
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for key in current.keys:
+                if found.get(key, distance + 1) > distance:
+                    found[key] = distance
+                if len(found) >= MAX_CANDIDATES:
+                    return
+            stack.extend(current.children.values())
+
+    def _fuzzy(self, prefix: str, max_edits: int, found: Dict[SuggestionKey, int]):
+        """
+        Palavras cujo início está a até ``max_edits`` edições do prefixo.
+        A primeira letra precisa casar, o que limita a busca a um ramo da trie.
+        """
+        start = self._root.children.get(prefix[0])
+        if start is None:
+            return
+
+        def next_row(previous: List[int], char: str) -> List[int]:
+            row = [previous[0] + 1]
+            for i in range(1, len(prefix) + 1):
+                cost = 0 if prefix[i - 1] == char else 1
+                row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + cost))
+            return row
+
+        first_row = next_row(list(range(len(prefix) + 1)), prefix[0])
+        stack = [(child, char, first_row) for char, child in start.children.items()]
+        visited = 0
+        while stack and len(found) < MAX_CANDIDATES and visited < MAX_FUZZY_NODES:
+            node, char, previous = stack.pop()
+            visited += 1
+            row = next_row(previous, char)
+            best = min(row)
+            if row[-1] <= max_edits and row[-1] == best:
+                # Descer não reduz a distância: a subárvore toda casa
+                self._collect(node, found, row[-1])
+                continue
+            if row[-1] <= max_edits:
+                for key in node.keys:
+                    found[key] = min(found.get(key, row[-1]), row[-1])
+            if best <= max_edits:
+                stack.extend((child, c, row) for c, child in node.children.items())
+
+    def _match_token(self, token: str, fuzzy: bool) -> Dict[SuggestionKey, int]:
+        found: Dict[SuggestionKey, int] = {}
+        node = self._find_node(token)
+        if node is not None:
+            self._collect(node, found, 0)
+        max_edits = _max_edits(token)
+        if fuzzy and max_edits and len(found) < MAX_CANDIDATES:
+            self._fuzzy(token, max_edits, found)
+        return found
+
+    def suggest(self, prefix: str, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Sugestões para o texto digitado.
+
+        Todas as palavras do texto devem casar (a última como prefixo). As
+        correspondências exatas vêm antes das aproximadas; categorias antes
+        de produtos; títulos mais curtos primeiro.
+
+        Args:
+            prefix: Texto digitado
+            limit: Máximo de sugestões
+
+        Returns:
+            Lista de dicionários com ``tipo``, ``texto`` e ``id`` (produtos)
+        """
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+
+        with self._lock:
+            matches = self._search(tokens, fuzzy=False)
+            if len(matches) < limit:
+                for key, distance in self._search(tokens, fuzzy=True).items():
+                    matches.setdefault(key, distance)
+
+            ranked = sorted(
+                matches.items(),
+                key=lambda item: (item[1], item[0][0] != "categoria", len(self._texts[item[0]]),
+                                  self._texts[item[0]]),
+            )[:limit]
+            return [
+                {"tipo": kind, "texto": self._texts[(kind, value)],
+                 **({"id": value} if kind == "produto" else {})}
+                for (kind, value), _ in ranked
+            ]
+
+    def _search(self, tokens: List[str], fuzzy: bool) -> Dict[SuggestionKey, int]:
+        """
+        Sugestões que casam com todas as palavras.
+
+        Os candidatos vêm da palavra mais seletiva (menos candidatos); as
+        demais são conferidas diretamente no texto de cada candidato.
+        """
+        candidates = [self._match_token(token, fuzzy) for token in tokens]
+        if len(tokens) == 1:
+            return candidates[0]
+        driver_index = min(range(len(tokens)), key=lambda i: len(candidates[i]))
+        matches: Dict[SuggestionKey, int] = {}
+        for key, distance in candidates[driver_index].items():
+            words = self._words[key]
+            for i, token in enumerate(tokens):
+                if i == driver_index:
+                    continue
+                allowed = _max_edits(token) if fuzzy else 0
+                token_distance = min(_prefix_distance(token, word, allowed) for word in words)
+                if token_distance > allowed:
+                    break
+                distance = max(distance, token_distance)
+            else:
+                matches[key] = distance
+        return matches
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamanho do índice."""
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "products": len(self._product_category),
+                "categories": len(self._category_refs),
+                "nodes": self._nodes,
+                "max_products": MAX_INDEXED_PRODUCTS,
+            }
+
+
+# Índice único do processo
+suggestion_index = SuggestionIndex()
+
+
+def load_index(db) -> int:
+    """Carrega o índice a partir da coleção de produtos."""
+    cursor = get_collection(db).find(
+        {"status": {"$nin": list(HIDDEN_STATUS)}},
+        {"_id": 0, "id": 1, "titulo": 1, "categoria": 1, "status": 1},
+    )
+    return suggestion_index.rebuild(cursor)
+
+
+def get_suggestions(db, prefix: str, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+    """Sugestões para o prefixo (carrega o índice na primeira consulta)."""
+    if not suggestion_index.loaded and db is not None:
+        load_index(db)
+    return suggestion_index.suggest(prefix, limit)
+
+
+def index_product(doc: Optional[Dict[str, Any]]):
+    """Atualiza o índice após criar/alterar um produto."""
+    if doc and suggestion_index.loaded:
+        suggestion_index.add_product(doc)
+
+
+def remove_product(product_id: int):
+    """Atualiza o índice após excluir (ou vender) um produto."""
+    if suggestion_index.loaded:
+        suggestion_index.remove_product(product_id)
+
+
+def refresh_product(db, product_id: int):
+    """Relê o produto do banco e atualiza o índice."""
+    if not suggestion_index.loaded:
+        return
+    doc = get_collection(db).find_one({"id": product_id})
+    if doc is None:
+        suggestion_index.remove_product(product_id)
+    else:
+        suggestion_index.add_product(doc)
+
+
+def _start_periodic_rebuild(app, interval: timedelta) -> threading.Thread:
+    """Reconstrói o índice periodicamente em uma thread daemon."""
+    def loop():
+        while True:
+            time.sleep(interval.total_seconds())
+            if app.db is None:
+                continue
+            try:
+                load_index(app.db)
+            except Exception as e:
+                logger.error(f"Erro ao reconstruir índice de autocomplete: {e}")
+
+    thread = threading.Thread(target=loop, name="autocomplete-rebuild", daemon=True)
+    thread.start()
+    return thread
+
+
+def init_autocomplete(app) -> Optional[threading.Thread]:
+    """Carrega o índice e agenda a reconstrução (AUTOCOMPLETE_REBUILD_MINUTES, 0 desativa)."""
+    if app.db is None:
+        return None
+    try:
+        count = load_index(app.db)
+        print(f"✅ Autocomplete: {count} produtos indexados")
+    except Exception as e:
+        print(f"⚠️  Erro ao carregar índice de autocomplete: {e}")
+
+    interval_minutes = float(os.getenv("AUTOCOMPLETE_REBUILD_MINUTES", "30"))
+    if interval_minutes <= 0:
+        return None
+    return _start_periodic_rebuild(app, timedelta(minutes=interval_minutes))
@@ -8,7 +8,10 @@ import json
 from pathlib import Path
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
+from flask import current_app, has_app_context
+
+from .email_templates import EmailTemplateRegistry
 
 # Configurações de email (devem ser definidas nas variáveis de ambiente)
 SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
@@ -67,11 +70,63 @@ def get_app_url() -> str:
 # URL base da aplicação (carregada dinamicamente)
 APP_URL = get_app_url()
 
+# Templates de email (app/templates/email), compilados uma única vez
+email_templates = EmailTemplateRegistry(globals_={'brand': 'Luxus Brechó', 'app_url': APP_URL})
+
+# Título, mensagem, cor e ícone dos emails de status de pedido
+ORDER_STATUS_CONFIG = {
+    'pendente': {'title': 'Pedido Recebido', 'message': 'Seu pedido foi recebido e está sendo processado.', 'color': '#F59E0B', 'icon': '📦'},
+    'confirmado': {'title': 'Pedido Confirmado', 'message': 'Seu pedido foi confirmado e está sendo preparado para envio.', 'color': '#3B82F6', 'icon': '✅'},
+    'enviado': {'title': 'Pedido Enviado', 'message': 'Seu pedido foi enviado! Em breve você receberá em seu endereço.', 'color': '#8B5CF6', 'icon': '🚚'},
+    'entregue': {'title': 'Pedido Entregue', 'message': 'Seu pedido foi entregue! Esperamos que você aproveite suas peças.', 'color': '#10B981', 'icon': '🎉'},
+    'cancelado': {'title': 'Pedido Cancelado', 'message': 'Seu pedido foi cancelado. Se tiver dúvidas, entre em contato conosco.', 'color': '#EF4444', 'icon': '❌'},
+}
+
+
+def build_message(to_email: str, subject: str, html_content: str, text_content: Optional[str] = None) -> MIMEMultipart:
+    """
+    Monta a mensagem MIME (texto puro + HTML).
+    
+    Args:
+        to_email: Email do destinatário
+        subject: Assunto do email
+        html_content: Conteúdo HTML do email
+        text_content: Conteúdo em texto puro (opcional)
+    
+    Returns:
+        Mensagem pronta para envio
+    """
+    message = MIMEMultipart('alternative')
+    message['From'] = f'{FROM_NAME} <{FROM_EMAIL}>'
+    message['To'] = to_email
+    message['Subject'] = subject
+    
+    # Adiciona conteúdo em texto puro
+    if text_content:
+        part1 = MIMEText(text_content, 'plain', 'utf-8')
+        message.attach(part1)
+    
+    # Adiciona conteúdo HTML
+    part2 = MIMEText(html_content, 'html', 'utf-8')
+    message.attach(part2)
+    
+    return message
+
+
+def _get_mail_queue():
+    """Fila de emails da aplicação atual, se habilitada."""
+    if not has_app_context():
+        return None
+    return getattr(current_app, 'mail_queue', None)
+
 
 def send_email(to_email: str, subject: str, html_content: str, text_content: Optional[str] = None) -> bool:
     """
     Envia email usando SMTP.
     
+    Com a fila de emails habilitada (``app.mail_queue``), o email é apenas
+    gravado na fila e enviado em segundo plano; sem fila, é enviado na hora.
+    
     Args:
         to_email: Email do destinatário
         subject: Assunto do email
@@ -79,7 +134,7 @@ def send_email(to_email: str, subject: str, html_content: str, text_content: Opt
         text_content: Conteúdo em texto puro (opcional)
     
     Returns:
-        True se email foi enviado com sucesso, False caso contrário
+        True se email foi enviado (ou enfileirado) com sucesso, False caso contrário
     """
     # Verifica se as configurações de email estão definidas
     if not SMTP_USER or not SMTP_PASSWORD:
@@ -88,21 +143,17 @@ def send_email(to_email: str, subject: str, html_content: str, text_content: Opt
         print(f"   Assunto: {subject}")
         return False
     
+    queue = _get_mail_queue()
+    if queue is not None:
+        try:
+            queue.enqueue(to_email, subject, html_content, text_content)
+            return True
+        except Exception as e:
+            # Fila indisponível (ex.: banco fora do ar): tenta o envio direto
+            print(f"⚠️  Erro ao enfileirar email para {to_email}: {e}")
+    
     try:
-        # Cria mensagem
-        message = MIMEMultipart('alternative')
-        message['From'] = f'{FROM_NAME} <{FROM_EMAIL}>'
-        message['To'] = to_email
-        message['Subject'] = subject
-        
-        # Adiciona conteúdo em texto puro
-        if text_content:
-            part1 = MIMEText(text_content, 'plain', 'utf-8')
-            message.attach(part1)
-        
-        # Adiciona conteúdo HTML
-        part2 = MIMEText(html_content, 'html', 'utf-8')
-        message.attach(part2)
+        message = build_message(to_email, subject, html_content, text_content)
         
         # Conecta ao servidor SMTP e envia
         with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
@@ -118,6 +169,50 @@ def send_email(to_email: str, subject: str, html_content: str, text_content: Opt
         return False
 
 
+def send_emails(emails: List[Tuple[str, str, str, Optional[str]]]) -> List[Dict[str, Any]]:
+    """
+    Envia vários emails de uma vez.
+    
+    Com a fila habilitada, todos são enfileirados (e enviados pela conexão
+    SMTP da fila); sem fila, o lote inteiro usa uma única conexão SMTP.
+    
+    Args:
+        emails: Tuplas (destinatário, assunto, html, texto)
+    
+    Returns:
+        Resultado por email: ``{"sent", "mail_id", "error"}``
+    """
+    if not SMTP_USER or not SMTP_PASSWORD:
+        print(f"⚠️  Configurações de email não definidas. {len(emails)} email(s) não serão enviados.")
+        return [{'sent': False, 'mail_id': None, 'error': 'SMTP não configurado'} for _ in emails]
+    
+    results = []
+    queue = _get_mail_queue()
+    if queue is not None:
+        for to_email, subject, html_content, text_content in emails:
+            try:
+                mail_id = queue.enqueue(to_email, subject, html_content, text_content)
+                results.append({'sent': True, 'mail_id': mail_id, 'error': None})
+            except Exception as e:
+                results.append({'sent': False, 'mail_id': None, 'error': str(e)})
+        return results
+    
+    from .mail_queue import SmtpConnection
+    connection = SmtpConnection(SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD)
+    try:
+        for to_email, subject, html_content, text_content in emails:
+            try:
+                connection.send(build_message(to_email, subject, html_content, text_content))
+                results.append({'sent': True, 'mail_id': None, 'error': None})
+            except Exception as e:
+                print(f"❌ Erro ao enviar email para {to_email}: {e}")
+                results.append({'sent': False, 'mail_id': None, 'error': str(e)})
+    finally:
+        connection.close()
+    
+    return results
+
+
 def send_confirmation_email(to_email: str, nome: str, token: str, is_admin: bool = False) -> bool:
     """
     Envia email de confirmação de cadastro.
@@ -142,110 +237,13 @@ def send_confirmation_email(to_email: str, nome: str, token: str, is_admin: bool
         welcome_text = "Bem-vindo(a) ao Luxus Brechó!"
         role_text = "Estamos felizes em tê-lo(a) conosco!"
     
-    # Conteúdo em texto puro
-    text_content = f"""
-Olá {nome}!
-
-{welcome_text}
-
-{role_text}
-
-Para ativar sua conta, por favor confirme seu email clicando no link abaixo:
-
-{confirmation_url}
-
-Este link é válido por 24 horas.
-
-Se você não criou esta conta, ignore este email.
-
-Atenciosamente,
-Equipe Luxus Brechó
-    """
-    
-    # Conteúdo HTML
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="pt-BR">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Confirme seu email</title>
-    </head>
-    <body style="margin: 0; padding: 0; font-family: Arial, sans-serif; background-color: #f5f5f5;">
-        <table role="presentation" style="width: 100%; border-collapse: collapse;">
-            <tr>
-                <td align="center" style="padding: 40px 0;">
-                    <table role="presentation" style="width: 600px; border-collapse: collapse; background-color: #ffffff; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                        <!-- Header -->
-                        <tr>
-                            <td style="padding: 40px 40px 20px 40px; text-align: center; background-color: #E91E63; border-radius: 8px 8px 0 0;">
-                                <h1 style="margin: 0; color: #ffffff; font-size: 32px; font-weight: bold; letter-spacing: 2px;">LUXUS</h1>
-                                <p style="margin: 5px 0 0 0; color: #ffffff; font-size: 14px; letter-spacing: 4px;">BRECHÓ</p>
-                            </td>
-                        </tr>
-                        
-                        <!-- Conteúdo -->
-                        <tr>
-                            <td style="padding: 40px;">
-                                <h2 style="margin: 0 0 20px 0; color: #333333; font-size: 24px;">Olá {nome}!</h2>
-                                
-                                <p style="margin: 0 0 20px 0; color: #666666; font-size: 16px; line-height: 1.6;">
-                                    {welcome_text}
-                                </p>
-                                
-                                <p style="margin: 0 0 20px 0; color: #666666; font-size: 16px; line-height: 1.6;">
-                                    {role_text}
-                                </p>
-                                
-                                <p style="margin: 0 0 30px 0; color: #666666; font-size: 16px; line-height: 1.6;">
-                                    Para ativar sua conta, por favor confirme seu email clicando no botão abaixo:
-                                </p>
-                                
-                                <!-- Botão -->
-                                <table role="presentation" style="width: 100%; border-collapse: collapse;">
-                                    <tr>
-                                        <td align="center" style="padding: 0 0 30px 0;">
-                                            <a href="{confirmation_url}" style="display: inline-block; padding: 16px 40px; background-color: #E91E63; color: #ffffff; text-decoration: none; border-radius: 8px; font-size: 16px; font-weight: bold;">
-                                                Confirmar Email
-                                            </a>
-                                        </td>
-                                    </tr>
-                                </table>
-                                
-                                <p style="margin: 0 0 10px 0; color: #999999; font-size: 14px; line-height: 1.6;">
-                                    Ou copie e cole o link abaixo no seu navegador:
-                                </p>
-                                
-                                <p style="margin: 0 0 30px 0; color: #E91E63; font-size: 12px; line-height: 1.6; word-break: break-all;">
-                                    {confirmation_url}
-                                </p>
-                                
-                                <p style="margin: 0 0 10px 0; color: #999999; font-size: 14px; line-height: 1.6;">
-                                    ⏰ Este link é válido por <strong>24 horas</strong>.
-                                </p>
-                                
-                                <p style="margin: 0; color: #999999; font-size: 14px; line-height: 1.6;">
-                                    Se você não criou esta conta, ignore este email.
-                                </p>
-                            </td>
-                        </tr>
-                        
-                        <!-- Footer -->
-                        <tr>
-                            <td style="padding: 30px 40px; background-color: #f8f9fa; border-radius: 0 0 8px 8px; text-align: center;">
-                                <p style="margin: 0; color: #999999; font-size: 12px;">
-                                    Atenciosamente,<br>
-                                    <strong>Equipe Luxus Brechó</strong>
-                                </p>
-                            </td>
-                        </tr>
-                    </table>
-                </td>
-            </tr>
-        </table>
-    </body>
-    </html>
-    """
+    html_content, text_content = email_templates.render(
+        'confirmation',
+        nome=nome,
+        confirmation_url=confirmation_url,
+        welcome_text=welcome_text,
+        role_text=role_text,
+    )
     
     return send_email(to_email, subject, html_content, text_content)
 
@@ -262,70 +260,7 @@ def send_welcome_email(to_email: str, nome: str) -> bool:
         True se email foi enviado com sucesso
     """
     subject = "Bem-vindo ao Luxus Brechó!"
-    
-    text_content = f"""
-Olá {nome}!
-
-Sua conta foi ativada com sucesso!
-
-Agora você pode aproveitar todas as funcionalidades do Luxus Brechó.
-
-Atenciosamente,
-Equipe Luxus Brechó
-    """
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="pt-BR">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Bem-vindo!</title>
-    </head>
-    <body style="margin: 0; padding: 0; font-family: Arial, sans-serif; background-color: #f5f5f5;">
-        <table role="presentation" style="width: 100%; border-collapse: collapse;">
-            <tr>
-                <td align="center" style="padding: 40px 0;">
-                    <table role="presentation" style="width: 600px; border-collapse: collapse; background-color: #ffffff; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                        <!-- Header -->
-                        <tr>
-                            <td style="padding: 40px 40px 20px 40px; text-align: center; background-color: #E91E63; border-radius: 8px 8px 0 0;">
-                                <h1 style="margin: 0; color: #ffffff; font-size: 32px; font-weight: bold; letter-spacing: 2px;">LUXUS</h1>
-                                <p style="margin: 5px 0 0 0; color: #ffffff; font-size: 14px; letter-spacing: 4px;">BRECHÓ</p>
-                            </td>
-                        </tr>
-                        
-                        <!-- Conteúdo -->
-                        <tr>
-                            <td style="padding: 40px;">
-                                <h2 style="margin: 0 0 20px 0; color: #333333; font-size: 24px;">🎉 Bem-vindo(a), {nome}!</h2>
-                                
-                                <p style="margin: 0 0 20px 0; color: #666666; font-size: 16px; line-height: 1.6;">
-                                    Sua conta foi <strong>ativada com sucesso</strong>!
-                                </p>
-                                
-                                <p style="margin: 0; color: #666666; font-size: 16px; line-height: 1.6;">
-                                    Agora você pode aproveitar todas as funcionalidades do <strong>Luxus Brechó</strong>.
-                                </p>
-                            </td>
-                        </tr>
-                        
-                        <!-- Footer -->
-                        <tr>
-                            <td style="padding: 30px 40px; background-color: #f8f9fa; border-radius: 0 0 8px 8px; text-align: center;">
-                                <p style="margin: 0; color: #999999; font-size: 12px;">
-                                    Atenciosamente,<br>
-                                    <strong>Equipe Luxus Brechó</strong>
-                                </p>
-                            </td>
-                        </tr>
-                    </table>
-                </td>
-            </tr>
-        </table>
-    </body>
-    </html>
-    """
+    html_content, text_content = email_templates.render('welcome', nome=nome)
     
     return send_email(to_email, subject, html_content, text_content)
 
@@ -347,60 +282,7 @@ def send_password_reset_email(to_email: str, nome: str, token: str) -> bool:
     reset_url = f"{frontend_url}/redefinir-senha/{token}"
     subject = "Recuperação de Senha - Luxus Brechó"
     
-    text_content = f"""
-Olá {nome}!
-
-Recebemos uma solicitação para redefinir a senha da sua conta no Luxus Brechó.
-
-Para criar uma nova senha, clique no link abaixo:
-{reset_url}
-
-Este link é válido por 1 hora.
-
-Se você não solicitou a redefinição de senha, ignore este email.
-
-Atenciosamente,
-Equipe Luxus Brechó
-    """
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-    </head>
-    <body style="margin: 0; padding: 0; font-family: Arial, sans-serif; background-color: #f5f5f5;">
-        <table role="presentation" style="width: 100%; border-collapse: collapse;">
-            <tr>
-                <td align="center" style="padding: 40px 0;">
-                    <table role="presentation" style="width: 600px; background-color: #ffffff; box-shadow: 0 2px 8px rgba(0,0,0,0.1);">
-                        <tr>
-                            <td style="padding: 40px 30px; text-align: center; background: linear-gradient(135deg, #E91E63 0%, #c2185b 100%);">
-                                <h1 style="margin: 0; color: #ffffff; font-size: 32px; font-weight: bold;">LUXUS BRECHÓ</h1>
-                            </td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 40px 30px;">
-                                <h2 style="margin: 0 0 20px 0; color: #333333;">Recuperação de Senha</h2>
-                                <p style="margin: 0 0 20px 0; color: #666666;">Olá <strong>{nome}</strong>!</p>
-                                <p style="margin: 0 0 30px 0; color: #666666;">Para redefinir sua senha, clique no botão abaixo:</p>
-                                <table role="presentation" style="margin: 0 auto;">
-                                    <tr>
-                                        <td style="border-radius: 8px; background: #E91E63;">
-                                            <a href="{reset_url}" style="display: inline-block; padding: 16px 40px; color: #ffffff; text-decoration: none; font-weight: bold;">Redefinir Senha</a>
-                                        </td>
-                                    </tr>
-                                </table>
-                                <p style="margin: 30px 0 0 0; color: #999999; font-size: 14px;">Este link é válido por 1 hora.</p>
-                            </td>
-                        </tr>
-                    </table>
-                </td>
-            </tr>
-        </table>
-    </body>
-    </html>
-    """
+    html_content, text_content = email_templates.render('password_reset', nome=nome, reset_url=reset_url)
     
     return send_email(to_email, subject, html_content, text_content)
 
@@ -418,87 +300,25 @@ def send_account_deletion_code(to_email: str, nome: str, code: str) -> bool:
         True se email foi enviado com sucesso
     """
     subject = "Código de Exclusão de Conta - Luxus Brechó"
+    html_content, text_content = email_templates.render('account_deletion', nome=nome, code=code)
     
-    text_content = f"""
-Olá {nome}!
+    return send_email(to_email, subject, html_content, text_content)
 
-Você solicitou a exclusão da sua conta no Luxus Brechó.
 
-Seu código de confirmação é: {code}
+def _order_status_context(nome: str, order_id: int, status: str) -> Dict[str, Any]:
+    """Contexto do template ``order_status`` para um pedido."""
+    status_info = ORDER_STATUS_CONFIG.get(status.lower()) or {
+        'title': 'Atualização do Pedido',
+        'message': f'O status do seu pedido foi atualizado para: {status}',
+        'color': '#6B7280',
+        'icon': '📋',
+    }
+    return {'nome': nome, 'order_id': order_id, 'status': status, 'status_info': status_info}
 
-⚠️ Este código é válido por 30 minutos.
 
-Se você não solicitou a exclusão da sua conta, ignore este email e sua conta permanecerá segura.
-
-Atenciosamente,
-Equipe Luxus Brechó
-    """
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="pt-BR">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Código de Exclusão</title>
-    </head>
-    <body style="margin: 0; padding: 0; font-family: Arial, sans-serif; background-color: #f5f5f5;">
-        <table role="presentation" style="width: 100%; border-collapse: collapse;">
-            <tr>
-                <td align="center" style="padding: 40px 0;">
-                    <table role="presentation" style="width: 600px; border-collapse: collapse; background-color: #ffffff; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                        <tr>
-                            <td style="padding: 40px 40px 20px 40px; text-align: center; background-color: #EF4444; border-radius: 8px 8px 0 0;">
-                                <h1 style="margin: 0; color: #ffffff; font-size: 32px; font-weight: bold; letter-spacing: 2px;">LUXUS</h1>
-                                <p style="margin: 5px 0 0 0; color: #ffffff; font-size: 14px; letter-spacing: 4px;">BRECHÓ</p>
-                            </td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 40px;">
-                                <h2 style="margin: 0 0 20px 0; color: #333333; font-size: 24px;">⚠️ Exclusão de Conta</h2>
-                                <p style="margin: 0 0 20px 0; color: #666666; font-size: 16px; line-height: 1.6;">
-                                    Olá <strong>{nome}</strong>!
-                                </p>
-                                <p style="margin: 0 0 20px 0; color: #666666; font-size: 16px; line-height: 1.6;">
-                                    Você solicitou a exclusão da sua conta no Luxus Brechó.
-                                </p>
-                                <p style="margin: 0 0 10px 0; color: #666666; font-size: 16px; line-height: 1.6;">
-                                    Seu código de confirmação é:
-                                </p>
-                                <table role="presentation" style="width: 100%; border-collapse: collapse;">
-                                    <tr>
-                                        <td align="center" style="padding: 20px 0 30px 0;">
-                                            <div style="display: inline-block; padding: 20px 40px; background-color: #FEE2E2; border: 2px dashed #EF4444; border-radius: 8px;">
-                                                <span style="font-size: 36px; font-weight: bold; color: #EF4444; letter-spacing: 8px;">{code}</span>
-                                            </div>
-                                        </td>
-                                    </tr>
-                                </table>
-                                <p style="margin: 0 0 20px 0; color: #EF4444; font-size: 14px; line-height: 1.6; font-weight: bold;">
-                                    ⏰ Este código é válido por 30 minutos.
-                                </p>
-                                <p style="margin: 0 0 10px 0; color: #999999; font-size: 14px; line-height: 1.6;">
-                                    Se você não solicitou a exclusão da sua conta, ignore este email e sua conta permanecerá segura.
-                                </p>
-                            </td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 30px 40px; background-color: #f8f9fa; border-radius: 0 0 8px 8px; text-align: center;">
-                                <p style="margin: 0; color: #999999; font-size: 12px;">
-                                    Atenciosamente,<br>
-                                    <strong>Equipe Luxus Brechó</strong>
-                                </p>
-                            </td>
-                        </tr>
-                    </table>
-                </td>
-            </tr>
-        </table>
-    </body>
-    </html>
-    """
-    
-    return send_email(to_email, subject, html_content, text_content)
+def _order_status_subject(context: Dict[str, Any]) -> str:
+    info = context['status_info']
+    return f"{info['icon']} {info['title']} - Pedido #{context['order_id']}"
 
 
 def send_order_status_notification(to_email: str, nome: str, order_id: int, status: str, items: list = None) -> bool:
@@ -515,20 +335,45 @@ def send_order_status_notification(to_email: str, nome: str, order_id: int, stat
     Returns:
         True se o email foi enviado com sucesso, False caso contrário
     """
-    status_config = {
-        'pendente': {'title': 'Pedido Recebido', 'message': 'Seu pedido foi recebido e está sendo processado.', 'color': '#F59E0B', 'icon': '📦'},
-        'confirmado': {'title': 'Pedido Confirmado', 'message': 'Seu pedido foi confirmado e está sendo preparado para envio.', 'color': '#3B82F6', 'icon': '✅'},
-        'enviado': {'title': 'Pedido Enviado', 'message': 'Seu pedido foi enviado! Em breve você receberá em seu endereço.', 'color': '#8B5CF6', 'icon': '🚚'},
-        'entregue': {'title': 'Pedido Entregue', 'message': 'Seu pedido foi entregue! Esperamos que você aproveite suas peças.', 'color': '#10B981', 'icon': '🎉'},
-        'cancelado': {'title': 'Pedido Cancelado', 'message': 'Seu pedido foi cancelado. Se tiver dúvidas, entre em contato conosco.', 'color': '#EF4444', 'icon': '❌'}
-    }
+    context = _order_status_context(nome, order_id, status)
+    html_content, text_content = email_templates.render('order_status', **context)
     
-    config = status_config.get(status.lower(), {'title': 'Atualização do Pedido', 'message': f'O status do seu pedido foi atualizado para: {status}', 'color': '#6B7280', 'icon': '📋'})
-    subject = f"{config['icon']} {config['title']} - Pedido #{order_id}"
+    return send_email(to_email, _order_status_subject(context), html_content, text_content)
+
+
+def send_order_status_notifications(notifications: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Envia notificações de status para vários pedidos de uma vez.
     
-    text_content = f"{config['title']} - Pedido #{order_id}\n\nOlá {nome}!\n\n{config['message']}\n\nNúmero do pedido: #{order_id}\nStatus atual: {status.upper()}\n\nAtenciosamente,\nEquipe Luxus Brechó"
+    Os emails são renderizados em lote (``render_many``) com o template
+    compilado e enviados por ``send_emails`` (fila ou uma única conexão SMTP).
     
-    app_url = get_app_url()
-    html_content = f'''<!DOCTYPE html><html><head><meta charset="UTF-8"></head><body style="margin:0;padding:0;font-family:Arial,sans-serif;background:#f4f4f4;"><table style="width:100%;"><tr><td align="center" style="padding:40px 0;"><table style="width:600px;background:#fff;border-radius:8px;box-shadow:0 4px 6px rgba(0,0,0,0.1);"><tr><td style="padding:40px;text-align:center;background:{config['color']};border-radius:8px 8px 0 0;"><h1 style="margin:0;color:#fff;font-size:32px;">LUXUS</h1><p style="margin:5px 0 0;color:#fff;font-size:14px;letter-spacing:4px;">BRECHÓ</p></td></tr><tr><td style="padding:40px;"><div style="text-align:center;margin-bottom:30px;"><span style="font-size:48px;">{config['icon']}</span></div><h2 style="margin:0 0 20px;color:#333;font-size:24px;text-align:center;">{config['title']}</h2><p style="margin:0 0 20px;color:#666;font-size:16px;">Olá <strong>{nome}</strong>!</p><p style="margin:0 0 20px;color:#666;font-size:16px;">{config['message']}</p><table style="width:100%;margin:20px 0;"><tr><td style="padding:15px;background:#f8f9fa;border-radius:8px;"><p style="margin:0;color:#666;font-size:14px;"><strong>Pedido:</strong> #{order_id}<br><strong>Status:</strong> <span style="color:{config['color']};font-weight:bold;">{status.upper()}</span></p></td></tr></table><table style="width:100%;"><tr><td align="center" style="padding:20px 0;"><a href="{app_url}/pedidos" style="display:inline-block;padding:15px 30px;background:{config['color']};color:#fff;text-decoration:none;border-radius:8px;font-weight:bold;">Ver Meus Pedidos</a></td></tr></table></td></tr><tr><td style="padding:30px 40px;background:#f8f9fa;border-radius:0 0 8px 8px;text-align:center;"><p style="margin:0;color:#999;font-size:12px;">Atenciosamente,<br><strong>Equipe Luxus Brechó</strong></p></td></tr></table></td></tr></table></body></html>'''
+    Args:
+        notifications: Itens com ``to_email``, ``nome``, ``order_id`` e ``status``
     
-    return send_email(to_email, subject, html_content, text_content)
+    Returns:
+        Resultado por destinatário: ``{"order_id", "email", "sent", "mail_id", "error"}``
+    """
+    contexts = [
+        _order_status_context(n.get('nome') or 'Cliente', n['order_id'], n['status'])
+        for n in notifications
+    ]
+    rendered = email_templates.render_many('order_status', contexts)
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(notifications)
+    outgoing, positions = [], []
+    for index, (notification, context, (html_content, text_content)) in enumerate(zip(notifications, contexts, rendered)):
+        to_email = notification.get('to_email')
+        if not to_email:
+            results[index] = {'sent': False, 'mail_id': None, 'error': 'destinatário sem email'}
+            continue
+        outgoing.append((to_email, _order_status_subject(context), html_content, text_content))
+        positions.append(index)
+    
+    for index, result in zip(positions, send_emails(outgoing)):
+        results[index] = result
+    
+    return [
+        {'order_id': notification['order_id'], 'email': notification.get('to_email'), **result}
+        for notification, result in zip(notifications, results)
+    ]
@@ -0,0 +1,115 @@
+"""
+Registro de templates de email.
+
+Os templates ficam em ``app/templates/email``: cada email tem uma versão
+HTML (``<nome>.html``, com escape automático) e uma em texto puro
+(``<nome>.txt``). Todos são compilados uma única vez, na primeira
+utilização (ou em ``load()``), e reutilizados em todos os envios; as partes
+estáticas viram constantes no código gerado pelo Jinja e valores fixos
+(marca, URL da aplicação) ficam nos globals do ambiente.
+"""
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates" / "email"
+
+
+class EmailTemplateRegistry:
+    """
+    Templates de email pré-compilados.
+
+    ``render`` devolve o par ``(html, texto)`` de um email; ``render_many``
+    renderiza o mesmo template para vários destinatários reaproveitando
+    o template compilado e o contexto comum.
+    """
+
+    def __init__(self, template_dir: Path = TEMPLATE_DIR, globals_: Optional[Dict[str, Any]] = None):
+        self.template_dir = Path(template_dir)
+        loader = FileSystemLoader(str(self.template_dir))
+        common = dict(loader=loader, auto_reload=False, undefined=StrictUndefined,
+                      keep_trailing_newline=True)
+        self._html_env = Environment(autoescape=True, **common)
+        self._text_env = Environment(autoescape=False, **common)
+        for env in (self._html_env, self._text_env):
+            env.globals.update(globals_ or {})
+        self._templates: Dict[str, Tuple[Template, Template]] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> List[str]:
+        """
+        Compila todos os templates do diretório.
+        Templates iniciados com ``_`` (layouts) só são usados via ``extends``.
+
+        Returns:
+            Nomes dos emails disponíveis
+        """
+        templates = {}
+        for html_path in sorted(self.template_dir.glob("*.html")):
+            name = html_path.stem
+            if name.startswith("_"):
+                continue
+            text_path = html_path.with_suffix(".txt")
+            if not text_path.exists():
+                raise FileNotFoundError(f"Template de texto ausente para o email '{name}': {text_path}")
+            templates[name] = (
+                self._html_env.get_template(html_path.name),
+                self._text_env.get_template(text_path.name),
+            )
+
+        with self._lock:
+            self._templates = templates
+        return sorted(templates)
+
+    def names(self) -> List[str]:
+        return sorted(self._loaded())
+
+    def render(self, name: str, **context: Any) -> Tuple[str, str]:
+        """
+        Renderiza um email.
+
+        Args:
+            name: Nome do template (sem extensão)
+            **context: Variáveis do template
+
+        Returns:
+            Tupla (html, texto)
+        """
+        html_template, text_template = self._get(name)
+        return html_template.render(context), text_template.render(context)
+
+    def render_many(self, name: str, contexts: Iterable[Dict[str, Any]],
+                    shared: Optional[Dict[str, Any]] = None) -> List[Tuple[str, str]]:
+        """
+        Renderiza o mesmo email para vários destinatários.
+
+        Args:
+            name: Nome do template (sem extensão)
+            contexts: Contexto de cada destinatário
+            shared: Variáveis comuns a todos os destinatários
+
+        Returns:
+            Lista de tuplas (html, texto), na ordem de ``contexts``
+        """
+        html_template, text_template = self._get(name)
+        html_render = html_template.render
+        text_render = text_template.render
+        results = []
+        for ctx in contexts:
+            if shared:
+                ctx = {**shared, **ctx}
+            results.append((html_render(ctx), text_render(ctx)))
+        return results
+
+    def _loaded(self) -> Dict[str, Tuple[Template, Template]]:
+        if not self._templates:
+            self.load()
+        return self._templates
+
+    def _get(self, name: str) -> Tuple[Template, Template]:
+        try:
+            return self._loaded()[name]
+        except KeyError:
+            raise KeyError(f"Template de email desconhecido: {name}") from None
@@ -0,0 +1,402 @@
+"""
+Fila de processamento assíncrono de imagens de produtos.
+Redimensiona, envia ao storage e atualiza o produto fora da thread da requisição.
+
+Os workers são um pool de threads no próprio processo; o estado dos jobs fica
+em um store plugável (memória, MongoDB ou Redis local), escolhido por
+IMAGE_QUEUE_BACKEND. Com MongoDB/Redis os jobs pendentes sobrevivem a reinícios.
+"""
+import os
+import json
+import uuid
+import logging
+import threading
+from io import BytesIO
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING
+from werkzeug.datastructures import FileStorage
+
+from .autocomplete import refresh_product
+from ..utils.background import backoff_delay
+from ..utils.cache import invalidate_search_cache
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "image_jobs"
+
+# Estados de um job
+JOB_PENDING = "pendente"
+JOB_PROCESSING = "processando"
+JOB_DONE = "concluido"
+JOB_FAILED = "erro"
+
+# URL exibida enquanto a imagem definitiva é processada
+IMAGE_PLACEHOLDER_URL = os.getenv("IMAGE_PLACEHOLDER_URL", "/api/images/placeholder")
+
+# Jobs finalizados ficam disponíveis para consulta por 1 dia
+JOB_RETENTION = timedelta(days=1)
+
+
+class MemoryJobStore:
+    """Store em memória (um único processo, perde jobs ao reiniciar)."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._payloads: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: Dict[str, Any], payload: bytes) -> None:
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+            self._payloads[job["job_id"]] = payload
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+                if fields.get("status") in (JOB_DONE, JOB_FAILED):
+                    self._payloads.pop(job_id, None)
+
+    def load_payload(self, job_id: str) -> Optional[bytes]:
+        with self._lock:
+            return self._payloads.get(job_id)
+
+    def list_pending(self) -> List[str]:
+        return []
+
+
+class MongoJobStore:
+    """Store em coleção MongoDB; o conteúdo da imagem fica no job até ser processado."""
+
+    def __init__(self, db):
+        self.collection = db[COLLECTION_NAME]
+        try:
+            self.collection.create_index([("job_id", ASCENDING)], unique=True, name="uniq_job_id")
+            self.collection.create_index([("status", ASCENDING)], name="idx_status")
+            self.collection.create_index(
+                [("expires_at", ASCENDING)], expireAfterSeconds=0, name="ttl_expires_at"
+            )
+        except Exception as e:
+            logger.warning(f"Erro ao criar índices de {COLLECTION_NAME}: {e}")
+
+    def create(self, job: Dict[str, Any], payload: bytes) -> None:
+        self.collection.insert_one({**job, "payload": payload})
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.collection.find_one({"job_id": job_id}, {"_id": 0, "payload": 0})
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        update: Dict[str, Any] = {"$set": dict(fields)}
+        if fields.get("status") in (JOB_DONE, JOB_FAILED):
+            update["$set"]["expires_at"] = datetime.utcnow() + JOB_RETENTION
+            update["$unset"] = {"payload": ""}
+        self.collection.update_one({"job_id": job_id}, update)
+
+    def load_payload(self, job_id: str) -> Optional[bytes]:
+        doc = self.collection.find_one({"job_id": job_id}, {"payload": 1})
+        return bytes(doc["payload"]) if doc and doc.get("payload") is not None else None
+
+    def list_pending(self) -> List[str]:
+        cursor = self.collection.find(
+            {"status": {"$in": [JOB_PENDING, JOB_PROCESSING]}}, {"job_id": 1}
+        )
+        return [doc["job_id"] for doc in cursor]
+
+
+class RedisJobStore:
+    """Store em Redis local; metadados em JSON e conteúdo em chave separada."""
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = "image_jobs:"
+
+    def create(self, job: Dict[str, Any], payload: bytes) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(f"{self.prefix}{job['job_id']}", json.dumps(job, default=str))
+        pipe.set(f"{self.prefix}{job['job_id']}:payload", payload)
+        pipe.sadd(f"{self.prefix}pending", job["job_id"])
+        pipe.execute()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(f"{self.prefix}{job_id}")
+        return json.loads(raw) if raw else None
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        job = self.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        pipe = self.client.pipeline()
+        key = f"{self.prefix}{job_id}"
+        pipe.set(key, json.dumps(job, default=str))
+        if fields.get("status") in (JOB_DONE, JOB_FAILED):
+            pipe.expire(key, int(JOB_RETENTION.total_seconds()))
+            pipe.delete(f"{key}:payload")
+            pipe.srem(f"{self.prefix}pending", job_id)
+        pipe.execute()
+
+    def load_payload(self, job_id: str) -> Optional[bytes]:
+        return self.client.get(f"{self.prefix}{job_id}:payload")
+
+    def list_pending(self) -> List[str]:
+        return [m.decode() if isinstance(m, bytes) else m
+                for m in self.client.smembers(f"{self.prefix}pending")]
+
+
+class ImageQueue:
+    """
+    Pool de workers que processa uploads de imagem em segundo plano.
+
+    Cada job gera as variações da imagem, envia ao storage e atualiza
+    ``imagem``/``imagens`` do produto. Falhas são repetidas com backoff
+    exponencial até ``max_attempts``.
+    """
+
+    def __init__(self, store, get_db: Callable[[], Any], storage=None,
+                 max_workers: int = 2, max_attempts: int = 3, backoff_base: float = 2.0,
+                 deleter: Optional[Callable[[List[str]], Any]] = None):
+        self.store = store
+        self.get_db = get_db
+        self.deleter = deleter
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self._storage = storage
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-queue")
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from .storage import storage_service
+            self._storage = storage_service
+        return self._storage
+
+    @staticmethod
+    def new_job_id() -> str:
+        """Gera o id de um job (permite gravá-lo no produto antes de enfileirar)."""
+        return uuid.uuid4().hex
+
+    def submit(self, data: bytes, filename: str, content_type: str, product_id: int,
+               replace_urls: Optional[List[str]] = None, job_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Enfileira o processamento de uma imagem de produto.
+
+        O produto deve ter ``imagem_job`` igual ao id do job; apenas o job mais
+        recente de cada produto aplica o resultado.
+
+        Args:
+            data: Conteúdo original da imagem
+            filename: Nome original do arquivo
+            content_type: Tipo MIME enviado pelo cliente
+            product_id: Produto que receberá a imagem
+            replace_urls: URLs antigas a remover depois do sucesso (troca de imagem)
+            job_id: Id previamente gerado com ``new_job_id`` (opcional)
+
+        Returns:
+            Registro público do job (sem o conteúdo)
+        """
+        now = datetime.utcnow()
+        job = {
+            "job_id": job_id or self.new_job_id(),
+            "product_id": product_id,
+            "filename": filename,
+            "content_type": content_type,
+            "replace_urls": replace_urls or [],
+            "status": JOB_PENDING,
+            "attempts": 0,
+            "error": None,
+            "result": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.store.create(job, data)
+        self._executor.submit(self._run, job["job_id"])
+        return self.serialize(job)
+
+    def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna o estado atual de um job para polling."""
+        job = self.store.get(job_id)
+        return self.serialize(job) if job else None
+
+    def resume_pending(self) -> int:
+        """
+        Reenfileira jobs que ficaram pendentes (ex.: após reinício do processo).
+
+        Jobs aguardando nova tentativa só rodam a partir do ``next_attempt_at``.
+        """
+        job_ids = self.store.list_pending()
+        now = datetime.utcnow()
+        for job_id in job_ids:
+            job = self.store.get(job_id) or {}
+            next_attempt_at = _as_datetime(job.get("next_attempt_at"))
+            delay = (next_attempt_at - now).total_seconds() if next_attempt_at else 0
+            self._schedule(job_id, delay)
+        return len(job_ids)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    @staticmethod
+    def serialize(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "job_id": job.get("job_id"),
+            "product_id": job.get("product_id"),
+            "status": job.get("status"),
+            "attempts": job.get("attempts", 0),
+            "error": job.get("error"),
+            "result": job.get("result"),
+        }
+
+    def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if not job or job.get("status") in (JOB_DONE, JOB_FAILED):
+            return
+
+        payload = self.store.load_payload(job_id)
+        if payload is None:
+            self.store.update(job_id, {"status": JOB_FAILED, "error": "Conteúdo da imagem não encontrado",
+                                       "updated_at": datetime.utcnow()})
+            return
+
+        attempts = job.get("attempts", 0) + 1
+        self.store.update(job_id, {"status": JOB_PROCESSING, "attempts": attempts,
+                                   "updated_at": datetime.utcnow()})
+
+        try:
+            file = FileStorage(stream=BytesIO(payload), filename=job["filename"],
+                               content_type=job["content_type"])
+            success, result = self.storage.upload_image_set(file, job["product_id"])
+            if not success:
+                raise RuntimeError(result)
+
+            self._apply_to_product(job, result)
+            self.store.update(job_id, {"status": JOB_DONE, "result": result, "error": None,
+                                       "updated_at": datetime.utcnow()})
+        except Exception as e:
+            self._handle_failure(job_id, attempts, str(e))
+
+    def _apply_to_product(self, job: Dict[str, Any], urls: Dict[str, str]) -> None:
+        """Atualiza o produto com as URLs definitivas e remove as antigas."""
+        db = self.get_db()
+        if db is None:
+            raise RuntimeError("banco de dados indisponível")
+
+        largest = max(urls, key=int)
+        result = db["products"].update_one(
+            {"id": job["product_id"], "imagem_job": job["job_id"]},
+            {"$set": {
+                "imagem": urls[largest],
+                "imagens": urls,
+                "imagem_status": JOB_DONE,
+            }, "$unset": {"imagem_job": ""}},
+        )
+
+        if result.matched_count == 0:
+            # Produto excluído ou nova imagem enviada enquanto esta era processada
+            self._discard(list(urls.values()))
+            return
+
+        invalidate_search_cache()
+        refresh_product(db, job["product_id"])
+        if job.get("replace_urls"):
+            self._discard(job["replace_urls"])
+
+    def _schedule(self, job_id: str, delay: float) -> None:
+        """Enfileira o job agora ou depois de ``delay`` segundos."""
+        if delay <= 0:
+            self._executor.submit(self._run, job_id)
+            return
+        timer = threading.Timer(delay, self._executor.submit, args=(self._run, job_id))
+        timer.daemon = True
+        timer.start()
+
+    def _discard(self, values: List[str]) -> None:
+        """Remove imagens pela fila de remoção (ou diretamente, sem fila)."""
+        if self.deleter is not None:
+            self.deleter(values)
+        else:
+            self.storage.delete_image_set(values)
+
+    def _handle_failure(self, job_id: str, attempts: int, error: str) -> None:
+        now = datetime.utcnow()
+        if attempts >= self.max_attempts:
+            logger.error(f"Job de imagem {job_id} falhou definitivamente: {error}")
+            self.store.update(job_id, {"status": JOB_FAILED, "error": error, "updated_at": now})
+            job = self.store.get(job_id)
+            db = self.get_db()
+            if job and db is not None:
+                db["products"].update_one(
+                    {"id": job["product_id"], "imagem_job": job_id},
+                    {"$set": {"imagem_status": JOB_FAILED}},
+                )
+            return
+
+        delay = backoff_delay(attempts, base=self.backoff_base)
+        logger.warning(f"Job de imagem {job_id} falhou (tentativa {attempts}), nova tentativa em {delay:.1f}s: {error}")
+        self.store.update(job_id, {"status": JOB_PENDING, "error": error, "updated_at": now,
+                                   "next_attempt_at": now + timedelta(seconds=delay)})
+        self._schedule(job_id, delay)
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    """Datas do store Redis voltam como texto (JSON)."""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def create_job_store(backend: str, db=None):
+    """Cria o store de jobs conforme IMAGE_QUEUE_BACKEND (memory, mongo ou redis)."""
+    backend = (backend or "memory").lower()
+    if backend == "mongo":
+        if db is None:
+            logger.warning("IMAGE_QUEUE_BACKEND=mongo sem banco conectado; usando memória")
+            return MemoryJobStore()
+        return MongoJobStore(db)
+    if backend == "redis":
+        if not HAS_REDIS:
+            logger.warning("Pacote 'redis' não instalado; fila de imagens usando memória")
+            return MemoryJobStore()
+        return RedisJobStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return MemoryJobStore()
+
+
+def init_image_queue(app) -> Optional[ImageQueue]:
+    """
+    Inicializa a fila de imagens se IMAGE_QUEUE_ENABLED=true.
+    A fila fica disponível em ``app.image_queue`` (None quando desabilitada).
+    """
+    app.image_queue = None
+    if os.getenv("IMAGE_QUEUE_ENABLED", "False").lower() != "true":
+        return None
+
+    store = create_job_store(os.getenv("IMAGE_QUEUE_BACKEND", "memory"), app.db)
+    queue = ImageQueue(
+        store,
+        get_db=lambda: app.db,
+        max_workers=int(os.getenv("IMAGE_QUEUE_WORKERS", "2")),
+        max_attempts=int(os.getenv("IMAGE_QUEUE_MAX_ATTEMPTS", "3")),
+        backoff_base=float(os.getenv("IMAGE_QUEUE_BACKOFF_SECONDS", "2")),
+        deleter=getattr(getattr(app, "deletion_queue", None), "enqueue", None),
+    )
+    resumed = queue.resume_pending()
+    if resumed:
+        app.logger.info(f"🖼️  {resumed} job(s) de imagem pendentes reenfileirados")
+    app.image_queue = queue
+    return queue
@@ -0,0 +1,75 @@
+"""
+Resolução das URLs de imagens de produtos.
+
+Produtos guardam apenas o caminho do objeto no storage (``imagem`` e
+``imagens``). As URLs são geradas ao serializar: primeiro no cache em
+memória e, para os caminhos ausentes, em uma única chamada em lote ao
+storage. Valores que já são URLs (documentos antigos, placeholder) são
+mantidos como estão.
+"""
+from typing import Any, Dict, Iterable, List
+
+from .storage_backend import is_storage_path
+from ..utils.cache import get_cached_image_urls, set_cached_image_urls
+
+
+def _storage_service():
+    from .storage import storage_service
+    return storage_service
+
+
+def resolve_image_urls(values: Iterable[str]) -> Dict[str, str]:
+    """
+    Converte caminhos do storage em URLs de acesso.
+
+    Args:
+        values: Caminhos (ou URLs, que são ignoradas)
+
+    Returns:
+        Dict caminho -> URL, apenas para os caminhos do storage
+    """
+    paths = sorted({v for v in values if is_storage_path(v)})
+    if not paths:
+        return {}
+
+    urls, missing = get_cached_image_urls(paths)
+    if missing:
+        signed = _storage_service().sign_urls(missing)
+        set_cached_image_urls(signed)
+        urls.update(signed)
+    return urls
+
+
+def resolve_product_images(docs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Substitui os caminhos de ``imagem``/``imagens`` por URLs em vários documentos
+    com uma única resolução em lote.
+
+    Args:
+        docs: Produtos (ou itens de carrinho/pedido) já serializados
+
+    Returns:
+        Novos dicionários com as URLs resolvidas
+    """
+    docs = [dict(doc) if doc else doc for doc in docs]
+
+    values: List[str] = []
+    for doc in docs:
+        if not doc:
+            continue
+        values.append(doc.get("imagem"))
+        if isinstance(doc.get("imagens"), dict):
+            values.extend(doc["imagens"].values())
+
+    urls = resolve_image_urls(values)
+    if not urls:
+        return docs
+
+    for doc in docs:
+        if not doc:
+            continue
+        if doc.get("imagem") in urls:
+            doc["imagem"] = urls[doc["imagem"]]
+        if isinstance(doc.get("imagens"), dict):
+            doc["imagens"] = {size: urls.get(value, value) for size, value in doc["imagens"].items()}
+    return docs
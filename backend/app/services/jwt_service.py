@@ -4,10 +4,16 @@ Gerencia criação, validação e refresh de tokens.
 """
 import os
 import jwt
+import time
+import uuid
+import hashlib
+import threading
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, Tuple
 from functools import wraps
-from flask import request, jsonify, g, current_app
+from flask import request, jsonify, g, current_app, has_app_context
+
+from ..utils.cache import get_cached_token_claims, set_cached_token_claims
 
 
 # Configurações JWT
@@ -16,6 +22,13 @@ JWT_ALGORITHM = 'HS256'
 JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)  # Token de acesso expira em 24h
 JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)  # Token de refresh expira em 30 dias
 
+# Métricas de verificação de tokens (expostas no /api/health)
+_decode_metrics = {'cache_hits': 0, 'decodes': 0, 'failures': 0, 'decode_ms_total': 0.0}
+_decode_metrics_lock = threading.Lock()
+
+# Resultado da autenticação da requisição atual (calculado uma vez por requisição)
+AUTH_ENVIRON_KEY = 'luxus.auth'
+
 
 def create_access_token(user_id: int, user_type: str, email: str) -> str:
     """
@@ -31,11 +44,12 @@ def create_access_token(user_id: int, user_type: str, email: str) -> str:
     """
     now = datetime.now(timezone.utc)
     payload = {
-        'sub': user_id,  # Subject (ID do usuário)
+        'sub': str(user_id),  # Subject (ID do usuário); PyJWT exige string
         'type': user_type,
         'email': email,
         'iat': now,  # Issued at
         'exp': now + JWT_ACCESS_TOKEN_EXPIRES,  # Expiration
+        'jti': uuid.uuid4().hex,  # ID do token (usado na revogação)
         'token_type': 'access'
     }
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
@@ -53,31 +67,94 @@ def create_refresh_token(user_id: int) -> str:
     """
     now = datetime.now(timezone.utc)
     payload = {
-        'sub': user_id,
+        'sub': str(user_id),
         'iat': now,
         'exp': now + JWT_REFRESH_TOKEN_EXPIRES,
+        'jti': uuid.uuid4().hex,
         'token_type': 'refresh'
     }
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _normalize_claims(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Converte o 'sub' de volta para int (ids de usuário são inteiros no banco)."""
+    sub = payload.get('sub')
+    if isinstance(sub, str) and sub.isdigit():
+        payload['sub'] = int(sub)
+    return payload
+
+
 def decode_token(token: str) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str]]:
     """
     Decodifica e valida um token JWT.
     
+    Tokens já verificados ficam em cache (chave: sha256 do token) até o seu
+    'exp', evitando refazer a verificação HMAC a cada requisição. Tokens
+    revogados (logout, troca de senha) são recusados.
+    
     Args:
         token: Token JWT a ser decodificado
         
     Returns:
         Tupla (sucesso, payload, mensagem_erro)
     """
+    digest = _token_digest(token)
+    cached = get_cached_token_claims(digest)
+    if cached is not None:
+        with _decode_metrics_lock:
+            _decode_metrics['cache_hits'] += 1
+        if _is_revoked(cached):
+            return False, None, 'Token revogado'
+        return True, cached, None
+    
+    started = time.perf_counter()
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return True, payload, None
     except jwt.ExpiredSignatureError:
+        _record_decode(started, failed=True)
         return False, None, 'Token expirado'
     except jwt.InvalidTokenError as e:
+        _record_decode(started, failed=True)
         return False, None, f'Token inválido: {str(e)}'
+    
+    _record_decode(started)
+    payload = _normalize_claims(payload)
+    set_cached_token_claims(digest, payload)
+    if _is_revoked(payload):
+        return False, None, 'Token revogado'
+    return True, payload, None
+
+
+def _is_revoked(payload: Dict[str, Any]) -> bool:
+    """Consulta a lista de revogação da aplicação (bloom filter em memória)."""
+    if not has_app_context():
+        return False
+    revocation = getattr(current_app, 'token_revocation', None)
+    return revocation is not None and revocation.is_revoked(payload)
+
+
+def _record_decode(started: float, failed: bool = False) -> None:
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _decode_metrics_lock:
+        _decode_metrics['decodes'] += 1
+        _decode_metrics['decode_ms_total'] += elapsed_ms
+        if failed:
+            _decode_metrics['failures'] += 1
+
+
+def get_auth_metrics() -> Dict[str, Any]:
+    """Contadores de verificação de tokens (cache hits, decodes e tempo médio)."""
+    with _decode_metrics_lock:
+        metrics = dict(_decode_metrics)
+    lookups = metrics['cache_hits'] + metrics['decodes']
+    metrics['decode_ms_total'] = round(metrics['decode_ms_total'], 3)
+    metrics['decode_ms_avg'] = round(metrics['decode_ms_total'] / metrics['decodes'], 3) if metrics['decodes'] else 0.0
+    metrics['cache_hit_rate'] = round(metrics['cache_hits'] / lookups, 3) if lookups else 0.0
+    return metrics
 
 
 def get_token_from_header() -> Optional[str]:
@@ -93,6 +170,41 @@ def get_token_from_header() -> Optional[str]:
     return None
 
 
+def authenticate_request() -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Autentica a requisição atual a partir do header Authorization.
+    
+    O resultado é calculado uma única vez por requisição (guardado no
+    environ da requisição), e ``g.user_id``, ``g.user_type`` e ``g.user_email``
+    são preenchidos (None quando não autenticado).
+    
+    Returns:
+        Tupla (payload, mensagem_erro)
+    """
+    cached = request.environ.get(AUTH_ENVIRON_KEY)
+    if cached is not None:
+        return cached
+    
+    token = get_token_from_header()
+    if not token:
+        result = (None, 'Token de autenticação não fornecido')
+    else:
+        success, payload, error = decode_token(token)
+        if not success:
+            result = (None, error)
+        elif payload.get('token_type') != 'access':
+            result = (None, 'Tipo de token inválido')
+        else:
+            result = (payload, None)
+    
+    payload = result[0] or {}
+    g.user_id = payload.get('sub')
+    g.user_type = payload.get('type')
+    g.user_email = payload.get('email')
+    request.environ[AUTH_ENVIRON_KEY] = result
+    return result
+
+
 def jwt_required(f):
     """
     Decorator que exige autenticação JWT válida.
@@ -100,24 +212,10 @@ def jwt_required(f):
     """
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = get_token_from_header()
-        
-        if not token:
-            return jsonify({'error': 'Token de autenticação não fornecido'}), 401
-        
-        success, payload, error = decode_token(token)
-        
-        if not success:
+        _, error = authenticate_request()
+        if error:
             return jsonify({'error': error}), 401
         
-        if payload.get('token_type') != 'access':
-            return jsonify({'error': 'Tipo de token inválido'}), 401
-        
-        # Adiciona informações do usuário ao contexto da requisição
-        g.user_id = payload.get('sub')
-        g.user_type = payload.get('type')
-        g.user_email = payload.get('email')
-        
         return f(*args, **kwargs)
     
     return decorated
@@ -131,23 +229,7 @@ def jwt_optional(f):
     """
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = get_token_from_header()
-        
-        if token:
-            success, payload, _ = decode_token(token)
-            if success and payload.get('token_type') == 'access':
-                g.user_id = payload.get('sub')
-                g.user_type = payload.get('type')
-                g.user_email = payload.get('email')
-            else:
-                g.user_id = None
-                g.user_type = None
-                g.user_email = None
-        else:
-            g.user_id = None
-            g.user_type = None
-            g.user_email = None
-        
+        authenticate_request()
         return f(*args, **kwargs)
     
     return decorated
@@ -156,30 +238,17 @@ def jwt_optional(f):
 def admin_required(f):
     """
     Decorator que exige que o usuário seja administrador.
-    Deve ser usado APÓS jwt_required.
+    Pode ser usado sozinho ou junto de jwt_required (o token é verificado uma vez).
     """
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = get_token_from_header()
-        
-        if not token:
-            return jsonify({'error': 'Token de autenticação não fornecido'}), 401
-        
-        success, payload, error = decode_token(token)
-        
-        if not success:
+        payload, error = authenticate_request()
+        if error:
             return jsonify({'error': error}), 401
         
-        if payload.get('token_type') != 'access':
-            return jsonify({'error': 'Tipo de token inválido'}), 401
-        
         if payload.get('type') != 'Administrador':
             return jsonify({'error': 'Acesso negado. Requer privilégios de administrador'}), 403
         
-        g.user_id = payload.get('sub')
-        g.user_type = payload.get('type')
-        g.user_email = payload.get('email')
-        
         return f(*args, **kwargs)
     
     return decorated
@@ -195,23 +264,10 @@ def owner_or_admin_required(user_id_param: str = 'user_id'):
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
-            token = get_token_from_header()
-            
-            if not token:
-                return jsonify({'error': 'Token de autenticação não fornecido'}), 401
-            
-            success, payload, error = decode_token(token)
-            
-            if not success:
+            _, error = authenticate_request()
+            if error:
                 return jsonify({'error': error}), 401
             
-            if payload.get('token_type') != 'access':
-                return jsonify({'error': 'Tipo de token inválido'}), 401
-            
-            g.user_id = payload.get('sub')
-            g.user_type = payload.get('type')
-            g.user_email = payload.get('email')
-            
             # Verifica se é admin ou dono do recurso
             resource_user_id = kwargs.get(user_id_param)
             if resource_user_id is not None:
@@ -0,0 +1,193 @@
+"""
+Throttling de login compartilhado entre processos.
+
+Falhas de login são contadas por conta (email) e, opcionalmente, por IP na coleção
+``login_attempts`` (TTL), ou em memória quando não há banco. Ao passar do
+limite, a chave fica bloqueada por um tempo que dobra a cada nova falha
+(lockout exponencial). A verificação acontece antes de buscar o usuário e
+de qualquer trabalho do bcrypt, então ataques distribuídos entre processos
+param de consumir CPU.
+
+O limite por IP é opcional (LOGIN_MAX_IP_FAILURES, 0 desativa): atrás de um
+proxy sem TRUSTED_PROXY_COUNT todos os clientes têm o mesmo ``remote_addr``
+e um único IP bloqueado travaria o login de todo mundo.
+"""
+import os
+import math
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "login_attempts"
+
+
+class MemoryThrottleStore:
+    """Store em memória (um processo só)."""
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        with self._lock:
+            return [dict(self._entries[k]) for k in keys
+                    if k in self._entries and self._entries[k]["expires_at"] > now]
+
+    def increment(self, key: str, expires_at: datetime) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["expires_at"] <= now:
+                entry = {"_id": key, "failures": 0, "locked_until": None}
+                self._entries[key] = entry
+            entry["failures"] += 1
+            entry["expires_at"] = max(expires_at, entry.get("locked_until") or expires_at)
+            return dict(entry)
+
+    def lock(self, key: str, locked_until: datetime) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["locked_until"] = locked_until
+                entry["expires_at"] = max(entry["expires_at"], locked_until)
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class MongoThrottleStore:
+    """Store na coleção ``login_attempts``; contadores expiram por TTL."""
+
+    def __init__(self, db):
+        self.collection = db[COLLECTION_NAME]
+        try:
+            self.collection.create_index(
+                [("expires_at", ASCENDING)], expireAfterSeconds=0, name="ttl_expires_at"
+            )
+        except Exception as e:
+            logger.warning(f"Erro ao criar índices de {COLLECTION_NAME}: {e}")
+
+    def get_many(self, keys: Iterable[str]) -> List[Dict[str, Any]]:
+        # O TTL do Mongo roda a cada ~60s: entradas vencidas são filtradas aqui
+        now = datetime.utcnow()
+        return [doc for doc in self.collection.find({"_id": {"$in": list(keys)}})
+                if doc.get("expires_at") and doc["expires_at"] > now]
+
+    def increment(self, key: str, expires_at: datetime) -> Dict[str, Any]:
+        return self.collection.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"failures": 1}, "$max": {"expires_at": expires_at}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def lock(self, key: str, locked_until: datetime) -> None:
+        self.collection.update_one(
+            {"_id": key},
+            {"$set": {"locked_until": locked_until}, "$max": {"expires_at": locked_until}},
+        )
+
+    def clear(self, key: str) -> None:
+        self.collection.delete_one({"_id": key})
+
+
+class LoginThrottle:
+    """
+    Contadores de falhas de login com lockout exponencial.
+
+    Args:
+        store: MemoryThrottleStore ou MongoThrottleStore
+        max_account_failures: Falhas por conta antes do bloqueio
+        max_ip_failures: Falhas por IP antes do bloqueio (0 desativa o limite por IP)
+        lockout_seconds: Bloqueio após atingir o limite (dobra a cada nova falha)
+        max_lockout_seconds: Bloqueio máximo
+        window_seconds: Tempo sem falhas para o contador zerar
+    """
+
+    def __init__(self, store, max_account_failures: int = 5, max_ip_failures: int = 20,
+                 lockout_seconds: int = 30, max_lockout_seconds: int = 3600, window_seconds: int = 900):
+        self.store = store
+        self.max_account_failures = max_account_failures
+        self.max_ip_failures = max_ip_failures
+        self.lockout_seconds = lockout_seconds
+        self.max_lockout_seconds = max_lockout_seconds
+        self.window_seconds = window_seconds
+
+    def _keys(self, email: str, ip: Optional[str]) -> Dict[str, str]:
+        keys = {"account": f"account:{email.strip().lower()}"}
+        if ip and self.max_ip_failures > 0:
+            keys["ip"] = f"ip:{ip}"
+        return keys
+
+    def check(self, email: str, ip: Optional[str]) -> int:
+        """
+        Verifica bloqueios da conta e do IP.
+
+        Returns:
+            Segundos até liberar (0 se a tentativa pode prosseguir)
+        """
+        now = datetime.utcnow()
+        retry_after = 0
+        for entry in self.store.get_many(self._keys(email, ip).values()):
+            locked_until = entry.get("locked_until")
+            if locked_until and locked_until > now:
+                retry_after = max(retry_after, math.ceil((locked_until - now).total_seconds()))
+        return retry_after
+
+    def record_failure(self, email: str, ip: Optional[str]) -> int:
+        """
+        Conta uma falha de login e bloqueia as chaves que passaram do limite.
+
+        Returns:
+            Segundos de bloqueio aplicados (0 se nenhum)
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.window_seconds)
+        limits = {"account": self.max_account_failures, "ip": self.max_ip_failures}
+
+        applied = 0
+        for kind, key in self._keys(email, ip).items():
+            failures = self.store.increment(key, expires_at)["failures"]
+            excess = failures - limits[kind]
+            if excess < 0:
+                continue
+            seconds = min(self.lockout_seconds * (2 ** min(excess, 20)), self.max_lockout_seconds)
+            self.store.lock(key, now + timedelta(seconds=seconds))
+            applied = max(applied, seconds)
+        return applied
+
+    def record_success(self, email: str) -> None:
+        """Zera o contador da conta (o do IP só expira com o tempo)."""
+        self.store.clear(self._keys(email, None)["account"])
+
+
+def init_login_throttle(app) -> Optional[LoginThrottle]:
+    """
+    Cria o throttling de login (``app.login_throttle``), salvo se
+    LOGIN_THROTTLE_ENABLED=false. Usa o MongoDB quando disponível.
+
+    O limite por IP só vale com LOGIN_MAX_IP_FAILURES > 0; atrás de proxy,
+    configure também TRUSTED_PROXY_COUNT para que o IP seja o do cliente.
+    """
+    app.login_throttle = None
+    if os.getenv("LOGIN_THROTTLE_ENABLED", "True").lower() != "true":
+        return None
+
+    store = MongoThrottleStore(app.db) if app.db is not None else MemoryThrottleStore()
+    throttle = LoginThrottle(
+        store,
+        max_account_failures=int(os.getenv("LOGIN_MAX_ACCOUNT_FAILURES", "5")),
+        max_ip_failures=int(os.getenv("LOGIN_MAX_IP_FAILURES", "0")),
+        lockout_seconds=int(os.getenv("LOGIN_LOCKOUT_SECONDS", "30")),
+        max_lockout_seconds=int(os.getenv("LOGIN_LOCKOUT_MAX_SECONDS", "3600")),
+        window_seconds=int(os.getenv("LOGIN_FAILURE_WINDOW_SECONDS", "900")),
+    )
+    app.login_throttle = throttle
+    return throttle
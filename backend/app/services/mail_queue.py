@@ -0,0 +1,361 @@
+"""
+Fila de envio de emails transacionais.
+
+As requisições apenas gravam o email na fila (coleção ``mail_outbox`` no
+MongoDB, ou memória quando não há banco); uma thread em segundo plano envia
+reaproveitando uma única conexão SMTP autenticada e tenta novamente com
+backoff exponencial em caso de falha. Emails pendentes sobrevivem a reinícios.
+"""
+import os
+import uuid
+import smtplib
+import logging
+import threading
+from datetime import datetime, timedelta
+from email.message import Message
+from typing import Any, Callable, Dict, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+from ..utils.background import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "mail_outbox"
+
+# Estados de um email na fila
+MAIL_PENDING = "pendente"
+MAIL_SENDING = "enviando"
+MAIL_SENT = "enviado"
+MAIL_FAILED = "erro"
+
+# Emails enviados/com erro ficam na coleção por 7 dias
+MAIL_RETENTION = timedelta(days=7)
+
+# Email "enviando" há mais tempo que isso é considerado travado (processo caiu)
+STALE_SENDING = timedelta(minutes=10)
+
+# Erros que não adianta repetir (destinatário recusado, mensagem inválida)
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class MemoryMailStore:
+    """Store em memória (sem banco; perde emails ao reiniciar)."""
+
+    def __init__(self):
+        self._mails: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def insert(self, mail: Dict[str, Any]) -> None:
+        with self._lock:
+            self._mails[mail["mail_id"]] = dict(mail)
+
+    def get(self, mail_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            mail = self._mails.get(mail_id)
+            return dict(mail) if mail else None
+
+    def claim_due(self, now: datetime) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            due = [m for m in self._mails.values()
+                   if m["status"] == MAIL_PENDING and m["next_attempt_at"] <= now]
+            if not due:
+                return None
+            mail = min(due, key=lambda m: m["next_attempt_at"])
+            mail.update(status=MAIL_SENDING, locked_at=now)
+            return dict(mail)
+
+    def update(self, mail_id: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            if mail_id in self._mails:
+                self._mails[mail_id].update(fields)
+
+    def next_due_at(self) -> Optional[datetime]:
+        with self._lock:
+            pending = [m["next_attempt_at"] for m in self._mails.values() if m["status"] == MAIL_PENDING]
+            return min(pending) if pending else None
+
+    def requeue_stale(self, before: datetime) -> int:
+        with self._lock:
+            stale = [m for m in self._mails.values()
+                     if m["status"] == MAIL_SENDING and m.get("locked_at") and m["locked_at"] < before]
+            for mail in stale:
+                mail["status"] = MAIL_PENDING
+            return len(stale)
+
+
+class MongoMailStore:
+    """Store na coleção ``mail_outbox``; emails finalizados expiram por TTL."""
+
+    def __init__(self, db):
+        self.collection = db[COLLECTION_NAME]
+        try:
+            self.collection.create_index([("mail_id", ASCENDING)], unique=True, name="uniq_mail_id")
+            self.collection.create_index(
+                [("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="idx_status_next_attempt"
+            )
+            self.collection.create_index(
+                [("expires_at", ASCENDING)], expireAfterSeconds=0, name="ttl_expires_at"
+            )
+        except Exception as e:
+            logger.warning(f"Erro ao criar índices de {COLLECTION_NAME}: {e}")
+
+    def insert(self, mail: Dict[str, Any]) -> None:
+        self.collection.insert_one(dict(mail))
+
+    def get(self, mail_id: str) -> Optional[Dict[str, Any]]:
+        return self.collection.find_one({"mail_id": mail_id}, {"_id": 0})
+
+    def claim_due(self, now: datetime) -> Optional[Dict[str, Any]]:
+        # Atualização atômica: só um worker (ou processo) envia cada email
+        return self.collection.find_one_and_update(
+            {"status": MAIL_PENDING, "next_attempt_at": {"$lte": now}},
+            {"$set": {"status": MAIL_SENDING, "locked_at": now}},
+            sort=[("next_attempt_at", ASCENDING)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def update(self, mail_id: str, fields: Dict[str, Any]) -> None:
+        fields = dict(fields)
+        if fields.get("status") in (MAIL_SENT, MAIL_FAILED):
+            fields["expires_at"] = datetime.utcnow() + MAIL_RETENTION
+        self.collection.update_one({"mail_id": mail_id}, {"$set": fields})
+
+    def next_due_at(self) -> Optional[datetime]:
+        doc = self.collection.find_one(
+            {"status": MAIL_PENDING}, {"next_attempt_at": 1}, sort=[("next_attempt_at", ASCENDING)]
+        )
+        return doc["next_attempt_at"] if doc else None
+
+    def requeue_stale(self, before: datetime) -> int:
+        result = self.collection.update_many(
+            {"status": MAIL_SENDING, "locked_at": {"$lt": before}},
+            {"$set": {"status": MAIL_PENDING}},
+        )
+        return result.modified_count
+
+
+class SmtpConnection:
+    """
+    Conexão SMTP autenticada reaproveitada entre envios.
+    Reconecta quando o servidor encerra a sessão ou após ``idle_timeout`` sem uso.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+                 idle_timeout: float = 60.0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used: Optional[datetime] = None
+        self.connections_opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.starttls()
+        server.login(self.user, self.password)
+        self.connections_opened += 1
+        return server
+
+    def send(self, message: Message) -> None:
+        now = datetime.utcnow()
+        if (self._server is not None and self._last_used is not None
+                and (now - self._last_used).total_seconds() > self.idle_timeout):
+            self.close()
+
+        if self._server is None:
+            self._server = self._connect()
+
+        try:
+            self._server.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # Sessão expirou no servidor: reconecta uma vez
+            self.close()
+            self._server = self._connect()
+            self._server.send_message(message)
+        self._last_used = datetime.utcnow()
+
+    def close_if_idle(self) -> None:
+        """Encerra a sessão se ficou ociosa por mais que ``idle_timeout``."""
+        if (self._server is not None and self._last_used is not None
+                and (datetime.utcnow() - self._last_used).total_seconds() > self.idle_timeout):
+            self.close()
+
+    def close(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+
+
+class MailQueue:
+    """
+    Worker que envia os emails da fila em segundo plano.
+
+    ``enqueue`` grava o email e acorda o worker; o worker envia os emails
+    vencidos um a um pela mesma conexão SMTP.
+    """
+
+    def __init__(self, store, connection: SmtpConnection, build_message: Callable[..., Message],
+                 max_attempts: int = 5, backoff_base: float = 30.0, poll_interval: float = 5.0):
+        self.store = store
+        self.connection = connection
+        self.build_message = build_message
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, to_email: str, subject: str, html_content: str,
+                text_content: Optional[str] = None) -> str:
+        """
+        Grava um email na fila para envio em segundo plano.
+
+        Returns:
+            Id do email na fila
+        """
+        now = datetime.utcnow()
+        mail = {
+            "mail_id": uuid.uuid4().hex,
+            "to": to_email,
+            "subject": subject,
+            "html": html_content,
+            "text": text_content,
+            "status": MAIL_PENDING,
+            "attempts": 0,
+            "error": None,
+            "created_at": now,
+            "next_attempt_at": now,
+        }
+        self.store.insert(mail)
+        self.start()
+        self._wakeup.set()
+        return mail["mail_id"]
+
+    def get_status(self, mail_id: str) -> Optional[Dict[str, Any]]:
+        mail = self.store.get(mail_id)
+        if not mail:
+            return None
+        return {key: mail.get(key) for key in ("mail_id", "to", "status", "attempts", "error")}
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="mail-queue", daemon=True)
+                self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self.connection.close()
+
+    def process_due(self) -> int:
+        """Envia todos os emails vencidos; retorna quantos foram processados."""
+        processed = 0
+        while not self._stopped.is_set():
+            mail = self.store.claim_due(datetime.utcnow())
+            if mail is None:
+                break
+            self._deliver(mail)
+            processed += 1
+        return processed
+
+    def _loop(self) -> None:
+        try:
+            requeued = self.store.requeue_stale(datetime.utcnow() - STALE_SENDING)
+            if requeued:
+                logger.info(f"{requeued} email(s) travados voltaram para a fila")
+        except Exception as e:
+            logger.warning(f"Erro ao recuperar emails travados: {e}")
+
+        while not self._stopped.is_set():
+            try:
+                if not self.process_due():
+                    self.connection.close_if_idle()
+                wait = self.poll_interval
+                next_due = self.store.next_due_at()
+                if next_due is not None:
+                    wait = min(wait, max((next_due - datetime.utcnow()).total_seconds(), 0.05))
+            except Exception as e:
+                logger.error(f"Erro na fila de emails: {e}")
+                wait = self.poll_interval
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _deliver(self, mail: Dict[str, Any]) -> None:
+        attempts = mail.get("attempts", 0) + 1
+        try:
+            message = self.build_message(mail["to"], mail["subject"], mail["html"], mail.get("text"))
+            self.connection.send(message)
+        except Exception as e:
+            self.connection.close()
+            self._handle_failure(mail, attempts, e)
+            return
+
+        self.store.update(mail["mail_id"], {
+            "status": MAIL_SENT, "attempts": attempts, "error": None, "sent_at": datetime.utcnow(),
+        })
+        logger.info(f"Email enviado para {mail['to']}")
+
+    def _handle_failure(self, mail: Dict[str, Any], attempts: int, error: Exception) -> None:
+        if isinstance(error, PERMANENT_ERRORS) or attempts >= self.max_attempts:
+            logger.error(f"Email para {mail['to']} falhou definitivamente: {error}")
+            self.store.update(mail["mail_id"], {"status": MAIL_FAILED, "attempts": attempts, "error": str(error)})
+            return
+
+        delay = backoff_delay(attempts, base=self.backoff_base, cap=3600)
+        logger.warning(f"Falha ao enviar email para {mail['to']} (tentativa {attempts}), nova tentativa em {delay:.0f}s: {error}")
+        self.store.update(mail["mail_id"], {
+            "status": MAIL_PENDING,
+            "attempts": attempts,
+            "error": str(error),
+            "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+        })
+
+
+def init_mail_queue(app) -> Optional[MailQueue]:
+    """
+    Inicializa a fila de emails (``app.mail_queue``) quando o SMTP está configurado
+    e MAIL_QUEUE_ENABLED não é false. Sem banco, os emails ficam em memória.
+    """
+    from . import email_service
+
+    app.mail_queue = None
+    if os.getenv("MAIL_QUEUE_ENABLED", "True").lower() != "true":
+        return None
+    if not email_service.SMTP_USER or not email_service.SMTP_PASSWORD:
+        return None
+
+    store = MongoMailStore(app.db) if app.db is not None else MemoryMailStore()
+    connection = SmtpConnection(
+        email_service.SMTP_HOST,
+        email_service.SMTP_PORT,
+        email_service.SMTP_USER,
+        email_service.SMTP_PASSWORD,
+        idle_timeout=float(os.getenv("SMTP_IDLE_TIMEOUT", "60")),
+    )
+    queue = MailQueue(
+        store,
+        connection,
+        email_service.build_message,
+        max_attempts=int(os.getenv("MAIL_QUEUE_MAX_ATTEMPTS", "5")),
+        backoff_base=float(os.getenv("MAIL_QUEUE_BACKOFF_SECONDS", "30")),
+    )
+    # Inicia já para enviar emails que ficaram pendentes antes do reinício
+    queue.start()
+    app.mail_queue = queue
+    return queue
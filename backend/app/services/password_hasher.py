@@ -0,0 +1,147 @@
+"""
+Pool dedicado para operações de senha (bcrypt).
+
+bcrypt é intencionalmente caro; rodar direto nas threads de requisição faz
+uma rajada de logins ocupar todos os workers. As operações passam por um
+``ThreadPoolExecutor`` limitado e, quando a fila enche, falham na hora com
+``PasswordHasherBusy`` (a API responde 503 com ``Retry-After``).
+
+O custo do bcrypt é configurável por BCRYPT_ROUNDS; hashes com custo diferente
+são refeitos no próximo login (``needs_rehash``).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+import bcrypt
+
+# Custo do bcrypt (2^rounds iterações); 12 é o padrão da biblioteca
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+class PasswordHasherBusy(Exception):
+    """Pool de senhas cheio (ou operação demorou demais); tente mais tarde."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Serviço de autenticação ocupado")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Executor limitado para hash/verificação de senhas.
+
+    Args:
+        max_workers: Operações bcrypt simultâneas
+        max_pending: Operações aguardando na fila além das em execução
+        timeout: Segundos máximos de espera pelo resultado
+        retry_after: Valor do header Retry-After quando ocupado
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 32,
+                 timeout: float = 10.0, retry_after: int = 2):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(0, max_pending)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {"completed": 0, "rejected": 0, "timeouts": 0}
+
+    def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Executa ``func`` no pool e aguarda o resultado.
+
+        Raises:
+            PasswordHasherBusy: Fila cheia ou tempo de espera esgotado
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise PasswordHasherBusy(self.retry_after)
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self._count("timeouts")
+            raise PasswordHasherBusy(self.retry_after) from None
+        self._count("completed")
+        return result
+
+    def in_flight(self) -> int:
+        """Operações em execução ou na fila."""
+        with self._lock:
+            return self._in_flight
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = self._in_flight
+        stats.update(max_workers=self.max_workers, max_pending=self.max_pending, rounds=BCRYPT_ROUNDS)
+        return stats
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Pool de senhas do processo, configurado pelas variáveis PASSWORD_HASH_*."""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher(
+                    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2))),
+                    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32")),
+                    timeout=float(os.getenv("PASSWORD_HASH_TIMEOUT", "10")),
+                    retry_after=int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "2")),
+                )
+    return _hasher
+
+
+def _hashpw(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _checkpw(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
+    """Gera hash bcrypt com o custo configurado (BCRYPT_ROUNDS)."""
+    return get_password_hasher().run(_hashpw, password, rounds or BCRYPT_ROUNDS)
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    """Verifica a senha contra o hash bcrypt."""
+    return get_password_hasher().run(_checkpw, password, hashed)
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True se o hash foi gerado com custo diferente de BCRYPT_ROUNDS."""
+    try:
+        # Formato: $2b$<custo>$<salt+hash>
+        return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return False
@@ -0,0 +1,144 @@
+"""
+Arquivamento de produtos vendidos.
+
+Peças de brechó são únicas: depois de vendidas não voltam para a vitrine.
+Para que elas não ocupem a coleção principal (e seus índices), um job
+periódico move os produtos com ``status: vendido`` há mais de
+PRODUCT_ARCHIVE_AFTER_DAYS dias para a coleção ``products_archive``.
+
+Produtos arquivados continuam acessíveis por ``GET /api/products/<id>``
+(pedidos antigos, favoritos), suas imagens continuam protegidas do GC de
+imagens órfãs e um pedido cancelado devolve o produto à coleção principal.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from ..models.product_model import get_collection, get_archive_collection, AVAILABLE_STATUS, SOLD_STATUS
+from ..utils.cache import discard_cached_product_id, invalidate_search_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_AFTER = timedelta(days=int(os.getenv("PRODUCT_ARCHIVE_AFTER_DAYS", "30")))
+DEFAULT_BATCH_SIZE = 500
+
+
+def archive_sold_products(db, older_than: timedelta = DEFAULT_ARCHIVE_AFTER,
+                          batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Move produtos vendidos há mais de ``older_than`` para o arquivo.
+
+    Produtos vendidos antes da data de venda ser registrada (sem
+    ``vendido_em``) são arquivados na primeira execução.
+
+    Args:
+        db: Instância do banco de dados
+        older_than: Tempo mínimo desde a venda
+        batch_size: Produtos movidos por lote
+
+    Returns:
+        Dicionário com ``archived``, ``batches`` e ``cutoff``
+    """
+    products = get_collection(db)
+    archive = get_archive_collection(db)
+    now = datetime.utcnow()
+    cutoff = now - older_than
+    query = {
+        "status": SOLD_STATUS,
+        "$or": [{"vendido_em": {"$lte": cutoff}}, {"vendido_em": None}],
+    }
+
+    archived = batches = 0
+    while True:
+        docs = list(products.find(query).limit(batch_size))
+        if not docs:
+            break
+        ids = [doc["id"] for doc in docs]
+
+        try:
+            archive.insert_many([{**doc, "arquivado_em": now} for doc in docs], ordered=False)
+        except BulkWriteError as e:
+            # Já arquivados por uma execução interrompida: basta removê-los da coleção principal
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+        # Só remove o que continua vendido (um cancelamento pode ter ocorrido no meio)
+        result = products.delete_many({"id": {"$in": ids}, "status": SOLD_STATUS})
+        archived += result.deleted_count
+        if result.deleted_count < len(ids):
+            # Produtos que voltaram à vitrine não podem deixar cópia no arquivo:
+            # numa nova venda, o insert cairia no 11000 e manteria a versão antiga
+            live = [doc["id"] for doc in products.find({"id": {"$in": ids}}, {"_id": 0, "id": 1})]
+            if live:
+                archive.delete_many({"id": {"$in": live}})
+        batches += 1
+        for product_id in ids:
+            discard_cached_product_id(product_id)
+        if len(docs) < batch_size or not result.deleted_count:
+            break
+
+    if archived:
+        invalidate_search_cache()
+        logger.info(f"{archived} produtos vendidos arquivados")
+    return {"archived": archived, "batches": batches, "cutoff": cutoff}
+
+
+def find_product(db, product_id: int) -> Optional[Dict[str, Any]]:
+    """Busca o produto na coleção principal e, se ausente, no arquivo."""
+    doc = get_collection(db).find_one({"id": product_id})
+    if doc is None:
+        doc = get_archive_collection(db).find_one({"id": product_id})
+    return doc
+
+
+def restore_archived_product(db, product_id: int, status: str = AVAILABLE_STATUS) -> bool:
+    """
+    Devolve um produto arquivado à coleção principal (ex.: pedido cancelado).
+
+    Returns:
+        True se o produto estava no arquivo
+    """
+    archive = get_archive_collection(db)
+    doc = archive.find_one({"id": product_id})
+    if doc is None:
+        return False
+
+    restored = {k: v for k, v in doc.items() if k not in ("arquivado_em", "vendido_em")}
+    restored["status"] = status
+    try:
+        get_collection(db).insert_one(restored)
+    except DuplicateKeyError:
+        pass
+    archive.delete_one({"id": product_id})
+    invalidate_search_cache()
+    return True
+
+
+def _start_periodic_archive(app, interval: timedelta) -> threading.Thread:
+    """Arquiva os vendidos periodicamente em uma thread daemon."""
+    def loop():
+        while True:
+            time.sleep(interval.total_seconds())
+            if app.db is None:
+                continue
+            try:
+                archive_sold_products(app.db)
+            except Exception as e:
+                logger.error(f"Erro ao arquivar produtos vendidos: {e}")
+
+    thread = threading.Thread(target=loop, name="product-archive", daemon=True)
+    thread.start()
+    return thread
+
+
+def init_product_archive(app) -> Optional[threading.Thread]:
+    """Agenda o arquivamento (PRODUCT_ARCHIVE_INTERVAL_MINUTES, 0 desativa)."""
+    interval_minutes = float(os.getenv("PRODUCT_ARCHIVE_INTERVAL_MINUTES", "60"))
+    if app.db is None or interval_minutes <= 0:
+        return None
+    return _start_periodic_archive(app, timedelta(minutes=interval_minutes))
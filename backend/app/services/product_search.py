@@ -0,0 +1,243 @@
+"""
+Busca no catálogo de produtos.
+
+Monta o filtro de ``GET /api/products`` a partir dos parâmetros já validados
+(texto, categoria, faixa de preço, status, tamanho, condição, marca) e
+executa a busca de duas formas:
+
+- sem facetas: ``find`` + ``count_documents`` (mesmo custo da listagem);
+- com facetas: uma única agregação ``$facet`` que devolve a página, o total,
+  a contagem por categoria e a distribuição por faixa de preço. A faceta de
+  categoria ignora o filtro de categoria e a de preço ignora o filtro de
+  preço, para que a interface mostre as alternativas disponíveis.
+
+Sem ``status`` só aparecem produtos disponíveis (consulta servida pelos
+índices parciais de ``status: disponivel``); ``status=todos`` desliga o filtro.
+
+A busca textual usa o índice ``txt_titulo_descricao`` com o analisador do
+idioma SEARCH_LANGUAGE (stemming em português por padrão). Resultados ficam
+em cache por consulta normalizada e o cache é limpo a cada escrita em
+produtos.
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..models.product_model import (
+    get_collection,
+    POPULAR_SORT,
+    POPULAR_SORT_KEY,
+    SEARCH_LANGUAGE,
+    AVAILABLE_STATUS,
+    PRODUCT_STATUSES,
+)
+from ..utils.cache import get_cached_search, set_cached_search
+
+# Limites das faixas de preço (em R$); acima do último valor cai em "acima"
+PRICE_BUCKETS: List[float] = [
+    float(v) for v in os.getenv("SEARCH_PRICE_BUCKETS", "0,50,100,200,500").split(",") if v.strip()
+]
+
+# Campos de filtro por valor exato (aceitam vários valores separados por vírgula)
+EXACT_FILTERS = ("status", "tamanho", "condicao", "marca")
+
+# Sem ``status`` a busca mostra só os disponíveis; ``status=todos`` desliga o filtro
+DEFAULT_STATUS = [AVAILABLE_STATUS]
+STATUS_ALL = "todos"
+STATUS_OPTIONS = (*PRODUCT_STATUSES, STATUS_ALL)
+
+SORTS = {
+    "titulo": [("titulo", 1)],
+    POPULAR_SORT_KEY: POPULAR_SORT,
+    "preco_asc": [("preco", 1), ("id", 1)],
+    "preco_desc": [("preco", -1), ("id", 1)],
+    "recentes": [("data_criacao", -1), ("id", -1)],
+}
+SORT_OPTIONS = ["relevancia", *SORTS]
+
+
+def parse_status_filter(raw: Optional[str]) -> Optional[List[str]]:
+    """
+    Converte o parâmetro ``status`` (valores separados por vírgula) no filtro.
+
+    Returns:
+        Lista de status (padrão: só disponíveis) ou None para ``todos``
+
+    Raises:
+        ValueError: Se algum valor não for um status conhecido
+    """
+    if raw is None:
+        return DEFAULT_STATUS
+    values = sorted({v.strip() for v in raw.split(",") if v.strip()})
+    invalid = [v for v in values if v not in STATUS_OPTIONS]
+    if invalid:
+        raise ValueError(f"status inválido: {', '.join(invalid)} (use {', '.join(STATUS_OPTIONS)})")
+    if not values:
+        return DEFAULT_STATUS
+    if STATUS_ALL in values:
+        return None
+    return values
+
+
+def normalize_search_params(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normaliza os parâmetros da busca (a mesma consulta sempre gera a mesma chave de cache).
+
+    Args:
+        args: Parâmetros validados pelo schema da rota
+
+    Returns:
+        Dicionário com os filtros normalizados
+    """
+    params: Dict[str, Any] = {
+        "q": " ".join((args.get("q") or "").lower().split()) or None,
+        "categoria": (args.get("categoria") or "").strip() or None,
+        "preco_min": args.get("preco_min"),
+        "preco_max": args.get("preco_max"),
+        "page": args.get("page", 1),
+        "page_size": args.get("page_size", 20),
+        "facets": bool(args.get("facets")),
+    }
+    for field in EXACT_FILTERS:
+        raw = args.get(field) or ""
+        values = sorted({v.strip() for v in raw.split(",") if v.strip()})
+        params[field] = values or None
+
+    params["status"] = parse_status_filter(args.get("status"))
+
+    sort = args.get("sort")
+    if not sort:
+        sort = "relevancia" if params["q"] else "titulo"
+    if sort == "relevancia" and not params["q"]:
+        sort = "titulo"
+    params["sort"] = sort
+    return params
+
+
+def build_filters(params: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """
+    Separa o filtro em três partes para as facetas.
+
+    Returns:
+        Tupla (filtro_base, filtro_categoria, filtro_preco)
+    """
+    base: Dict[str, Any] = {}
+    if params.get("q"):
+        base["$text"] = {"$search": params["q"], "$language": SEARCH_LANGUAGE}
+    for field in EXACT_FILTERS:
+        values = params.get(field)
+        if values:
+            base[field] = values[0] if len(values) == 1 else {"$in": values}
+
+    category = {"categoria": params["categoria"]} if params.get("categoria") else {}
+
+    price: Dict[str, Any] = {}
+    bounds = {}
+    if params.get("preco_min") is not None:
+        bounds["$gte"] = float(params["preco_min"])
+    if params.get("preco_max") is not None:
+        bounds["$lte"] = float(params["preco_max"])
+    if bounds:
+        price["preco"] = bounds
+    return base, category, price
+
+
+def _sort_spec(params: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    if params["sort"] == "relevancia":
+        return [("score", {"$meta": "textScore"})]
+    return SORTS[params["sort"]]
+
+
+def search_products(db, args: Dict[str, Any], projection: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """
+    Busca produtos com filtros, ordenação e (opcionalmente) facetas.
+
+    Args:
+        db: Instância do banco de dados
+        args: Parâmetros validados da rota
+        projection: Projeção dos itens (ex.: campos da listagem)
+
+    Returns:
+        Dicionário com ``items`` (documentos crus), ``total``, ``params`` e,
+        se pedido, ``facets``
+    """
+    params = normalize_search_params(args)
+    cache_key = repr(sorted(params.items()))
+    cached = get_cached_search(cache_key)
+    if cached is not None:
+        return cached
+
+    base, category, price = build_filters(params)
+    query = {**base, **category, **price}
+    sort = _sort_spec(params)
+    skip = (params["page"] - 1) * params["page_size"]
+    coll = get_collection(db)
+
+    if params["facets"]:
+        result = _search_with_facets(coll, params, base, category, price, sort, skip, projection)
+    else:
+        cursor = coll.find(query, projection).sort(sort).skip(skip).limit(params["page_size"])
+        result = {
+            "items": list(cursor),
+            "total": coll.count_documents(query),
+        }
+
+    result["params"] = params
+    set_cached_search(cache_key, result)
+    return result
+
+
+def _search_with_facets(coll, params, base, category, price, sort, skip, projection) -> Dict[str, Any]:
+    """Página, total e facetas em uma única agregação."""
+    def match(*filters):
+        merged = {k: v for f in filters for k, v in f.items()}
+        return [{"$match": merged}] if merged else []
+
+    items_pipeline = [*match(category, price), {"$sort": dict(sort)}, {"$skip": skip},
+                      {"$limit": params["page_size"]}]
+    if projection:
+        items_pipeline.append({"$project": projection})
+
+    pipeline = [
+        *match(base),
+        {"$facet": {
+            "items": items_pipeline,
+            "total": [*match(category, price), {"$count": "count"}],
+            "categorias": [
+                *match(price),
+                {"$group": {"_id": "$categoria", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+            ],
+            "precos": [
+                *match(category),
+                {"$bucket": {
+                    "groupBy": "$preco",
+                    "boundaries": PRICE_BUCKETS,
+                    "default": "acima",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+        }},
+    ]
+    facet = next(iter(coll.aggregate(pipeline)), {})
+
+    total = facet.get("total") or []
+    return {
+        "items": facet.get("items", []),
+        "total": total[0]["count"] if total else 0,
+        "facets": {
+            "categorias": [
+                {"categoria": item["_id"], "count": item["count"]}
+                for item in facet.get("categorias", []) if item.get("_id")
+            ],
+            "precos": [_price_range(item) for item in facet.get("precos", [])],
+        },
+    }
+
+
+def _price_range(bucket: Dict[str, Any]) -> Dict[str, Any]:
+    """Converte um bucket do ``$bucket`` em faixa ``{min, max, count}``."""
+    lower = bucket["_id"]
+    if lower == "acima":
+        return {"min": PRICE_BUCKETS[-1], "max": None, "count": bucket["count"]}
+    index = PRICE_BUCKETS.index(lower)
+    return {"min": lower, "max": PRICE_BUCKETS[index + 1], "count": bucket["count"]}
@@ -0,0 +1,274 @@
+"""
+Rate limiting compartilhado entre processos.
+
+- ``BatchedMongoStorage``: storage do Flask-Limiter (esquema ``mongodb-batched://``)
+  que conta os hits em memória e envia os incrementos para a coleção
+  ``rate_limits`` em lote, em segundo plano (um ``bulk_write`` por intervalo,
+  com ``$inc`` atômico e TTL). A checagem de limite nunca espera pelo banco;
+  o custo é uma folga de até ``flush_interval`` segundos entre processos.
+- ``limiter_options``: escolhe o storage por RATELIMIT_STORAGE_URI
+  (``memory://``, ``mongodb-batched://`` ou qualquer URI suportada pela
+  biblioteca ``limits``, como ``redis://``).
+- ``apply_blueprint_limits``: limites por blueprint (RATELIMIT_<BLUEPRINT>).
+"""
+import os
+import time
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from limits.storage import Storage
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "rate_limits"
+
+# Limites padrão por blueprint ("exempt" desliga o rate limiting do blueprint)
+DEFAULT_BLUEPRINT_LIMITS = {
+    "health": "exempt",
+}
+
+
+class _Counter:
+    __slots__ = ("base", "pending", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.base = 0        # Último valor conhecido (global + já enviado por este processo)
+        self.pending = 0     # Hits ainda não enviados ao banco
+        self.expires_at = expires_at
+
+
+class BatchedMongoStorage(Storage):
+    """
+    Storage de contadores com envio em lote para o MongoDB.
+
+    Args:
+        collection: Coleção do MongoDB (None = só memória)
+        collection_factory: Função que retorna a coleção, para quando o banco
+            só é conectado depois do limiter
+        flush_interval: Segundos entre envios dos incrementos
+    """
+
+    STORAGE_SCHEME = ["mongodb-batched"]
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False,
+                 collection: Any = None, collection_factory: Optional[Callable[[], Any]] = None,
+                 flush_interval: float = 1.0, **options: Any):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._collection_source = collection
+        self._collection_factory = collection_factory
+        self._indexed = False
+        self.flush_interval = flush_interval
+        self._counters: Dict[str, _Counter] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"flushes": 0, "keys_flushed": 0, "errors": 0}
+
+    @property
+    def base_exceptions(self):
+        return PyMongoError
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        now = time.time()
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or counter.expires_at <= now:
+                counter = self._counters[key] = _Counter(now + expiry)
+            counter.pending += amount
+            value = counter.base + counter.pending
+        self._ensure_worker()
+        return value
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or counter.expires_at <= time.time():
+                return 0
+            return counter.base + counter.pending
+
+    def get_expiry(self, key: str) -> float:
+        with self._lock:
+            counter = self._counters.get(key)
+            return counter.expires_at if counter is not None else time.time()
+
+    def check(self) -> bool:
+        collection = self._collection()
+        if collection is None:
+            return True
+        try:
+            collection.find_one({}, {"_id": 1})
+            return True
+        except Exception:
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self._lock:
+            self._counters.clear()
+        collection = self._collection()
+        if collection is None:
+            return None
+        return collection.delete_many({}).deleted_count
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._counters.pop(key, None)
+        collection = self._collection()
+        if collection is not None:
+            collection.delete_one({"_id": key})
+
+    def flush(self) -> int:
+        """
+        Envia os incrementos pendentes (um ``bulk_write``) e atualiza os
+        contadores locais com os valores globais.
+
+        Returns:
+            Quantidade de chaves enviadas
+        """
+        with self._flush_lock:
+            now = time.time()
+            with self._lock:
+                batch = {}
+                for key, counter in list(self._counters.items()):
+                    if counter.expires_at <= now and not counter.pending:
+                        del self._counters[key]
+                        continue
+                    if counter.pending:
+                        batch[key] = (counter.pending, counter.expires_at)
+                        # Otimista: o valor enviado já conta como base até a resposta do banco
+                        counter.base += counter.pending
+                        counter.pending = 0
+            if not batch:
+                return 0
+
+            collection = self._collection()
+            if collection is None:
+                return 0
+
+            try:
+                collection.bulk_write([self._increment_op(key, amount, expires_at)
+                                       for key, (amount, expires_at) in batch.items()], ordered=False)
+                current = {
+                    doc["_id"]: doc
+                    for doc in collection.find({"_id": {"$in": list(batch)}}, {"count": 1, "expire_at": 1})
+                }
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Erro ao enviar contadores de rate limit: {e}")
+                return 0
+
+            with self._lock:
+                for key, doc in current.items():
+                    counter = self._counters.get(key)
+                    if counter is None:
+                        continue
+                    counter.base = max(int(doc.get("count", 0)), 0)
+                    expire_at = doc.get("expire_at")
+                    if isinstance(expire_at, datetime):
+                        counter.expires_at = (expire_at - datetime(1970, 1, 1)).total_seconds()
+
+            self.stats["flushes"] += 1
+            self.stats["keys_flushed"] += len(batch)
+            return len(batch)
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    @staticmethod
+    def _increment_op(key: str, amount: int, expires_at: float) -> UpdateOne:
+        """``$inc`` atômico que reinicia o contador quando a janela global expirou."""
+        now = datetime.utcnow()
+        expired = {"$or": [
+            {"$eq": [{"$type": "$expire_at"}, "missing"]},
+            {"$lte": ["$expire_at", now]},
+        ]}
+        new_expiry = datetime.utcfromtimestamp(expires_at)
+        return UpdateOne(
+            {"_id": key},
+            [{"$set": {
+                "count": {"$cond": [expired, amount, {"$add": ["$count", amount]}]},
+                "expire_at": {"$cond": [expired, new_expiry, "$expire_at"]},
+            }}],
+            upsert=True,
+        )
+
+    def _collection(self):
+        collection = self._collection_source
+        if collection is None and self._collection_factory is not None:
+            collection = self._collection_factory()
+        if collection is not None and not self._indexed:
+            self._indexed = True
+            try:
+                collection.create_index([("expire_at", ASCENDING)], expireAfterSeconds=0, name="ttl_expire_at")
+            except Exception as e:
+                logger.warning(f"Erro ao criar índices de {COLLECTION_NAME}: {e}")
+        return collection
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="rate-limit-flush", daemon=True)
+            self._thread.start()
+        # Envia o que sobrou quando o processo termina
+        atexit.register(self.shutdown)
+
+    def _loop(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erro no envio de contadores de rate limit: {e}")
+
+
+def limiter_options(app) -> Dict[str, Any]:
+    """
+    Argumentos de storage e limites padrão do Flask-Limiter a partir do ambiente.
+
+    RATELIMIT_STORAGE_URI: ``memory://`` (padrão, por processo),
+    ``mongodb-batched://`` (usa ``app.db``) ou uma URI da biblioteca ``limits``.
+    RATELIMIT_DEFAULT: limites padrão, separados por ``;``.
+    """
+    storage_uri = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+    options: Dict[str, Any] = {
+        "storage_uri": storage_uri,
+        "default_limits": [os.getenv("RATELIMIT_DEFAULT", "200 per day;50 per hour")],
+    }
+    if storage_uri.startswith("mongodb-batched"):
+        options["storage_options"] = {
+            # app.db só é definido depois do limiter: a coleção é resolvida no primeiro envio
+            "collection_factory": lambda: app.db[COLLECTION_NAME] if getattr(app, "db", None) is not None else None,
+            "flush_interval": float(os.getenv("RATELIMIT_FLUSH_SECONDS", "1")),
+        }
+    return options
+
+
+def apply_blueprint_limits(limiter, app) -> Dict[str, str]:
+    """
+    Aplica limites por blueprint: RATELIMIT_<NOME> (ex.: RATELIMIT_USERS="30 per minute").
+    O valor ``exempt`` remove o blueprint do rate limiting.
+
+    Returns:
+        Limites aplicados por blueprint
+    """
+    applied = {}
+    for name, blueprint in app.blueprints.items():
+        value = os.getenv(f"RATELIMIT_{name.upper()}", DEFAULT_BLUEPRINT_LIMITS.get(name, "")).strip()
+        if not value:
+            continue
+        if value.lower() == "exempt":
+            limiter.exempt(blueprint)
+        else:
+            limiter.limit(value)(blueprint)
+        applied[name] = value
+    return applied
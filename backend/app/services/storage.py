@@ -0,0 +1,50 @@
+"""
+Seleção do backend de armazenamento de imagens.
+
+STORAGE_BACKEND escolhe a implementação:
+- supabase (padrão): Supabase Storage
+- local: disco local (LOCAL_STORAGE_PATH), servido pela API ou por CDN
+- memory: memória do processo, para testes e benchmarks sem rede
+"""
+import os
+
+from .storage_backend import StorageBackend, LocalStorageBackend, MemoryStorageBackend
+
+STORAGE_BACKENDS = ("supabase", "local", "memory")
+
+
+def create_storage_backend(name: str = None) -> StorageBackend:
+    """
+    Cria o backend de armazenamento configurado.
+
+    Args:
+        name: Nome do backend (padrão: STORAGE_BACKEND ou 'supabase')
+
+    Returns:
+        StorageBackend: Instância do backend
+    """
+    name = (name or os.getenv("STORAGE_BACKEND", "supabase")).strip().lower()
+    if name not in STORAGE_BACKENDS:
+        print(f"Aviso: STORAGE_BACKEND '{name}' desconhecido, usando 'supabase'")
+        name = "supabase"
+
+    if name == "local":
+        return LocalStorageBackend()
+    if name == "memory":
+        return MemoryStorageBackend()
+
+    # Importado aqui para não carregar o SDK do Supabase nos outros backends
+    from .supabase_storage import SupabaseStorageService
+    return SupabaseStorageService()
+
+
+# Instância global do serviço
+# Inicializada de forma segura - não falha se o backend estiver indisponível
+try:
+    storage_service = create_storage_backend()
+except Exception as e:
+    print(f"Erro crítico ao inicializar storage: {e}")
+    # Usa memória com estado de erro para evitar falhas na aplicação
+    storage_service = MemoryStorageBackend()
+    storage_service.is_connected = False
+    storage_service.connection_error = f"Falha na inicialização: {str(e)}"
@@ -0,0 +1,606 @@
+"""
+Backends de armazenamento de imagens de produtos.
+
+``StorageBackend`` concentra o pipeline comum (validação, redimensionamento,
+variações responsivas e nomes de arquivo); cada implementação fornece apenas
+as operações primitivas sobre o armazenamento:
+
+- ``_upload_bytes``: grava um objeto
+- ``_public_url``: gera a URL de acesso
+- ``_extract_path``: converte uma URL de volta no caminho do objeto
+- ``_remove_paths``: remove vários objetos
+- ``_list_objects``/``_list_prefixes``: lista objetos de um prefixo e os prefixos de produtos
+- ``_file_info``: metadados de um objeto
+
+Implementações: Supabase (``supabase_storage``), disco local e memória.
+A escolha é feita por STORAGE_BACKEND em ``app.services.storage``.
+"""
+import os
+import re
+import uuid
+from abc import ABC, abstractmethod
+import threading
+import mimetypes
+from io import BytesIO
+from datetime import datetime
+from typing import Any, Optional, Tuple, List, Dict, Iterable
+from PIL import Image, features
+from flask import send_file
+from werkzeug.datastructures import FileStorage
+from werkzeug.security import safe_join
+
+
+def _parse_sizes(raw: str) -> Tuple[int, ...]:
+    """Converte a lista de larguras do .env em tupla ordenada (menor -> maior)."""
+    sizes = set()
+    for part in raw.split(","):
+        part = part.strip()
+        if part.isdigit() and int(part) > 0:
+            sizes.add(int(part))
+    return tuple(sorted(sizes)) or (160, 480, 1200)
+
+
+# Larguras geradas para cada imagem de produto (miniatura, listagem, detalhe)
+IMAGE_SIZES: Tuple[int, ...] = _parse_sizes(os.getenv("IMAGE_SIZES", "160,480,1200"))
+THUMBNAIL_SIZE: int = IMAGE_SIZES[0]
+
+# WebP reduz bastante o tamanho; cai para JPEG se o Pillow não tiver suporte
+if features.check("webp"):
+    DERIVATIVE_FORMAT, DERIVATIVE_EXT, DERIVATIVE_MIME = "WEBP", ".webp", "image/webp"
+else:
+    DERIVATIVE_FORMAT, DERIVATIVE_EXT, DERIVATIVE_MIME = "JPEG", ".jpg", "image/jpeg"
+
+# Rota que serve arquivos dos backends local e em memória
+LOCAL_FILES_URL = "/api/images/files"
+
+# Objetos têm nome único (uuid), então podem ser cacheados por 1 ano
+FILE_MAX_AGE = 31536000
+
+
+# Caminhos gerados pelos backends: ``product_<id>/<nome>.<ext>`` ou ``<nome>.<ext>``
+# (upload avulso sem produto)
+_STORAGE_PATH_RE = re.compile(r"^(?:product_(\d+)/)?[A-Za-z0-9][A-Za-z0-9_-]*\.[A-Za-z0-9]{2,5}$")
+
+
+def is_storage_path(value: Any) -> bool:
+    """
+    Indica se o valor é um caminho de objeto no storage (ex.: ``product_7/abc_480.webp``)
+    e não uma URL. Produtos guardam apenas o caminho; a URL é gerada ao serializar.
+    """
+    return isinstance(value, str) and _STORAGE_PATH_RE.match(value) is not None
+
+
+def storage_path_product_id(value: Any) -> Optional[int]:
+    """Id do produto dono do caminho (prefixo ``product_<id>/``), ou None."""
+    match = _STORAGE_PATH_RE.match(value) if isinstance(value, str) else None
+    return int(match.group(1)) if match and match.group(1) else None
+
+
+class StorageBackend(ABC):
+    """Interface comum dos backends de armazenamento de imagens."""
+
+    name = "base"
+
+    def __init__(self):
+        self.connection_error: Optional[str] = None
+        self.is_connected = False
+
+    # ------------------------------------------------------------------
+    # Primitivas (implementadas por cada backend)
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def _upload_bytes(self, path: str, data: bytes, mime_type: str) -> Tuple[bool, str]:
+        ...
+
+    @abstractmethod
+    def _public_url(self, path: str) -> str:
+        ...
+
+    @abstractmethod
+    def _extract_path(self, image_url: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def _remove_paths(self, paths: List[str]) -> Tuple[bool, str]:
+        ...
+
+    @abstractmethod
+    def _list_objects(self, prefix: str) -> List[Dict[str, Any]]:
+        """Objetos de um prefixo: ``{"path": str, "updated_at": datetime | None}``."""
+        ...
+
+    @abstractmethod
+    def _list_prefixes(self) -> List[str]:
+        """Prefixos de primeiro nível (``product_<id>/``)."""
+        ...
+
+    @abstractmethod
+    def _file_info(self, path: str) -> Dict[str, Any]:
+        ...
+
+    def _list_paths(self, prefix: str) -> List[str]:
+        return [obj["path"] for obj in self._list_objects(prefix)]
+
+    def sign_urls(self, paths: List[str]) -> Dict[str, str]:
+        """
+        Gera as URLs de acesso de vários objetos de uma vez.
+        Backends com URLs assinadas fazem uma única chamada para o lote.
+        """
+        return {path: self._public_url(path) for path in paths}
+
+    def _object_path(self, value: str) -> Optional[str]:
+        """Aceita tanto o caminho do objeto quanto uma URL gerada pelo backend."""
+        if is_storage_path(value):
+            return value
+        return self._extract_path(value)
+
+    def send(self, path: str):
+        """
+        Resposta Flask com o conteúdo do objeto, quando o backend serve arquivos.
+        Retorna None se o backend não serve arquivos ou o objeto não existe.
+        """
+        return None
+
+    # ------------------------------------------------------------------
+    # Estado
+    # ------------------------------------------------------------------
+
+    def is_available(self) -> bool:
+        """Verifica se o backend está disponível"""
+        return self.is_connected
+
+    def get_connection_status(self) -> dict:
+        """Retorna status da conexão para health check"""
+        return {
+            "status": "UP" if self.is_available() else "DOWN",
+            "backend": self.name,
+            "error": self.connection_error,
+        }
+
+    def check_connection(self, max_age: Optional[int] = None) -> dict:
+        """Status para o health check; backends remotos testam a conectividade"""
+        return self.get_connection_status()
+
+    def _unavailable_message(self) -> str:
+        return f"Serviço de storage indisponível: {self.connection_error or 'Conexão não estabelecida'}"
+
+    # ------------------------------------------------------------------
+    # Pipeline de imagens
+    # ------------------------------------------------------------------
+
+    def _generate_filename(self, original_filename: str) -> str:
+        """Gera nome único para o arquivo"""
+        # Extrai extensão do arquivo original
+        _, ext = os.path.splitext(original_filename)
+        if not ext:
+            ext = '.jpg'  # Default para JPG se não tiver extensão
+
+        # Gera UUID único + extensão
+        unique_filename = f"{uuid.uuid4().hex}{ext.lower()}"
+        return unique_filename
+
+    def _validate_image(self, file: FileStorage) -> bool:
+        """Valida se o arquivo é uma imagem válida"""
+        if not file.content_type:
+            return False
+
+        # Tipos MIME permitidos
+        allowed_types = [
+            'image/jpeg', 'image/jpg', 'image/png',
+            'image/webp', 'image/gif'
+        ]
+
+        return file.content_type in allowed_types
+
+    def _resize_image(self, file: FileStorage, max_width: int = 1200, max_height: int = 1200) -> BytesIO:
+        """Redimensiona imagem para otimizar armazenamento"""
+        try:
+            # Abre a imagem
+            image = Image.open(file.stream)
+
+            # Calcula novo tamanho mantendo proporção
+            image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+
+            # Converte para RGB se necessário (para JPEG)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+                rgb_image.paste(image, mask=image.split()[-1] if 'A' in image.mode else None)
+                image = rgb_image
+
+            # Salva em BytesIO
+            output = BytesIO()
+            format = 'JPEG' if file.content_type == 'image/jpeg' else 'PNG'
+            quality = 85 if format == 'JPEG' else None
+
+            save_kwargs = {'format': format}
+            if quality:
+                save_kwargs['quality'] = quality
+                save_kwargs['optimize'] = True
+
+            image.save(output, **save_kwargs)
+            output.seek(0)
+
+            return output
+
+        except Exception as e:
+            # Se falhar o redimensionamento, retorna original
+            file.stream.seek(0)
+            return BytesIO(file.stream.read())
+
+    def _build_derivatives(self, file: FileStorage, sizes: Iterable[int] = IMAGE_SIZES) -> Dict[int, BytesIO]:
+        """
+        Gera as variações redimensionadas de uma imagem a partir de uma única decodificação.
+
+        As larguras são processadas da maior para a menor, reaproveitando o resultado
+        anterior como origem para reduzir o custo do LANCZOS.
+        """
+        file.stream.seek(0)
+        image = Image.open(file.stream)
+        image.load()
+
+        # WebP suporta transparência; JPEG precisa de fundo branco
+        has_alpha = image.mode in ('RGBA', 'LA', 'P')
+        if has_alpha:
+            image = image.convert('RGBA')
+            if DERIVATIVE_FORMAT == "JPEG":
+                rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+                rgb_image.paste(image, mask=image.split()[-1])
+                image = rgb_image
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        if DERIVATIVE_FORMAT == "WEBP":
+            save_kwargs = {'format': DERIVATIVE_FORMAT, 'quality': 80, 'method': 4}
+        else:
+            save_kwargs = {'format': DERIVATIVE_FORMAT, 'quality': 85, 'optimize': True}
+
+        derivatives: Dict[int, BytesIO] = {}
+        source = image
+        for size in sorted(set(sizes), reverse=True):
+            resized = source.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+            output = BytesIO()
+            resized.save(output, **save_kwargs)
+            output.seek(0)
+
+            derivatives[size] = output
+            source = resized
+
+        return derivatives
+
+    def upload_image(self, file: FileStorage, product_id: Optional[int] = None) -> Tuple[bool, str]:
+        """
+        Faz upload de uma imagem
+
+        Args:
+            file: Arquivo de imagem enviado
+            product_id: ID do produto (opcional, para organização)
+
+        Returns:
+            Tuple[bool, str]: (sucesso, caminho_no_storage_ou_mensagem_erro)
+        """
+        # Verifica se o serviço está disponível
+        if not self.is_available():
+            return False, self._unavailable_message()
+
+        try:
+            # Valida se é uma imagem
+            if not self._validate_image(file):
+                return False, "Arquivo deve ser uma imagem válida (JPEG, PNG, WebP, GIF)"
+
+            # Gera nome único
+            filename = self._generate_filename(file.filename)
+
+            # Adiciona prefixo do produto se fornecido
+            if product_id:
+                filename = f"product_{product_id}/{filename}"
+
+            # Redimensiona imagem
+            resized_image = self._resize_image(file)
+
+            # Detecta tipo MIME
+            mime_type = mimetypes.guess_type(filename)[0] or 'image/jpeg'
+
+            success, result = self._upload_bytes(filename, resized_image.getvalue(), mime_type)
+            if not success:
+                return False, result
+
+            # Como em upload_image_set: a URL é gerada ao serializar o produto
+            return True, filename
+
+        except Exception as e:
+            return False, f"Erro interno no upload: {str(e)}"
+
+    def upload_image_set(self, file: FileStorage, product_id: int) -> Tuple[bool, Any]:
+        """
+        Gera e envia as variações responsivas de uma imagem de produto.
+
+        Todas as variações ficam em ``product_<id>/`` com o mesmo prefixo
+        (``<uuid>_<largura>.webp``), facilitando limpeza e listagem. Retorna
+        os caminhos dos objetos: as URLs (assinadas) são geradas sob demanda
+        por ``app.services.image_urls`` ao serializar o produto.
+
+        Args:
+            file: Arquivo de imagem enviado
+            product_id: ID do produto
+
+        Returns:
+            Tuple[bool, Dict[str, str] | str]: (sucesso, {largura: caminho} ou mensagem_erro)
+        """
+        if not self.is_available():
+            return False, self._unavailable_message()
+
+        if not self._validate_image(file):
+            return False, "Arquivo deve ser uma imagem válida (JPEG, PNG, WebP, GIF)"
+
+        try:
+            derivatives = self._build_derivatives(file)
+        except Exception as e:
+            return False, f"Erro ao processar imagem: {str(e)}"
+
+        base_name = uuid.uuid4().hex
+        paths: Dict[str, str] = {}
+
+        for size, content in sorted(derivatives.items()):
+            path = f"product_{product_id}/{base_name}_{size}{DERIVATIVE_EXT}"
+            success, result = self._upload_bytes(path, content.getvalue(), DERIVATIVE_MIME)
+            if not success:
+                # Não deixa variações órfãs para trás
+                if paths:
+                    self._remove_paths(list(paths.values()))
+                return False, result
+            paths[str(size)] = path
+
+        return True, paths
+
+    def delete_image(self, image_url: str) -> Tuple[bool, str]:
+        """
+        Deleta uma imagem
+
+        Args:
+            image_url: URL pública ou caminho da imagem no storage
+
+        Returns:
+            Tuple[bool, str]: (sucesso, mensagem)
+        """
+        # Verifica se o serviço está disponível
+        if not self.is_available():
+            return False, self._unavailable_message()
+
+        path = self._object_path(image_url)
+        if not path:
+            return False, "URL de imagem inválida"
+
+        success, message = self._remove_paths([path])
+        if success:
+            return True, "Imagem deletada com sucesso"
+        return False, message
+
+    def delete_image_set(self, image_urls: Iterable[str]) -> Tuple[bool, str]:
+        """
+        Deleta de uma vez todas as variações de uma imagem de produto.
+
+        Args:
+            image_urls: Caminhos ou URLs das variações (ex.: valores de ``produto['imagens']``)
+
+        Returns:
+            Tuple[bool, str]: (sucesso, mensagem)
+        """
+        if not self.is_available():
+            return False, self._unavailable_message()
+
+        paths = sorted({p for p in (self._object_path(u) for u in image_urls if u) if p})
+        if not paths:
+            return False, "Nenhuma URL de imagem válida"
+
+        return self._remove_paths(paths)
+
+    def list_product_images(self, product_id: int) -> Tuple[bool, List[str]]:
+        """
+        Lista todas as imagens de um produto
+
+        Args:
+            product_id: ID do produto
+
+        Returns:
+            Tuple[bool, List[str]]: (sucesso, lista_de_urls)
+        """
+        # Verifica se o serviço está disponível
+        if not self.is_available():
+            return False, []
+
+        try:
+            paths = self._list_paths(f"product_{product_id}/")
+            return True, [self._public_url(path) for path in paths]
+        except Exception:
+            return False, []
+
+    def get_image_info(self, image_url: str) -> dict:
+        """
+        Obtém informações sobre uma imagem
+
+        Args:
+            image_url: URL pública da imagem
+
+        Returns:
+            dict: Informações da imagem
+        """
+        # Verifica se o serviço está disponível
+        if not self.is_available():
+            return {"error": self._unavailable_message()}
+
+        try:
+            # Extrai path da URL
+            path = self._object_path(image_url)
+            if not path:
+                return {"error": "URL inválida"}
+
+            return {**self._file_info(path), "url": image_url}
+
+        except Exception as e:
+            return {"error": str(e)}
+
+
+class _UrlPrefixMixin:
+    """URLs no formato ``<base_url>/<path>`` para backends servidos pela própria API ou CDN."""
+
+    base_url = LOCAL_FILES_URL
+
+    def _public_url(self, path: str) -> str:
+        return f"{self.base_url}/{path}"
+
+    def _extract_path(self, image_url: str) -> Optional[str]:
+        prefix = f"{self.base_url}/"
+        url = image_url.split('?', 1)[0]
+        if not url.startswith(prefix):
+            return None
+        path = url[len(prefix):]
+        # Impede caminhos fora do armazenamento
+        if not path or path.startswith('/') or '..' in path.split('/'):
+            return None
+        return path
+
+
+class LocalStorageBackend(_UrlPrefixMixin, StorageBackend):
+    """
+    Armazena imagens em disco (LOCAL_STORAGE_PATH).
+
+    Os arquivos são servidos por ``GET /api/images/files/<path>`` com suporte a
+    Range/If-Modified-Since, ou diretamente por uma CDN na frente do volume
+    (LOCAL_STORAGE_URL).
+    """
+
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None, base_url: Optional[str] = None):
+        super().__init__()
+        default_root = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
+        self.root = os.path.abspath(root or os.getenv("LOCAL_STORAGE_PATH") or default_root)
+        self.base_url = (base_url or os.getenv("LOCAL_STORAGE_URL") or LOCAL_FILES_URL).rstrip('/')
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            self.is_connected = True
+        except OSError as e:
+            self.connection_error = f"Diretório de storage inacessível: {str(e)}"
+
+    def get_connection_status(self) -> dict:
+        return {**super().get_connection_status(), "path": self.root}
+
+    def _full_path(self, path: str) -> Optional[str]:
+        return safe_join(self.root, path)
+
+    def _upload_bytes(self, path: str, data: bytes, mime_type: str) -> Tuple[bool, str]:
+        full_path = self._full_path(path)
+        if not full_path:
+            return False, "Caminho de arquivo inválido"
+        try:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            # Escreve em arquivo temporário e renomeia para não servir arquivo parcial
+            tmp_path = f"{full_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, full_path)
+        except OSError as e:
+            return False, f"Erro interno no upload: {str(e)}"
+        return True, path
+
+    def _remove_paths(self, paths: List[str]) -> Tuple[bool, str]:
+        try:
+            for path in paths:
+                full_path = self._full_path(path)
+                if full_path and os.path.isfile(full_path):
+                    os.remove(full_path)
+            return True, "Imagens deletadas com sucesso"
+        except OSError as e:
+            return False, f"Erro interno ao deletar: {str(e)}"
+
+    def _list_objects(self, prefix: str) -> List[Dict[str, Any]]:
+        directory = self._full_path(prefix)
+        if not directory or not os.path.isdir(directory):
+            return []
+        objects = []
+        for name in sorted(os.listdir(directory)):
+            full_path = os.path.join(directory, name)
+            if os.path.isfile(full_path) and not name.endswith(".tmp"):
+                objects.append({
+                    "path": f"{prefix}{name}",
+                    "updated_at": datetime.utcfromtimestamp(os.path.getmtime(full_path)),
+                })
+        return objects
+
+    def _list_prefixes(self) -> List[str]:
+        return [
+            f"{name}/" for name in sorted(os.listdir(self.root))
+            if os.path.isdir(os.path.join(self.root, name))
+        ]
+
+    def _file_info(self, path: str) -> Dict[str, Any]:
+        full_path = self._full_path(path)
+        if not full_path or not os.path.isfile(full_path):
+            raise FileNotFoundError("Imagem não encontrada")
+        stat = os.stat(full_path)
+        return {
+            "size": stat.st_size,
+            "content_type": mimetypes.guess_type(full_path)[0] or "",
+            "last_modified": datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+        }
+
+    def send(self, path: str):
+        full_path = self._full_path(path)
+        if not full_path or not os.path.isfile(full_path):
+            return None
+        return send_file(full_path, conditional=True, max_age=FILE_MAX_AGE)
+
+
+class MemoryStorageBackend(_UrlPrefixMixin, StorageBackend):
+    """Armazena imagens em memória; útil para testes e benchmarks sem rede."""
+
+    name = "memory"
+
+    def __init__(self, base_url: Optional[str] = None):
+        super().__init__()
+        self.base_url = (base_url or LOCAL_FILES_URL).rstrip('/')
+        self.objects: Dict[str, Tuple[bytes, str, datetime]] = {}
+        self._lock = threading.Lock()
+        self.is_connected = True
+
+    def _upload_bytes(self, path: str, data: bytes, mime_type: str) -> Tuple[bool, str]:
+        with self._lock:
+            self.objects[path] = (bytes(data), mime_type, datetime.utcnow())
+        return True, path
+
+    def _remove_paths(self, paths: List[str]) -> Tuple[bool, str]:
+        with self._lock:
+            for path in paths:
+                self.objects.pop(path, None)
+        return True, "Imagens deletadas com sucesso"
+
+    def _list_objects(self, prefix: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"path": path, "updated_at": entry[2]}
+                for path, entry in sorted(self.objects.items()) if path.startswith(prefix)
+            ]
+
+    def _list_prefixes(self) -> List[str]:
+        with self._lock:
+            return sorted({path.split("/", 1)[0] + "/" for path in self.objects if "/" in path})
+
+    def _file_info(self, path: str) -> Dict[str, Any]:
+        with self._lock:
+            if path not in self.objects:
+                raise FileNotFoundError("Imagem não encontrada")
+            data, mime_type, modified = self.objects[path]
+        return {"size": len(data), "content_type": mime_type, "last_modified": modified.isoformat()}
+
+    def send(self, path: str):
+        with self._lock:
+            entry = self.objects.get(path)
+        if entry is None:
+            return None
+        data, mime_type, modified = entry
+        return send_file(BytesIO(data), mimetype=mime_type, conditional=True,
+                         last_modified=modified, max_age=FILE_MAX_AGE,
+                         download_name=os.path.basename(path))
@@ -0,0 +1,319 @@
+"""
+Manutenção do storage de imagens.
+
+- ``DeletionQueue``: remoções de imagens saem da requisição e são enviadas
+  em lotes (uma chamada ``remove([...])`` por lote) por uma thread em segundo plano.
+- ``collect_orphans``: compara os objetos de cada prefixo ``product_<id>/``
+  com as imagens referenciadas pelos produtos e remove os órfãos
+  (com relatório em modo dry-run).
+"""
+import os
+import time
+import atexit
+import logging
+import threading
+from itertools import chain
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .storage_backend import is_storage_path
+
+logger = logging.getLogger(__name__)
+
+# Objetos recentes são ignorados pelo GC: podem pertencer a um upload em andamento
+DEFAULT_GC_GRACE = timedelta(hours=1)
+
+# Quantidade máxima de caminhos órfãos listados no relatório
+REPORT_SAMPLE_SIZE = 200
+
+
+class DeletionQueue:
+    """
+    Fila de remoções de imagens enviadas ao storage em lotes.
+
+    Caminhos (ou URLs) enfileirados são agrupados e removidos a cada
+    ``flush_interval`` segundos, ou assim que ``batch_size`` caminhos se
+    acumulam. Lotes que falham voltam para a fila até ``max_attempts``;
+    o que sobrar é recolhido pelo GC de órfãos.
+    """
+
+    def __init__(self, storage=None, batch_size: int = 100, flush_interval: float = 5.0,
+                 max_attempts: int = 3):
+        self._storage = storage
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"enqueued": 0, "deleted": 0, "failed": 0, "batches": 0}
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from .storage import storage_service
+            self._storage = storage_service
+        return self._storage
+
+    def enqueue(self, values: Iterable[str]) -> int:
+        """
+        Agenda a remoção de imagens.
+
+        Args:
+            values: Caminhos no storage ou URLs geradas pelo backend
+
+        Returns:
+            Quantidade de caminhos adicionados à fila
+        """
+        paths = {self._to_path(v) for v in values if v}
+        paths.discard(None)
+        if not paths:
+            return 0
+
+        with self._lock:
+            for path in paths:
+                self._pending.setdefault(path, 0)
+            self.stats["enqueued"] += len(paths)
+            full = len(self._pending) >= self.batch_size
+
+        self._ensure_worker()
+        if full:
+            self._wakeup.set()
+        return len(paths)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> Dict[str, int]:
+        """Remove agora tudo o que está na fila, em lotes de ``batch_size``."""
+        deleted = failed = 0
+        with self._flush_lock:
+            with self._lock:
+                batch_source = dict(self._pending)
+                self._pending.clear()
+
+            paths = sorted(batch_source)
+            for start in range(0, len(paths), self.batch_size):
+                batch = paths[start:start + self.batch_size]
+                success, message = self.storage._remove_paths(batch)
+                self.stats["batches"] += 1
+                if success:
+                    deleted += len(batch)
+                    continue
+
+                logger.warning(f"Falha ao remover lote de {len(batch)} imagens: {message}")
+                with self._lock:
+                    for path in batch:
+                        attempts = batch_source[path] + 1
+                        if attempts < self.max_attempts:
+                            self._pending[path] = attempts
+                        else:
+                            failed += 1
+
+        self.stats["deleted"] += deleted
+        self.stats["failed"] += failed
+        return {"deleted": deleted, "failed": failed}
+
+    def shutdown(self) -> None:
+        """Para a thread e envia o que restou na fila."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _to_path(self, value: str) -> Optional[str]:
+        if is_storage_path(value):
+            return value
+        try:
+            return self.storage._extract_path(value)
+        except Exception:
+            return None
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="storage-deletions", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                if self.pending():
+                    self.flush()
+            except Exception as e:
+                logger.error(f"Erro ao processar fila de remoção de imagens: {e}")
+
+
+def referenced_paths(db, storage) -> Dict[int, Set[str]]:
+    """
+    Caminhos de imagem referenciados por produto (``imagem`` + ``imagens``),
+    incluindo os produtos vendidos movidos para ``products_archive``.
+    URLs de documentos antigos são convertidas de volta para o caminho.
+    """
+    references: Dict[int, Set[str]] = {}
+    projection = {"_id": 0, "id": 1, "imagem": 1, "imagens": 1}
+    docs = chain(db["products"].find({}, projection), db["products_archive"].find({}, projection))
+    for doc in docs:
+        values = [doc.get("imagem")] + list((doc.get("imagens") or {}).values())
+        paths = set()
+        for value in values:
+            if not isinstance(value, str) or not value:
+                continue
+            path = value if is_storage_path(value) else storage._extract_path(value)
+            if path:
+                paths.add(path)
+        references.setdefault(doc.get("id"), set()).update(paths)
+    return references
+
+
+def collect_orphans(db, storage, dry_run: bool = True,
+                    grace: timedelta = DEFAULT_GC_GRACE) -> Dict[str, Any]:
+    """
+    Remove imagens que nenhum produto referencia.
+
+    Todos os prefixos ``product_<id>/`` são varridos, inclusive os de produtos
+    excluídos e os temporários antigos. Um objeto é mantido se qualquer produto
+    (ativo ou arquivado) o referencia em ``imagem``/``imagens``, mesmo sob o
+    prefixo de outro produto. Uploads avulsos ainda não salvos em um produto
+    e objetos mais novos que ``grace`` são mantidos pelo período de carência
+    (upload em andamento ou job de imagem pendente). Prefixos fora do padrão
+    ``product_<id>/`` não são gerados pelos backends e ficam de fora.
+
+    Args:
+        db: Banco MongoDB
+        storage: Backend de storage
+        dry_run: Apenas relata o que seria removido
+        grace: Idade mínima para um objeto ser considerado órfão
+
+    Returns:
+        Relatório com contagens e amostra dos caminhos órfãos
+    """
+    started = datetime.utcnow()
+    cutoff = started - grace
+    references = referenced_paths(db, storage)
+    referenced: Set[str] = set().union(*references.values()) if references else set()
+
+    orphans: List[str] = []
+    report: Dict[str, Any] = {
+        "dry_run": dry_run,
+        "started_at": started.isoformat(),
+        "prefixes_scanned": 0,
+        "prefixes_skipped": 0,
+        "objects_scanned": 0,
+        "skipped_recent": 0,
+        "orphan_prefixes": [],
+    }
+
+    for prefix in storage._list_prefixes():
+        product_id = _product_id_from_prefix(prefix)
+        if product_id is None:
+            report["prefixes_skipped"] += 1
+            continue
+        report["prefixes_scanned"] += 1
+
+        prefix_orphans = 0
+        for obj in storage._list_objects(prefix):
+            report["objects_scanned"] += 1
+            if obj["path"] in referenced:
+                continue
+            if obj.get("updated_at") is None or obj["updated_at"] > cutoff:
+                report["skipped_recent"] += 1
+                continue
+            orphans.append(obj["path"])
+            prefix_orphans += 1
+
+        if product_id not in references and prefix_orphans:
+            report["orphan_prefixes"].append(prefix)
+
+    report["orphan_count"] = len(orphans)
+    report["orphans"] = orphans[:REPORT_SAMPLE_SIZE]
+    report["deleted"] = 0
+
+    if not dry_run and orphans:
+        queue = DeletionQueue(storage, flush_interval=0)
+        queue.enqueue(orphans)
+        result = queue.flush()
+        report["deleted"] = result["deleted"]
+        report["failed"] = result["failed"] + queue.pending()
+
+    report["duration_ms"] = round((datetime.utcnow() - started).total_seconds() * 1000, 1)
+    return report
+
+
+def _product_id_from_prefix(prefix: str) -> Optional[int]:
+    name = prefix.rstrip("/")
+    if not name.startswith("product_"):
+        return None
+    suffix = name[len("product_"):]
+    return int(suffix) if suffix.isdigit() else None
+
+
+def _start_periodic_gc(app, interval: timedelta, dry_run: bool) -> threading.Thread:
+    """Roda o GC periodicamente em uma thread daemon."""
+    def loop():
+        while True:
+            time.sleep(interval.total_seconds())
+            if app.db is None:
+                continue
+            try:
+                report = collect_orphans(app.db, app.deletion_queue.storage, dry_run=dry_run)
+                logger.info(
+                    f"GC de imagens: {report['orphan_count']} órfãs, "
+                    f"{report['deleted']} removidas (dry_run={dry_run})"
+                )
+            except Exception as e:
+                logger.error(f"Erro no GC de imagens: {e}")
+
+    thread = threading.Thread(target=loop, name="storage-gc", daemon=True)
+    thread.start()
+    return thread
+
+
+def init_storage_maintenance(app) -> DeletionQueue:
+    """
+    Cria a fila de remoção (``app.deletion_queue``) e, se STORAGE_GC_INTERVAL_HOURS > 0,
+    agenda o GC periódico de imagens órfãs.
+    """
+    queue = DeletionQueue(
+        batch_size=int(os.getenv("STORAGE_DELETE_BATCH_SIZE", "100")),
+        flush_interval=float(os.getenv("STORAGE_DELETE_FLUSH_SECONDS", "5")),
+    )
+    app.deletion_queue = queue
+    # Em ambientes que encerram o processo (serverless), envia o que ficou pendente
+    atexit.register(queue.flush)
+
+    interval_hours = float(os.getenv("STORAGE_GC_INTERVAL_HOURS", "0"))
+    if interval_hours > 0:
+        dry_run = os.getenv("STORAGE_GC_DRY_RUN", "True").lower() == "true"
+        _start_periodic_gc(app, timedelta(hours=interval_hours), dry_run)
+    return queue
+
+
+def schedule_image_deletion(values: Iterable[str], app=None) -> int:
+    """
+    Agenda a remoção de imagens pela fila da aplicação.
+    Sem fila configurada, remove imediatamente em uma única chamada.
+    """
+    values = [v for v in values if v]
+    if not values:
+        return 0
+    if app is None:
+        from flask import current_app
+        app = current_app
+    queue = getattr(app, "deletion_queue", None)
+    if queue is not None:
+        return queue.enqueue(values)
+
+    from .storage import storage_service
+    storage_service.delete_image_set(values)
+    return len(values)
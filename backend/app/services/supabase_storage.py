@@ -1,34 +1,77 @@
 """
 Serviço para integração com Supabase Storage
 Gerencia upload, download e exclusão de imagens de produtos
+
+O cliente é criado sob demanda no primeiro uso; o teste de conectividade
+roda apenas no health check (com cache), nunca durante o import.
 """
 import os
-import uuid
-import mimetypes
-from io import BytesIO
-from typing import Optional, Tuple, List
-from PIL import Image
-from supabase import create_client, Client
-from supabase.client import ClientOptions
-from werkzeug.datastructures import FileStorage
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Any, Optional, Tuple, List, Dict
+
+from .storage_backend import StorageBackend
+
+# Tempo (segundos) que o resultado do teste de conectividade fica em cache
+HEALTH_CHECK_TTL = int(os.getenv("STORAGE_HEALTH_TTL", "60"))
+
+# Validade (segundos) das URLs assinadas geradas sob demanda (padrão: 1 dia)
+SIGNED_URL_EXPIRES = int(os.getenv("SIGNED_URL_EXPIRES", "86400"))
+
+# Tamanho da página ao listar objetos do bucket
+LIST_PAGE_SIZE = 1000
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Converte o timestamp ISO do Supabase em datetime UTC (sem timezone)."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class SupabaseStorageService(StorageBackend):
+    name = "supabase"
 
-class SupabaseStorageService:
     def __init__(self):
-        """Inicializa o cliente Supabase com tratamento de erros"""
+        """Lê a configuração; o cliente Supabase só é criado no primeiro uso"""
         self.supabase_url = os.getenv("SUPABASE_URL")
         self.supabase_key = os.getenv("SUPABASE_KEY") 
         self.bucket_name = os.getenv("SUPABASE_BUCKET", "product-images")
         
         # Estado da conexão
-        self.client: Optional[Client] = None
-        self.connection_error: Optional[str] = None
-        self.is_connected = False
+        super().__init__()
+        self._client = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
         
-        # Inicializa conexão
-        self._initialize_connection()
+        # Cache do teste de conectividade (health check)
+        self._probe: Optional[Dict[str, Any]] = None
+        self._probe_at = 0.0
+
+    @property
+    def client(self):
+        """Cliente Supabase, criado na primeira vez que é necessário."""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._initialize_connection()
+                    self._initialized = True
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+        self._initialized = True
         
     def _initialize_connection(self):
-        """Inicializa conexão com Supabase de forma segura"""
+        """Cria o cliente Supabase de forma segura (sem chamadas de rede)"""
         try:
             # Verifica se as variáveis de ambiente estão configuradas
             if not self.supabase_url or not self.supabase_key:
@@ -36,351 +79,237 @@ class SupabaseStorageService:
                 print(f"Erro de configuração Supabase: {self.connection_error}")
                 return
             
+            # SDK importado aqui: carregá-lo custa tempo de cold start
+            from supabase import create_client
+            from supabase.client import ClientOptions
+            
             # Tenta criar cliente
             options = ClientOptions(
                 auto_refresh_token=True,
                 persist_session=False
             )
             
-            self.client = create_client(
+            self._client = create_client(
                 supabase_url=self.supabase_url,
                 supabase_key=self.supabase_key,
                 options=options
             )
-            
-            # Testa conexão básica
-            self._test_connection()
+            self.is_connected = True
             
         except Exception as e:
             self.connection_error = f"Erro ao conectar com Supabase: {str(e)}"
             print(f"Aviso: {self.connection_error}")
             print("Verifique SUPABASE_URL, SUPABASE_KEY e conectividade de rede.")
             
-    def _test_connection(self):
+    def _test_connection(self) -> Dict[str, Any]:
         """Testa a conexão com Supabase fazendo uma operação simples"""
+        started = time.perf_counter()
+        status: Dict[str, Any] = {"reachable": False, "bucket_accessible": False}
         try:
             if not self.client:
-                raise Exception("Cliente Supabase não inicializado")
+                raise Exception(self.connection_error or "Cliente Supabase não inicializado")
                 
             # Testa conectividade tentando acessar diretamente o bucket
             try:
-                # Tenta fazer uma operação simples no bucket específico
-                result = self.client.storage.from_(self.bucket_name).list()
+                self.client.storage.from_(self.bucket_name).list()
                 
                 # Se chegou aqui, o bucket existe e está acessível
-                self.is_connected = True
-                print("Supabase Storage conectado com sucesso!")
-                print(f"Bucket '{self.bucket_name}' confirmado e acessível")
+                status.update(reachable=True, bucket_accessible=True)
                 
             except Exception as bucket_error:
                 # Se falhou, tenta listar buckets para diagnóstico
                 try:
                     buckets = self.client.storage.list_buckets()
                     if buckets and isinstance(buckets, list):
+                        status["reachable"] = True
                         bucket_names = [b.name if hasattr(b, 'name') else str(b) for b in buckets]
-                        print(f"Buckets disponíveis: {bucket_names}")
                         if self.bucket_name not in bucket_names:
-                            print(f"Aviso: Bucket '{self.bucket_name}' não encontrado. Verifique o nome no .env")
+                            status["diagnostic"] = f"Bucket '{self.bucket_name}' não encontrado. Verifique o nome no .env"
                         else:
-                            print(f"Bucket '{self.bucket_name}' existe mas pode ter problemas de acesso")
-                    else:
-                        print(f"Erro ao listar buckets: {buckets}")
+                            status["diagnostic"] = f"Bucket '{self.bucket_name}' existe mas pode ter problemas de acesso"
                 except Exception as list_error:
-                    print(f"Erro ao verificar buckets: {str(list_error)}")
+                    status["diagnostic"] = f"Erro ao verificar buckets: {str(list_error)}"
                 
                 # Mesmo com erro no bucket, mantém conexão se as credenciais estão válidas
-                self.is_connected = True
-                self.connection_error = f"Bucket '{self.bucket_name}' inacessível: {str(bucket_error)}"
-                print(f"Aviso: {self.connection_error}")
+                status["error"] = f"Bucket '{self.bucket_name}' inacessível: {str(bucket_error)}"
             
         except Exception as e:
-            self.is_connected = False
-            self.connection_error = f"Falha no teste de conexão: {str(e)}"
+            status["error"] = f"Falha no teste de conexão: {str(e)}"
+        
+        status["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if status.get("error"):
+            self.connection_error = status["error"]
             print(f"Aviso: {self.connection_error}")
+        return status
+
+    def check_connection(self, max_age: Optional[int] = None) -> dict:
+        """
+        Status da conexão com teste de conectividade em cache.
+
+        Args:
+            max_age: Idade máxima (segundos) do resultado em cache (padrão STORAGE_HEALTH_TTL)
+        """
+        max_age = HEALTH_CHECK_TTL if max_age is None else max_age
+        now = time.monotonic()
+        if self._probe is None or now - self._probe_at > max_age:
+            self._probe = self._test_connection()
+            self._probe_at = now
+        return {
+            **self.get_connection_status(),
+            "probe": self._probe,
+            "probe_age_seconds": round(now - self._probe_at, 1),
+        }
             
     def is_available(self) -> bool:
         """Verifica se o serviço Supabase está disponível"""
-        return self.is_connected and self.client is not None
+        return self.client is not None and self.is_connected
         
     def get_connection_status(self) -> dict:
-        """Retorna status da conexão para health check"""
+        """Retorna status da conexão para health check (sem chamadas de rede)"""
         return {
             "status": "UP" if self.is_connected else "DOWN",
+            "backend": self.name,
+            "initialized": self._initialized,
             "error": self.connection_error,
             "bucket": self.bucket_name if self.is_connected else None
         }
         
-    def _generate_filename(self, original_filename: str) -> str:
-        """Gera nome único para o arquivo"""
-        # Extrai extensão do arquivo original
-        _, ext = os.path.splitext(original_filename)
-        if not ext:
-            ext = '.jpg'  # Default para JPG se não tiver extensão
-            
-        # Gera UUID único + extensão
-        unique_filename = f"{uuid.uuid4().hex}{ext.lower()}"
-        return unique_filename
-        
-    def _validate_image(self, file: FileStorage) -> bool:
-        """Valida se o arquivo é uma imagem válida"""
-        if not file.content_type:
-            return False
-            
-        # Tipos MIME permitidos
-        allowed_types = [
-            'image/jpeg', 'image/jpg', 'image/png', 
-            'image/webp', 'image/gif'
-        ]
-        
-        return file.content_type in allowed_types
-        
-    def _resize_image(self, file: FileStorage, max_width: int = 1200, max_height: int = 1200) -> BytesIO:
-        """Redimensiona imagem para otimizar armazenamento"""
+    def _upload_bytes(self, path: str, data: bytes, mime_type: str) -> Tuple[bool, str]:
+        """Envia bytes para o bucket, tentando reautenticar em caso de erro de RLS."""
         try:
-            # Abre a imagem
-            image = Image.open(file.stream)
-            
-            # Calcula novo tamanho mantendo proporção
-            image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-            
-            # Converte para RGB se necessário (para JPEG)
-            if image.mode in ('RGBA', 'LA', 'P'):
-                rgb_image = Image.new('RGB', image.size, (255, 255, 255))
-                rgb_image.paste(image, mask=image.split()[-1] if 'A' in image.mode else None)
-                image = rgb_image
-            
-            # Salva em BytesIO
-            output = BytesIO()
-            format = 'JPEG' if file.content_type == 'image/jpeg' else 'PNG'
-            quality = 85 if format == 'JPEG' else None
-            
-            save_kwargs = {'format': format}
-            if quality:
-                save_kwargs['quality'] = quality
-                save_kwargs['optimize'] = True
-                
-            image.save(output, **save_kwargs)
-            output.seek(0)
-            
-            return output
-            
+            result = self.client.storage.from_(self.bucket_name).upload(
+                path=path,
+                file=data,
+                file_options={"content-type": mime_type}
+            )
+
+            if hasattr(result, 'error') and result.error:
+                error_msg = result.error.message if hasattr(result.error, 'message') else str(result.error)
+                if 'violates row-level security policy' in str(error_msg).lower():
+                    # Tenta obter novo token e repetir upload
+                    self.client.auth.sign_in_with_password({
+                        'email': os.getenv('SUPABASE_SERVICE_ROLE_EMAIL'),
+                        'password': os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+                    })
+                    # Tenta upload novamente
+                    result = self.client.storage.from_(self.bucket_name).upload(
+                        path=path,
+                        file=data,
+                        file_options={"content-type": mime_type}
+                    )
+                    if hasattr(result, 'error') and result.error:
+                        return False, f"Erro de autorização persistente: {error_msg}"
+                else:
+                    return False, f"Erro no upload: {error_msg}"
         except Exception as e:
-            # Se falhar o redimensionamento, retorna original
-            file.stream.seek(0)
-            return BytesIO(file.stream.read())
-    
-    def upload_image(self, file: FileStorage, product_id: Optional[int] = None) -> Tuple[bool, str]:
+            if 'unauthorized' in str(e).lower() or 'permission' in str(e).lower():
+                return False, f"Erro de autorização: Verifique as permissões do bucket"
+            return False, f"Erro interno no upload: {str(e)}"
+
+        return True, path
+
+    def _public_url(self, path: str) -> str:
+        """URL pública (sem token) de um objeto do bucket."""
+        # Gera URL pública usando o método do SDK
+        result = self.client.storage.from_(self.bucket_name).get_public_url(path)
+        if not result or not isinstance(result, str):
+            # Fallback: construir URL manualmente
+            public_url = f"{self.supabase_url}/storage/v1/object/public/{self.bucket_name}/{path}"
+        else:
+            public_url = result
+
+        # Garante que a URL é absoluta
+        if not public_url.startswith('http'):
+            public_url = f"{self.supabase_url}{public_url}"
+        return public_url
+
+    def sign_urls(self, paths: List[str]) -> Dict[str, str]:
         """
-        Faz upload de uma imagem para o Supabase Storage
-        
-        Args:
-            file: Arquivo de imagem enviado
-            product_id: ID do produto (opcional, para organização)
-            
-        Returns:
-            Tuple[bool, str]: (sucesso, url_publica_ou_mensagem_erro)
+        Assina vários objetos em uma única chamada (create_signed_urls).
+        Objetos que não puderam ser assinados recebem a URL pública.
         """
-        # Verifica se o serviço está disponível
-        if not self.is_available():
-            return False, f"Serviço de storage indisponível: {self.connection_error or 'Conexão não estabelecida'}"
-            
+        if not paths:
+            return {}
+
+        urls: Dict[str, str] = {}
         try:
-            # Valida se é uma imagem
-            if not self._validate_image(file):
-                return False, "Arquivo deve ser uma imagem válida (JPEG, PNG, WebP, GIF)"
-            
-            # Gera nome único
-            filename = self._generate_filename(file.filename)
-            
-            # Adiciona prefixo do produto se fornecido
-            if product_id:
-                filename = f"product_{product_id}/{filename}"
-            
-            # Redimensiona imagem
-            resized_image = self._resize_image(file)
-            
-            # Detecta tipo MIME
-            mime_type = mimetypes.guess_type(filename)[0] or 'image/jpeg'
-            
-            # Upload para Supabase com tratamento de erro melhorado
-            try:
-                result = self.client.storage.from_(self.bucket_name).upload(
-                    path=filename,
-                    file=resized_image.getvalue(),
-                    file_options={"content-type": mime_type}
-                )
-                
-                if hasattr(result, 'error') and result.error:
-                    error_msg = result.error.message if hasattr(result.error, 'message') else str(result.error)
-                    if 'violates row-level security policy' in str(error_msg).lower():
-                        # Tenta obter novo token e repetir upload
-                        self.client.auth.sign_in_with_password({
-                            'email': os.getenv('SUPABASE_SERVICE_ROLE_EMAIL'),
-                            'password': os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-                        })
-                        # Tenta upload novamente
-                        result = self.client.storage.from_(self.bucket_name).upload(
-                            path=filename,
-                            file=resized_image.getvalue(),
-                            file_options={"content-type": mime_type}
-                        )
-                        if hasattr(result, 'error') and result.error:
-                            return False, f"Erro de autorização persistente: {error_msg}"
-                    else:
-                        return False, f"Erro no upload: {error_msg}"
-            except Exception as e:
-                if 'unauthorized' in str(e).lower() or 'permission' in str(e).lower():
-                    return False, f"Erro de autorização: Verifique as permissões do bucket"
-                return False, f"Erro interno no upload: {str(e)}"
-            
-            # Gera URL pública com token de download
-            try:
-                # Gera URL pública usando o método do SDK
-                result = self.client.storage.from_(self.bucket_name).get_public_url(filename)
-                if not result or not isinstance(result, str):
-                    # Fallback: construir URL manualmente
-                    public_url = f"{self.supabase_url}/storage/v1/object/public/{self.bucket_name}/{filename}"
-                else:
-                    public_url = result
-                
-                # Garante que a URL é absoluta
-                if not public_url.startswith('http'):
-                    public_url = f"{self.supabase_url}{public_url}"
-                
-                # Adiciona token de download
-                download_token = self.client.storage.from_(self.bucket_name).create_signed_url(
-                    path=filename,
-                    expires_in=31536000  # 1 ano em segundos
-                )
-                
-                if download_token and isinstance(download_token, dict) and 'signedURL' in download_token:
-                    return True, download_token['signedURL']
-                
-                return True, public_url
-            except Exception as e:
-                return False, f"Erro ao gerar URL pública: {str(e)}"
-            
+            result = self.client.storage.from_(self.bucket_name).create_signed_urls(
+                list(paths), SIGNED_URL_EXPIRES
+            )
+            for item in result or []:
+                signed = item.get("signedURL") or item.get("signedUrl")
+                if item.get("path") and signed and not item.get("error"):
+                    urls[item["path"]] = signed
         except Exception as e:
-            return False, f"Erro interno no upload: {str(e)}"
-    
-    def delete_image(self, image_url: str) -> Tuple[bool, str]:
+            print(f"Aviso: erro ao assinar URLs em lote: {str(e)}")
+
+        for path in paths:
+            if path not in urls:
+                urls[path] = self._public_url(path)
+        return urls
+
+    def _extract_path(self, image_url: str) -> Optional[str]:
         """
-        Deleta uma imagem do Supabase Storage
-        
-        Args:
-            image_url: URL pública da imagem
-            
-        Returns:
-            Tuple[bool, str]: (sucesso, mensagem)
+        Extrai o caminho do objeto a partir de uma URL pública ou assinada.
+
+        Exemplos aceitos:
+            https://project.supabase.co/storage/v1/object/public/bucket/path
+            https://project.supabase.co/storage/v1/object/sign/bucket/path?token=...
         """
-        # Verifica se o serviço está disponível
-        if not self.is_available():
-            return False, f"Serviço de storage indisponível: {self.connection_error or 'Conexão não estabelecida'}"
-            
-        try:
-            # Extrai o path da URL
-            # Exemplo: https://project.supabase.co/storage/v1/object/public/bucket/path
-            # Queremos apenas o 'path'
-            if '/object/public/' in image_url:
-                path = image_url.split('/object/public/')[1]
+        for marker in ('/object/public/', '/object/sign/'):
+            if marker in image_url:
+                path = image_url.split(marker, 1)[1].split('?', 1)[0]
                 # Remove bucket name do início se estiver presente
                 if path.startswith(f"{self.bucket_name}/"):
                     path = path[len(self.bucket_name)+1:]
-            else:
-                return False, "URL de imagem inválida"
-            
-            # Deleta do Supabase
-            result = self.client.storage.from_(self.bucket_name).remove([path])
-            
+                return path
+        return None
+
+    def _remove_paths(self, paths: List[str]) -> Tuple[bool, str]:
+        """Remove vários objetos do bucket em uma única chamada."""
+        try:
+            result = self.client.storage.from_(self.bucket_name).remove(paths)
             if hasattr(result, 'error') and result.error:
                 return False, f"Erro ao deletar: {result.error.message}"
-            
-            return True, "Imagem deletada com sucesso"
-            
+            return True, "Imagens deletadas com sucesso"
         except Exception as e:
             return False, f"Erro interno ao deletar: {str(e)}"
-    
-    def list_product_images(self, product_id: int) -> Tuple[bool, List[str]]:
-        """
-        Lista todas as imagens de um produto
-        
-        Args:
-            product_id: ID do produto
-            
-        Returns:
-            Tuple[bool, List[str]]: (sucesso, lista_de_urls)
-        """
-        # Verifica se o serviço está disponível
-        if not self.is_available():
-            return False, []
-            
-        try:
-            path_prefix = f"product_{product_id}/"
-            
-            # Lista arquivos no diretório do produto
-            result = self.client.storage.from_(self.bucket_name).list(path_prefix)
-            
-            if hasattr(result, 'error') and result.error:
-                return False, []
-            
-            # Gera URLs públicas
-            image_urls = []
-            for file_info in result:
-                filename = file_info['name']
-                public_url = self.client.storage.from_(self.bucket_name).get_public_url(f"{path_prefix}{filename}")
-                image_urls.append(public_url)
-            
-            return True, image_urls
-            
-        except Exception as e:
-            return False, []
-    
-    def get_image_info(self, image_url: str) -> dict:
-        """
-        Obtém informações sobre uma imagem
-        
-        Args:
-            image_url: URL pública da imagem
-            
-        Returns:
-            dict: Informações da imagem
-        """
-        # Verifica se o serviço está disponível
-        if not self.is_available():
-            return {"error": f"Serviço de storage indisponível: {self.connection_error or 'Conexão não estabelecida'}"}
-            
-        try:
-            # Extrai path da URL
-            if '/object/public/' in image_url:
-                path = image_url.split('/object/public/')[1]
-                if path.startswith(f"{self.bucket_name}/"):
-                    path = path[len(self.bucket_name)+1:]
-            else:
-                return {"error": "URL inválida"}
-            
-            # Busca informações do arquivo
-            result = self.client.storage.from_(self.bucket_name).get_file_info(path)
-            
+
+    def _list_entries(self, prefix: str) -> List[Dict[str, Any]]:
+        """Lista todas as entradas de um prefixo do bucket, paginando de LIST_PAGE_SIZE em LIST_PAGE_SIZE."""
+        entries: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            result = self.client.storage.from_(self.bucket_name).list(
+                prefix, {"limit": LIST_PAGE_SIZE, "offset": offset}
+            )
             if hasattr(result, 'error') and result.error:
-                return {"error": result.error.message}
-            
-            return {
-                "size": result.get("ContentLength", 0),
-                "content_type": result.get("ContentType", ""),
-                "last_modified": result.get("LastModified", ""),
-                "url": image_url
-            }
-            
-        except Exception as e:
-            return {"error": str(e)}
+                raise Exception(result.error.message)
+            entries.extend(result or [])
+            if not result or len(result) < LIST_PAGE_SIZE:
+                return entries
+            offset += LIST_PAGE_SIZE
+
+    def _list_objects(self, prefix: str) -> List[Dict[str, Any]]:
+        """Lista os objetos de um prefixo do bucket."""
+        return [
+            {"path": f"{prefix}{entry['name']}", "updated_at": _parse_timestamp(entry.get("updated_at"))}
+            for entry in self._list_entries(prefix)
+            # Entradas sem id são "pastas"
+            if entry.get("id")
+        ]
 
-# Instância global do serviço
-# Inicializada de forma segura - não falha se Supabase estiver indisponível
-try:
-    storage_service = SupabaseStorageService()
-except Exception as e:
-    print(f"Erro crítico ao inicializar SupabaseStorageService: {e}")
-    # Cria instância com estado de erro para evitar falhas na aplicação
-    storage_service = SupabaseStorageService()
-    storage_service.is_connected = False
-    storage_service.connection_error = f"Falha na inicialização: {str(e)}"
+    def _list_prefixes(self) -> List[str]:
+        """Lista as "pastas" de primeiro nível do bucket."""
+        return [f"{entry['name']}/" for entry in self._list_entries("") if not entry.get("id")]
+
+    def _file_info(self, path: str) -> Dict[str, Any]:
+        """Metadados de um objeto do bucket."""
+        result = self.client.storage.from_(self.bucket_name).get_file_info(path)
+        if hasattr(result, 'error') and result.error:
+            raise Exception(result.error.message)
+        return {
+            "size": result.get("ContentLength", 0),
+            "content_type": result.get("ContentType", ""),
+            "last_modified": result.get("LastModified", ""),
+        }
@@ -0,0 +1,238 @@
+"""
+Revogação de tokens JWT.
+
+Revogações ficam na coleção ``revoked_tokens`` (expiram por TTL junto com o
+token) e cada processo mantém um bloom filter com as chaves revogadas,
+recarregado a cada ``refresh_interval`` segundos. O caso comum (token não
+revogado) é respondido só pelo bloom filter, sem I/O; um positivo é
+confirmado na cópia local ou, se necessário, no banco. Revogações feitas por
+outro processo passam a valer aqui na próxima recarga.
+
+Dois tipos de revogação:
+- ``jti:<jti>``: um token específico (logout);
+- ``user:<id>``: todos os tokens do usuário emitidos antes de ``revoked_before``
+  (troca/redefinição de senha, exclusão de conta).
+"""
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Set
+
+from pymongo import ASCENDING
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "revoked_tokens"
+
+
+class BloomFilter:
+    """Bloom filter simples (bits em ``bytearray``, hashing duplo com sha256)."""
+
+    def __init__(self, capacity: int = 10000, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenRevocationList:
+    """
+    Lista de revogação consultada a cada requisição autenticada.
+
+    Args:
+        db: Banco MongoDB (None mantém as revogações só em memória)
+        refresh_interval: Segundos entre recargas do bloom filter
+        capacity: Capacidade mínima do bloom filter
+    """
+
+    def __init__(self, db=None, refresh_interval: float = 30.0, capacity: int = 10000):
+        self.collection = db[COLLECTION_NAME] if db is not None else None
+        self.refresh_interval = refresh_interval
+        self.capacity = capacity
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Falsos positivos já confirmados no banco (limpos a cada recarga)
+        self._not_revoked: Set[str] = set()
+        self._bloom = BloomFilter(capacity)
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.stats = {"checks": 0, "bloom_positives": 0, "db_lookups": 0, "refreshes": 0}
+
+        if self.collection is not None:
+            try:
+                self.collection.create_index(
+                    [("expires_at", ASCENDING)], expireAfterSeconds=0, name="ttl_expires_at"
+                )
+            except Exception as e:
+                logger.warning(f"Erro ao criar índices de {COLLECTION_NAME}: {e}")
+
+    def revoke_token(self, jti: Optional[str], user_id: Any, expires_at: datetime) -> bool:
+        """Revoga um token específico até a sua expiração."""
+        if not jti:
+            return False
+        self._store(f"jti:{jti}", {"kind": "token", "user_id": user_id, "expires_at": expires_at})
+        return True
+
+    def revoke_user(self, user_id: Any, lifetime: timedelta) -> None:
+        """
+        Revoga todos os tokens do usuário emitidos até agora.
+
+        Args:
+            user_id: ID do usuário
+            lifetime: Validade máxima dos tokens (o registro expira depois disso)
+        """
+        now = datetime.utcnow()
+        self._store(f"user:{user_id}", {
+            "kind": "user",
+            "user_id": user_id,
+            # Tokens emitidos neste mesmo segundo (ex.: novos tokens após trocar a senha) continuam válidos
+            "revoked_before": int(time.time()),
+            "expires_at": now + lifetime,
+        })
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        """Verifica se o token (claims já validados) foi revogado."""
+        self._maybe_refresh()
+        self.stats["checks"] += 1
+
+        jti = claims.get("jti")
+        if jti and self._lookup(f"jti:{jti}") is not None:
+            return True
+
+        entry = self._lookup(f"user:{claims.get('sub')}")
+        if entry is not None:
+            return int(claims.get("iat", 0)) < int(entry.get("revoked_before", 0))
+        return False
+
+    def refresh(self) -> int:
+        """Recarrega as revogações ativas do banco e reconstrói o bloom filter."""
+        if self.collection is None:
+            self._loaded_at = time.monotonic()
+            return len(self._entries)
+
+        entries = {
+            doc["_id"]: doc
+            for doc in self.collection.find({"expires_at": {"$gt": datetime.utcnow()}})
+        }
+        self._rebuild(entries)
+        self.stats["refreshes"] += 1
+        return len(entries)
+
+    def _rebuild(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        bloom = BloomFilter(max(self.capacity, 2 * len(entries)))
+        for key in entries:
+            bloom.add(key)
+        with self._lock:
+            self._entries = entries
+            self._not_revoked = set()
+            self._bloom = bloom
+            self._loaded_at = time.monotonic()
+
+    def _maybe_refresh(self) -> None:
+        if time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        # Só uma requisição recarrega; as demais seguem com o filtro atual
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning(f"Erro ao recarregar tokens revogados: {e}")
+            self._loaded_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key not in self._bloom or key in self._not_revoked:
+                return None
+            entry = self._entries.get(key)
+        self.stats["bloom_positives"] += 1
+        if entry is not None:
+            return entry if entry["expires_at"] > datetime.utcnow() else None
+        if self.collection is None:
+            return None
+
+        # Falso positivo ou revogado por outro processo após a última recarga
+        self.stats["db_lookups"] += 1
+        try:
+            entry = self.collection.find_one({"_id": key})
+        except Exception as e:
+            logger.warning(f"Erro ao consultar token revogado: {e}")
+            return None
+        with self._lock:
+            if entry is not None:
+                self._entries[key] = entry
+            else:
+                self._not_revoked.add(key)
+        return entry
+
+    def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        entry = {"_id": key, "revoked_at": datetime.utcnow(), **entry}
+        if self.collection is not None:
+            fields = {k: v for k, v in entry.items() if k != "_id"}
+            self.collection.update_one({"_id": key}, {"$set": fields}, upsert=True)
+        with self._lock:
+            self._entries[key] = entry
+            self._not_revoked.discard(key)
+            self._bloom.add(key)
+
+
+def init_token_revocation(app) -> TokenRevocationList:
+    """Cria a lista de revogação da aplicação (``app.token_revocation``)."""
+    revocation = TokenRevocationList(
+        app.db,
+        refresh_interval=float(os.getenv("TOKEN_REVOCATION_REFRESH_SECONDS", "30")),
+        capacity=int(os.getenv("TOKEN_REVOCATION_BLOOM_CAPACITY", "10000")),
+    )
+    try:
+        revocation.refresh()
+    except Exception as e:
+        logger.warning(f"Erro ao carregar tokens revogados: {e}")
+    app.token_revocation = revocation
+    return revocation
+
+
+def revoke_tokens(claims: Iterable[Dict[str, Any]], app=None) -> int:
+    """Revoga tokens específicos (ex.: access e refresh token no logout)."""
+    if app is None:
+        from flask import current_app
+        app = current_app
+    revocation = getattr(app, "token_revocation", None)
+    if revocation is None:
+        return 0
+
+    revoked = 0
+    for item in claims:
+        expires_at = datetime.fromtimestamp(int(item.get("exp", 0)), tz=timezone.utc).replace(tzinfo=None)
+        if revocation.revoke_token(item.get("jti"), item.get("sub"), expires_at):
+            revoked += 1
+    return revoked
+
+
+def revoke_user_tokens(user_id: Any, app=None) -> None:
+    """Revoga todos os tokens já emitidos para o usuário."""
+    from .jwt_service import JWT_REFRESH_TOKEN_EXPIRES
+    if app is None:
+        from flask import current_app
+        app = current_app
+    revocation = getattr(app, "token_revocation", None)
+    if revocation is not None:
+        revocation.revoke_user(user_id, JWT_REFRESH_TOKEN_EXPIRES)
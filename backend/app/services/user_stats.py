@@ -0,0 +1,135 @@
+"""
+Resumo materializado de usuários.
+
+Um único documento na coleção ``user_stats`` guarda quantos usuários
+existem por tipo e estado (ativo/inativo). Os controllers aplicam ``$inc``
+a cada criação, alteração, desativação, confirmação de email e exclusão, de
+modo que o resumo é uma leitura O(1). Uma reconciliação periódica recalcula
+os números a partir da coleção ``users`` e corrige qualquer divergência
+(ex.: escritas concorrentes ou alterações feitas fora da API).
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from ..models.user_model import USER_TYPES, get_collection
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "user_stats"
+SUMMARY_ID = "users"
+STATES = ("ativos", "inativos")
+
+
+def _key(tipo: Any, ativo: Any) -> str:
+    return f"{'ativos' if ativo else 'inativos'}:{tipo}"
+
+
+def record_user_change(db, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+    """
+    Atualiza os contadores após uma alteração de usuário.
+
+    Args:
+        db: Banco MongoDB
+        before: Usuário antes da alteração (None = criado)
+        after: Usuário depois da alteração (None = excluído)
+    """
+    deltas: Dict[str, int] = {}
+    if before:
+        key = _key(before.get("tipo"), before.get("ativo"))
+        deltas[key] = deltas.get(key, 0) - 1
+    if after:
+        key = _key(after.get("tipo"), after.get("ativo"))
+        deltas[key] = deltas.get(key, 0) + 1
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    try:
+        db[COLLECTION_NAME].update_one(
+            {"_id": SUMMARY_ID},
+            {"$inc": deltas, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    except Exception as e:
+        # O resumo é derivado: a próxima reconciliação corrige
+        logger.warning(f"Erro ao atualizar resumo de usuários: {e}")
+
+
+def reconcile_user_stats(db) -> Dict[str, Any]:
+    """
+    Recalcula os contadores a partir da coleção de usuários.
+
+    Returns:
+        Dicionário com os contadores recalculados e a divergência corrigida
+    """
+    counts = {_key(tipo, ativo): 0 for tipo in USER_TYPES for ativo in (True, False)}
+    pipeline = [{"$group": {"_id": {"tipo": "$tipo", "ativo": "$ativo"}, "count": {"$sum": 1}}}]
+    for item in get_collection(db).aggregate(pipeline):
+        key = _key(item["_id"].get("tipo"), item["_id"].get("ativo"))
+        counts[key] = counts.get(key, 0) + item["count"]
+
+    stats = db[COLLECTION_NAME]
+    previous = stats.find_one({"_id": SUMMARY_ID}) or {}
+    drift = {k: v - previous.get(k, 0) for k, v in counts.items() if v != previous.get(k, 0)}
+
+    now = datetime.utcnow()
+    stats.update_one(
+        {"_id": SUMMARY_ID},
+        {"$set": {**counts, "updated_at": now, "reconciled_at": now}},
+        upsert=True,
+    )
+    if drift and previous:
+        logger.info(f"Resumo de usuários corrigido: {drift}")
+    return {"counts": counts, "drift": drift, "reconciled_at": now}
+
+
+def get_user_stats(db) -> Dict[str, Any]:
+    """
+    Lê o resumo materializado (reconcilia na primeira vez).
+
+    Returns:
+        Dicionário com ``ativos`` e ``inativos`` por tipo, ``updated_at`` e ``reconciled_at``
+    """
+    doc = db[COLLECTION_NAME].find_one({"_id": SUMMARY_ID})
+    if doc is None or "reconciled_at" not in doc:
+        reconcile_user_stats(db)
+        doc = db[COLLECTION_NAME].find_one({"_id": SUMMARY_ID}) or {}
+
+    summary = {state: {tipo: 0 for tipo in USER_TYPES} for state in STATES}
+    for key, value in doc.items():
+        state, _, tipo = key.partition(":")
+        if state in summary and tipo:
+            summary[state][tipo] = max(int(value), 0)
+
+    summary["updated_at"] = doc.get("updated_at")
+    summary["reconciled_at"] = doc.get("reconciled_at")
+    return summary
+
+
+def _start_periodic_reconcile(app, interval: timedelta) -> threading.Thread:
+    """Reconcilia o resumo periodicamente em uma thread daemon."""
+    def loop():
+        while True:
+            time.sleep(interval.total_seconds())
+            if app.db is None:
+                continue
+            try:
+                reconcile_user_stats(app.db)
+            except Exception as e:
+                logger.error(f"Erro ao reconciliar resumo de usuários: {e}")
+
+    thread = threading.Thread(target=loop, name="user-stats-reconcile", daemon=True)
+    thread.start()
+    return thread
+
+
+def init_user_stats(app) -> Optional[threading.Thread]:
+    """Agenda a reconciliação periódica (USER_STATS_RECONCILE_MINUTES, 0 desativa)."""
+    interval_minutes = float(os.getenv("USER_STATS_RECONCILE_MINUTES", "60"))
+    if app.db is None or interval_minutes <= 0:
+        return None
+    return _start_periodic_reconcile(app, timedelta(minutes=interval_minutes))
@@ -4,6 +4,17 @@ from .cache import (
     invalidate_categories_cache,
     get_cached_value,
     set_cached_value,
+    product_exists,
+    add_cached_product_id,
+    discard_cached_product_id,
+    get_cached_search,
+    set_cached_search,
+    invalidate_search_cache,
+    invalidate_search_cache_by_sort,
+    get_cached_image_urls,
+    set_cached_image_urls,
+    get_cached_token_claims,
+    set_cached_token_claims,
     clear_all_caches,
     CacheStats,
 )
@@ -13,6 +24,17 @@ __all__ = [
     "invalidate_categories_cache",
     "get_cached_value",
     "set_cached_value",
+    "product_exists",
+    "add_cached_product_id",
+    "discard_cached_product_id",
+    "get_cached_search",
+    "set_cached_search",
+    "invalidate_search_cache",
+    "invalidate_search_cache_by_sort",
+    "get_cached_image_urls",
+    "set_cached_image_urls",
+    "get_cached_token_claims",
+    "set_cached_token_claims",
     "clear_all_caches",
     "CacheStats",
 ]
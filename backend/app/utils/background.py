@@ -0,0 +1,24 @@
+"""
+Utilitários para trabalho em segundo plano.
+Backoff exponencial para novas tentativas de jobs.
+"""
+import random
+
+
+def backoff_delay(attempt: int, base: float = 2.0, cap: float = 300.0) -> float:
+    """
+    Calcula o atraso antes da próxima tentativa (backoff exponencial com jitter).
+
+    Args:
+        attempt: Número da tentativa que falhou (1 = primeira)
+        base: Atraso base em segundos
+        cap: Atraso máximo em segundos
+
+    Returns:
+        Atraso em segundos
+    """
+    if base <= 0:
+        return 0.0
+    delay = min(cap, base * (2 ** max(attempt - 1, 0)))
+    # Jitter de até 20% evita que várias falhas tentem de novo ao mesmo tempo
+    return delay * random.uniform(0.8, 1.0)
@@ -2,9 +2,10 @@
 Utilitários de cache para a aplicação.
 Implementa cache em memória com TTL para dados frequentemente acessados.
 """
-from cachetools import TTLCache
+from cachetools import TTLCache, TLRUCache
 from threading import Lock
-from typing import Any, Optional, Set
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import os
 import time
 
 # Cache de categorias ativas (TTL de 5 minutos)
@@ -15,6 +16,40 @@ _categories_lock = Lock()
 _config_cache: TTLCache = TTLCache(maxsize=100, ttl=600)
 _config_lock = Lock()
 
+# Cache dos IDs de produtos existentes (checagem de existência sem consulta)
+_product_ids_cache: TTLCache = TTLCache(maxsize=1, ttl=int(os.getenv("PRODUCT_IDS_CACHE_TTL", "300")))
+_product_ids_lock = Lock()
+
+# Cache de resultados da busca de produtos (consulta normalizada -> resultado)
+# Limpo a cada escrita em produtos; o TTL limita a defasagem entre processos
+_search_cache: TTLCache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "512")),
+    ttl=int(os.getenv("SEARCH_CACHE_TTL", "60")),
+)
+_search_lock = Lock()
+
+# Cache de URLs de imagens (caminho no storage -> URL assinada)
+# O TTL deve ficar abaixo da validade das URLs (SIGNED_URL_EXPIRES)
+_image_urls_cache: TTLCache = TTLCache(
+    maxsize=int(os.getenv("SIGNED_URL_CACHE_SIZE", "5000")),
+    ttl=int(os.getenv("SIGNED_URL_CACHE_TTL", "43200")),
+)
+_image_urls_lock = Lock()
+
+
+def _token_claims_expiration(_key, claims: Dict[str, Any], now: float) -> float:
+    """Entradas do cache de tokens expiram junto com o token (claim 'exp')."""
+    return float(claims.get("exp", now))
+
+
+# Cache de claims JWT já verificados (sha256 do token -> claims), em LRU limitado
+_token_claims_cache: TLRUCache = TLRUCache(
+    maxsize=int(os.getenv("JWT_CLAIMS_CACHE_SIZE", "10000")),
+    ttu=_token_claims_expiration,
+    timer=time.time,
+)
+_token_claims_lock = Lock()
+
 
 def get_cached_categories(db) -> Set[str]:
     """
@@ -53,6 +88,92 @@ def invalidate_categories_cache():
         _categories_cache.clear()
 
 
+def _load_product_ids(db) -> Set[int]:
+    cache_key = "product_ids"
+    with _product_ids_lock:
+        if cache_key in _product_ids_cache:
+            return _product_ids_cache[cache_key]
+        
+        from ..models.product_model import get_collection as get_products_collection
+        ids = {doc["id"] for doc in get_products_collection(db).find({}, {"_id": 0, "id": 1}) if "id" in doc}
+        _product_ids_cache[cache_key] = ids
+        return ids
+
+
+def product_exists(db, product_id: int) -> bool:
+    """
+    Verifica se o produto existe usando o conjunto de IDs em cache.
+    IDs ausentes do cache (ex.: produto recém-criado em outro processo)
+    são confirmados no banco e adicionados ao conjunto.
+    
+    Args:
+        db: Instância do banco de dados MongoDB
+        product_id: ID do produto
+        
+    Returns:
+        True se o produto existe
+    """
+    if db is None:
+        return False
+    
+    try:
+        if product_id in _load_product_ids(db):
+            return True
+        
+        from ..models.product_model import get_collection as get_products_collection
+        if get_products_collection(db).find_one({"id": product_id}) is None:
+            return False
+    except Exception as e:
+        print(f"Erro ao verificar produto {product_id}: {e}")
+        return False
+    
+    add_cached_product_id(product_id)
+    return True
+
+
+def add_cached_product_id(product_id: int):
+    """Adiciona um produto ao conjunto em cache (chamar após criar produto)."""
+    with _product_ids_lock:
+        ids = _product_ids_cache.get("product_ids")
+        if ids is not None:
+            ids.add(product_id)
+
+
+def discard_cached_product_id(product_id: int):
+    """Remove um produto do conjunto em cache (chamar após excluir produto)."""
+    with _product_ids_lock:
+        ids = _product_ids_cache.get("product_ids")
+        if ids is not None:
+            ids.discard(product_id)
+
+
+def get_cached_search(key: str) -> Optional[Dict[str, Any]]:
+    """Resultado em cache de uma busca de produtos (None se ausente)."""
+    with _search_lock:
+        return _search_cache.get(key)
+
+
+def set_cached_search(key: str, result: Dict[str, Any]):
+    """Armazena o resultado de uma busca de produtos."""
+    with _search_lock:
+        _search_cache[key] = result
+
+
+def invalidate_search_cache():
+    """Invalida as buscas em cache (chamar após criar/editar/deletar produto)."""
+    with _search_lock:
+        _search_cache.clear()
+
+
+def invalidate_search_cache_by_sort(sort: str):
+    """Invalida só as buscas com a ordenação dada (ex.: ``popular`` após mudar favorite_count)."""
+    with _search_lock:
+        stale = [key for key, result in _search_cache.items()
+                 if result.get("params", {}).get("sort") == sort]
+        for key in stale:
+            _search_cache.pop(key, None)
+
+
 def get_cached_value(key: str, default: Any = None) -> Any:
     """Obtém valor do cache de configurações."""
     with _config_lock:
@@ -72,12 +193,64 @@ def set_cached_value(key: str, value: Any, ttl: Optional[int] = None):
         _config_cache[key] = value
 
 
+def get_cached_image_urls(paths: Iterable[str]) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Busca URLs de imagens no cache.
+    
+    Args:
+        paths: Caminhos dos objetos no storage
+        
+    Returns:
+        Tupla (urls encontradas, caminhos ausentes do cache)
+    """
+    found: Dict[str, str] = {}
+    missing: List[str] = []
+    with _image_urls_lock:
+        for path in paths:
+            url = _image_urls_cache.get(path)
+            if url is None:
+                missing.append(path)
+            else:
+                found[path] = url
+    return found, missing
+
+
+def set_cached_image_urls(urls: Dict[str, str]):
+    """Armazena URLs de imagens geradas pelo storage."""
+    with _image_urls_lock:
+        for path, url in urls.items():
+            _image_urls_cache[path] = url
+
+
+def get_cached_token_claims(digest: str) -> Optional[Dict[str, Any]]:
+    """Claims de um token já verificado (None se ausente ou expirado)."""
+    with _token_claims_lock:
+        claims = _token_claims_cache.get(digest)
+    return dict(claims) if claims is not None else None
+
+
+def set_cached_token_claims(digest: str, claims: Dict[str, Any]):
+    """Armazena os claims de um token verificado até o seu 'exp'."""
+    if "exp" not in claims:
+        return
+    with _token_claims_lock:
+        _token_claims_cache[digest] = dict(claims)
+
+
 def clear_all_caches():
     """Limpa todos os caches (útil para testes)."""
     with _categories_lock:
         _categories_cache.clear()
     with _config_lock:
         _config_cache.clear()
+    with _product_ids_lock:
+        _product_ids_cache.clear()
+    with _search_lock:
+        _search_cache.clear()
+    with _image_urls_lock:
+        _image_urls_cache.clear()
+    with _token_claims_lock:
+        _token_claims_cache.clear()
 
 
 class CacheStats:
@@ -96,5 +269,23 @@ class CacheStats:
                 "size": len(_config_cache),
                 "maxsize": _config_cache.maxsize,
                 "ttl": _config_cache.ttl,
+            },
+            "product_ids_cache": {
+                "size": len(_product_ids_cache.get("product_ids") or ()),
+                "ttl": _product_ids_cache.ttl,
+            },
+            "search_cache": {
+                "size": len(_search_cache),
+                "maxsize": _search_cache.maxsize,
+                "ttl": _search_cache.ttl,
+            },
+            "image_urls_cache": {
+                "size": len(_image_urls_cache),
+                "maxsize": _image_urls_cache.maxsize,
+                "ttl": _image_urls_cache.ttl,
+            },
+            "token_claims_cache": {
+                "size": len(_token_claims_cache),
+                "maxsize": _token_claims_cache.maxsize,
             }
         }
@@ -0,0 +1,53 @@
+"""
+Micro-benchmark de renderização dos templates de email.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_email_templates.py [--count 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.email_service import email_templates, _order_status_context  # noqa: E402
+
+STATUSES = ["pendente", "confirmado", "enviado", "entregue", "cancelado"]
+
+
+def bench(label: str, count: int, func) -> None:
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {count:>7} emails  {elapsed * 1000:9.1f} ms  {count / elapsed:10.0f} emails/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=2000)
+    args = parser.parse_args()
+    count = args.count
+
+    started = time.perf_counter()
+    email_templates.load()
+    print(f"Compilação dos templates: {(time.perf_counter() - started) * 1000:.1f} ms\n")
+
+    contexts = [
+        _order_status_context(f"Cliente {i}", i, STATUSES[i % len(STATUSES)])
+        for i in range(count)
+    ]
+
+    bench("render (order_status)", count,
+          lambda: [email_templates.render("order_status", **ctx) for ctx in contexts])
+    bench("render_many (order_status)", count,
+          lambda: email_templates.render_many("order_status", contexts))
+    bench("render (confirmation)", count,
+          lambda: [email_templates.render("confirmation", nome=f"Cliente {i}",
+                                          confirmation_url=f"http://localhost/confirm/{i}",
+                                          welcome_text="Bem-vindo(a)!", role_text="Olá!")
+                   for i in range(count)])
+
+
+if __name__ == "__main__":
+    main()
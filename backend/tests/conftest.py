@@ -7,6 +7,8 @@ import sys
 from datetime import datetime
 from unittest.mock import MagicMock, patch
 
+from pymongo.errors import DuplicateKeyError
+
 # Adiciona o diretório raiz ao path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -19,6 +21,7 @@ class MockCollection:
     def __init__(self):
         self.data = []
         self.counter = 0
+        self.unique_indexes = []
     
     def find(self, query=None, projection=None):
         if query is None:
@@ -31,11 +34,14 @@ class MockCollection:
                 if key == "$or":
                     or_match = False
                     for condition in value:
-                        if all(doc.get(k) == v for k, v in condition.items()):
+                        if self._matches(doc, condition):
                             or_match = True
                             break
                     if not or_match:
                         match = False
+                elif key == "$and":
+                    if not all(self._matches(doc, condition) for condition in value):
+                        match = False
                 elif key == "$text":
                     # Busca textual simplificada
                     search_term = value.get("$search", "").lower()
@@ -44,35 +50,13 @@ class MockCollection:
                     if search_term not in titulo and search_term not in descricao:
                         match = False
                 elif isinstance(value, dict):
-                    # Suporte a operadores como $in, $ne, etc.
-                    if "$in" in value:
-                        if doc.get(key) not in value["$in"]:
-                            match = False
-                    elif "$ne" in value:
-                        if doc.get(key) == value["$ne"]:
-                            match = False
-                    elif "$gt" in value:
-                        if not (doc.get(key) is not None and doc.get(key) > value["$gt"]):
-                            match = False
-                    elif "$gte" in value:
-                        if not (doc.get(key) is not None and doc.get(key) >= value["$gte"]):
-                            match = False
-                    elif "$lt" in value:
-                        if not (doc.get(key) is not None and doc.get(key) < value["$lt"]):
-                            match = False
-                    elif "$lte" in value:
-                        if not (doc.get(key) is not None and doc.get(key) <= value["$lte"]):
-                            match = False
-                    elif "$regex" in value:
-                        import re
-                        pattern = value["$regex"]
-                        options = value.get("$options", "")
-                        flags = re.IGNORECASE if "i" in options else 0
-                        if not re.search(pattern, str(doc.get(key, "")), flags):
-                            match = False
-                    else:
+                    # Suporte a operadores como $in, $ne, etc. (todos devem casar)
+                    if not all(k.startswith("$") for k in value):
                         if doc.get(key) != value:
                             match = False
+                    elif not all(self._operator_matches(doc.get(key), op, operand, value)
+                                 for op, operand in value.items()):
+                        match = False
                 elif doc.get(key) != value:
                     match = False
                     break
@@ -81,6 +65,39 @@ class MockCollection:
         
         return MockCursor(results)
     
+    @staticmethod
+    def _operator_matches(field_value, op, operand, spec):
+        """Avalia um operador de consulta sobre o valor do campo."""
+        if op == "$in":
+            return field_value in operand
+        if op == "$nin":
+            return field_value not in operand
+        if op == "$ne":
+            return field_value != operand
+        if op == "$regex":
+            import re
+            flags = re.IGNORECASE if "i" in spec.get("$options", "") else 0
+            return re.search(operand, str(field_value if field_value is not None else ""), flags) is not None
+        if op == "$options":
+            return True
+        if field_value is None:
+            return False
+        if op == "$gt":
+            return field_value > operand
+        if op == "$gte":
+            return field_value >= operand
+        if op == "$lt":
+            return field_value < operand
+        if op == "$lte":
+            return field_value <= operand
+        return field_value == spec
+
+    def _matches(self, doc, query):
+        """Avalia um filtro (com operadores) contra um único documento."""
+        single = MockCollection()
+        single.data = [doc]
+        return bool(single.find(query).data)
+    
     def find_one(self, query=None):
         if query is None and self.data:
             return self.data[0]
@@ -96,6 +113,10 @@ class MockCollection:
         return None
     
     def insert_one(self, document):
+        for fields in self.unique_indexes:
+            key = {f: document.get(f) for f in fields}
+            if any(all(doc.get(f) == v for f, v in key.items()) for doc in self.data):
+                raise DuplicateKeyError(f"E11000 duplicate key error: {key}")
         doc_copy = document.copy()
         if "_id" not in doc_copy:
             doc_copy["_id"] = f"mock_id_{len(self.data)}"
@@ -115,6 +136,13 @@ class MockCollection:
             if "$inc" in update:
                 for key, value in update["$inc"].items():
                     doc[key] = doc.get(key, 0) + value
+            if "$max" in update:
+                for key, value in update["$max"].items():
+                    if doc.get(key) is None or value > doc[key]:
+                        doc[key] = value
+            if "$unset" in update:
+                for key in update["$unset"]:
+                    doc.pop(key, None)
             if "$push" in update:
                 for key, value in update["$push"].items():
                     if key not in doc:
@@ -154,6 +182,10 @@ class MockCollection:
                     doc[key] = doc.get(key, 0) + value
             if "$set" in update:
                 doc.update(update["$set"])
+            if "$max" in update:
+                for key, value in update["$max"].items():
+                    if doc.get(key) is None or value > doc[key]:
+                        doc[key] = value
             return doc
         elif upsert:
             new_doc = query.copy()
@@ -162,6 +194,8 @@ class MockCollection:
                     new_doc[key] = value
             if "$set" in update:
                 new_doc.update(update["$set"])
+            if "$max" in update:
+                new_doc.update(update["$max"])
             self.data.append(new_doc)
             return new_doc
         
@@ -183,13 +217,43 @@ class MockCollection:
         result.deleted_count = 0
         return result
     
+    def update_many(self, query, update, upsert=False):
+        docs = list(self.find(query))
+        for doc in docs:
+            if "$set" in update:
+                doc.update(update["$set"])
+            if "$inc" in update:
+                for key, value in update["$inc"].items():
+                    doc[key] = doc.get(key, 0) + value
+        
+        result = MagicMock()
+        result.matched_count = len(docs)
+        result.modified_count = len(docs)
+        return result
+    
+    def bulk_write(self, requests, ordered=True):
+        matched = 0
+        for op in requests:
+            if self.update_one(op._filter, op._doc).matched_count:
+                matched += 1
+        result = MagicMock()
+        result.matched_count = matched
+        result.modified_count = matched
+        return result
+    
+    def insert_many(self, documents, ordered=True):
+        inserted = []
+        for document in documents:
+            inserted.append(self.insert_one(document).inserted_id)
+        result = MagicMock()
+        result.inserted_ids = inserted
+        return result
+    
     def delete_many(self, query):
         result = MagicMock()
-        deleted = 0
-        self.data = [doc for doc in self.data if not all(
-            doc.get(k) == v for k, v in query.items()
-        )]
-        result.deleted_count = deleted
+        remaining = [doc for doc in self.data if not self._matches(doc, query)]
+        result.deleted_count = len(self.data) - len(remaining)
+        self.data = remaining
         return result
     
     def count_documents(self, query=None):
@@ -197,8 +261,10 @@ class MockCollection:
             return len(self.data)
         return len(list(self.find(query)))
     
-    def create_index(self, *args, **kwargs):
-        pass
+    def create_index(self, keys, unique=False, **kwargs):
+        if unique:
+            fields = [keys] if isinstance(keys, str) else [k for k, _ in keys]
+            self.unique_indexes.append(fields)
 
 
 class MockCursor:
@@ -265,6 +331,15 @@ class MockDatabase:
         return self.collections[name]
 
 
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    """Caches em memória não vazam entre testes (cada teste usa um banco novo)."""
+    from app.utils.cache import clear_all_caches
+    clear_all_caches()
+    yield
+    clear_all_caches()
+
+
 @pytest.fixture
 def app():
     """Cria instância da aplicação para testes."""
@@ -295,6 +370,14 @@ def mock_db(app):
     return app.db
 
 
+@pytest.fixture
+def admin_headers():
+    """Retorna headers com token JWT de administrador."""
+    from app.services.jwt_service import create_access_token
+    token = create_access_token(user_id=2, user_type="Administrador", email="admin@email.com")
+    return {"Authorization": f"Bearer {token}"}
+
+
 @pytest.fixture
 def sample_user():
     """Retorna dados de usuário de exemplo."""
@@ -0,0 +1,381 @@
+"""
+Testes para a verificação de tokens JWT.
+"""
+import os
+import jwt
+import time
+import uuid
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from flask import g
+
+from app.services import jwt_service
+from app.services.jwt_service import (
+    create_access_token,
+    create_refresh_token,
+    decode_token,
+    authenticate_request,
+    jwt_required,
+    admin_required,
+)
+from app.services.token_revocation import BloomFilter, TokenRevocationList
+from app.utils.cache import clear_all_caches
+from tests.conftest import MockDatabase
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    clear_all_caches()
+    yield
+    clear_all_caches()
+
+
+class TestDecodeToken:
+    """Testes para o cache de claims verificados."""
+
+    def test_sub_is_normalized_to_int(self):
+        """O 'sub' é gravado como string e lido de volta como inteiro."""
+        token = create_access_token(user_id=7, user_type="Cliente", email="c@test.com")
+
+        assert jwt.decode(token, options={"verify_signature": False})["sub"] == "7"
+        success, payload, _ = decode_token(token)
+        assert success is True
+        assert payload["sub"] == 7
+
+    def test_verified_token_is_cached(self, mocker):
+        """O mesmo token só passa pela verificação HMAC uma vez."""
+        token = create_access_token(user_id=1, user_type="Cliente", email="c@test.com")
+        spy = mocker.spy(jwt_service.jwt, "decode")
+        before = jwt_service.get_auth_metrics()
+
+        for _ in range(5):
+            success, payload, _ = decode_token(token)
+            assert success and payload["email"] == "c@test.com"
+
+        assert spy.call_count == 1
+        after = jwt_service.get_auth_metrics()
+        assert after["cache_hits"] - before["cache_hits"] == 4
+        assert after["decodes"] - before["decodes"] == 1
+
+    def test_cached_claims_are_copies(self):
+        """Alterar o payload retornado não afeta o cache."""
+        token = create_refresh_token(user_id=3)
+        decode_token(token)[1]["sub"] = 999
+
+        assert decode_token(token)[1]["sub"] == 3
+
+    def test_invalid_and_expired_tokens_are_rejected(self):
+        """Tokens inválidos ou expirados não entram no cache."""
+        expired = jwt.encode(
+            {"sub": "1", "exp": datetime.now(timezone.utc) - timedelta(seconds=1), "token_type": "access"},
+            jwt_service.JWT_SECRET_KEY, algorithm=jwt_service.JWT_ALGORITHM,
+        )
+
+        assert decode_token(expired) == (False, None, "Token expirado")
+        assert decode_token("nao.e.jwt")[0] is False
+        assert decode_token(expired) == (False, None, "Token expirado")
+
+
+class TestAuthenticateRequest:
+    """Testes para a autenticação compartilhada pelos decorators."""
+
+    def test_populates_g_once_per_request(self, app, admin_headers, mocker):
+        """Decorators empilhados verificam o token uma única vez."""
+        decode = mocker.spy(jwt_service, "decode_token")
+        view = jwt_required(admin_required(lambda: "ok"))
+
+        with app.test_request_context(headers=admin_headers):
+            assert view() == "ok"
+            assert g.user_id == 2
+            assert g.user_type == "Administrador"
+
+        assert decode.call_count == 1
+
+    def test_missing_token(self, app):
+        """Sem token, g fica sem usuário e o erro é informado."""
+        with app.test_request_context():
+            payload, error = authenticate_request()
+
+            assert payload is None
+            assert error == "Token de autenticação não fornecido"
+            assert g.user_id is None
+
+    def test_refresh_token_is_not_accepted(self, app):
+        """Token de refresh não autentica requisições."""
+        headers = {"Authorization": f"Bearer {create_refresh_token(user_id=1)}"}
+
+        with app.test_request_context(headers=headers):
+            assert authenticate_request() == (None, "Tipo de token inválido")
+
+    def test_admin_required_forbids_clients(self, app):
+        """Cliente autenticado recebe 403 em rota de administrador."""
+        token = create_access_token(user_id=1, user_type="Cliente", email="c@test.com")
+        view = admin_required(lambda: "ok")
+
+        with app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+            response, status = view()
+
+        assert status == 403
+
+    def test_health_reports_auth_metrics(self, client):
+        """Health expõe as métricas de verificação de tokens."""
+        response = client.get("/api/health")
+
+        assert "cache_hit_rate" in response.get_json()["data"]["auth"]
+
+
+class TestTokenRevocation:
+    """Testes para a lista de revogação com bloom filter."""
+
+    def test_bloom_filter_membership(self):
+        """Chaves adicionadas sempre são encontradas; falsos positivos são raros."""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [f"jti:{uuid.uuid4().hex}" for _ in range(1000)]
+        for key in keys:
+            bloom.add(key)
+
+        assert all(key in bloom for key in keys)
+        false_positives = sum(f"jti:{uuid.uuid4().hex}" in bloom for _ in range(2000))
+        assert false_positives < 100
+
+    def test_tokens_have_jti(self):
+        """Access e refresh tokens têm IDs únicos."""
+        first = decode_token(create_access_token(user_id=1, user_type="Cliente", email="c@test.com"))[1]
+        second = decode_token(create_refresh_token(user_id=1))[1]
+
+        assert first["jti"] and second["jti"]
+        assert first["jti"] != second["jti"]
+
+    def test_revoke_single_token(self):
+        """Só o token revogado é recusado."""
+        revocation = TokenRevocationList()
+        revoked = {"sub": 1, "jti": "a", "iat": int(time.time())}
+        other = {"sub": 1, "jti": "b", "iat": int(time.time())}
+
+        revocation.revoke_token("a", 1, datetime.utcnow() + timedelta(hours=1))
+
+        assert revocation.is_revoked(revoked) is True
+        assert revocation.is_revoked(other) is False
+
+    def test_revoke_user_only_affects_older_tokens(self):
+        """Revogar o usuário invalida tokens emitidos antes, não os novos."""
+        revocation = TokenRevocationList()
+        now = int(time.time())
+
+        revocation.revoke_user(5, timedelta(days=30))
+
+        assert revocation.is_revoked({"sub": 5, "jti": "x", "iat": now - 60}) is True
+        assert revocation.is_revoked({"sub": 5, "jti": "y", "iat": now + 1}) is False
+        assert revocation.is_revoked({"sub": 6, "jti": "z", "iat": now - 60}) is False
+
+    def test_other_process_sees_revocation_after_refresh(self, mocker):
+        """Revogações gravadas no banco chegam aos outros processos na recarga."""
+        db = MockDatabase()
+        writer = TokenRevocationList(db, refresh_interval=3600)
+        reader = TokenRevocationList(db, refresh_interval=3600)
+        reader.refresh()
+        claims = {"sub": 1, "jti": "abc", "iat": int(time.time())}
+
+        writer.revoke_token("abc", 1, datetime.utcnow() + timedelta(hours=1))
+        assert db["revoked_tokens"].find_one({"_id": "jti:abc"}) is not None
+
+        find_one = mocker.spy(db["revoked_tokens"], "find_one")
+        assert reader.is_revoked(claims) is False
+        find_one.assert_not_called()
+
+        reader.refresh()
+        assert reader.is_revoked(claims) is True
+
+    def test_logout_revokes_tokens(self, app, client, mock_db):
+        """Após o logout, access e refresh token deixam de valer."""
+        access = create_access_token(user_id=1, user_type="Cliente", email="c@test.com")
+        refresh = create_refresh_token(user_id=1)
+        headers = {"Authorization": f"Bearer {access}"}
+
+        response = client.post("/api/users/logout", json={"refresh_token": refresh}, headers=headers)
+
+        assert response.status_code == 200
+        assert response.get_json()["revoked"] == 2
+        assert client.post("/api/users/logout", headers=headers).status_code == 401
+        assert decode_token(refresh) == (False, None, "Token revogado")
+
+    def test_change_password_revokes_old_sessions(self, app, client, mock_db, sample_user):
+        """Trocar a senha encerra as sessões antigas e devolve novos tokens ao dono."""
+        from app.models.user_model import hash_password
+        mock_db["users"].insert_one({**sample_user, "id": 1, "senha_hash": hash_password("Senha@123"), "ativo": True})
+        old_token = jwt.encode(
+            {"sub": "1", "type": "Cliente", "email": sample_user["email"], "token_type": "access",
+             "iat": int(time.time()) - 60, "exp": int(time.time()) + 3600, "jti": "old"},
+            jwt_service.JWT_SECRET_KEY, algorithm=jwt_service.JWT_ALGORITHM,
+        )
+
+        response = client.put(
+            "/api/users/1/change-password",
+            json={"senha_atual": "Senha@123", "senha_nova": "NovaSenha@456"},
+            headers={"Authorization": f"Bearer {old_token}"},
+        )
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert decode_token(old_token) == (False, None, "Token revogado")
+        assert decode_token(data["access_token"])[0] is True
+
+
+class TestPasswordHasher:
+    """Testes para o pool de operações de senha."""
+
+    def test_rejects_when_queue_is_full(self):
+        """Com workers e fila ocupados, novas operações falham na hora."""
+        import threading
+        from app.services.password_hasher import PasswordHasher, PasswordHasherBusy
+
+        hasher = PasswordHasher(max_workers=1, max_pending=0, retry_after=7)
+        release = threading.Event()
+        worker = threading.Thread(target=hasher.run, args=(release.wait,))
+        worker.start()
+        while hasher.in_flight() == 0:
+            time.sleep(0.01)
+
+        with pytest.raises(PasswordHasherBusy) as exc:
+            hasher.run(lambda: None)
+        assert exc.value.retry_after == 7
+
+        release.set()
+        worker.join()
+        assert hasher.run(lambda: 42) == 42
+        assert hasher.get_stats()["rejected"] == 1
+
+    def test_needs_rehash(self, monkeypatch):
+        """Hashes com custo diferente do configurado precisam ser refeitos."""
+        from app.services import password_hasher
+
+        monkeypatch.setattr(password_hasher, "BCRYPT_ROUNDS", 5)
+        hashed = password_hasher.hash_password("Senha@123")
+
+        assert hashed.startswith("$2b$05$")
+        assert password_hasher.verify_password("Senha@123", hashed) is True
+        assert password_hasher.needs_rehash(hashed) is False
+        monkeypatch.setattr(password_hasher, "BCRYPT_ROUNDS", 6)
+        assert password_hasher.needs_rehash(hashed) is True
+
+    def test_login_rehashes_with_new_cost(self, client, mock_db, sample_user, monkeypatch):
+        """Login com hash de custo antigo grava um novo hash."""
+        from app.services import password_hasher
+
+        monkeypatch.setattr(password_hasher, "BCRYPT_ROUNDS", 4)
+        mock_db["users"].insert_one({**sample_user, "senha_hash": password_hasher.hash_password("Senha@123")})
+        monkeypatch.setattr(password_hasher, "BCRYPT_ROUNDS", 5)
+
+        response = client.post("/api/users/auth", json={"email": sample_user["email"], "senha": "Senha@123"})
+
+        assert response.status_code == 200
+        stored = mock_db["users"].find_one({"id": sample_user["id"]})["senha_hash"]
+        assert stored.startswith("$2b$05$")
+
+    def test_login_returns_503_when_busy(self, client, mock_db, sample_user, mocker):
+        """Pool cheio responde 503 com Retry-After."""
+        from app.services.password_hasher import PasswordHasherBusy
+
+        mock_db["users"].insert_one(sample_user)
+        mocker.patch("app.controllers.users_controller.verify_password", side_effect=PasswordHasherBusy(3))
+
+        response = client.post("/api/users/auth", json={"email": sample_user["email"], "senha": "Senha@123"})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "3"
+
+
+class TestLoginThrottle:
+    """Testes para o bloqueio de login por conta e por IP."""
+
+    def _throttle(self, store=None, **kwargs):
+        from app.services.login_throttle import LoginThrottle, MemoryThrottleStore
+        options = dict(max_account_failures=3, max_ip_failures=10, lockout_seconds=30, max_lockout_seconds=100)
+        options.update(kwargs)
+        return LoginThrottle(store or MemoryThrottleStore(), **options)
+
+    def test_exponential_lockout(self):
+        """Bloqueio começa no limite e dobra a cada falha, até o máximo."""
+        throttle = self._throttle()
+
+        applied = [throttle.record_failure("a@test.com", "1.1.1.1") for _ in range(6)]
+
+        assert applied == [0, 0, 30, 60, 100, 100]
+        assert 0 < throttle.check("A@test.com ", "9.9.9.9") <= 100
+
+    def test_ip_limit_covers_many_accounts(self):
+        """Falhas em contas diferentes do mesmo IP bloqueiam o IP."""
+        throttle = self._throttle(max_ip_failures=4)
+
+        for i in range(4):
+            throttle.record_failure(f"user{i}@test.com", "2.2.2.2")
+
+        assert throttle.check("outra@test.com", "2.2.2.2") > 0
+        assert throttle.check("outra@test.com", "3.3.3.3") == 0
+
+    def test_success_clears_account_counter(self):
+        """Login correto zera as falhas da conta."""
+        throttle = self._throttle()
+        throttle.record_failure("a@test.com", "1.1.1.1")
+        throttle.record_failure("a@test.com", "1.1.1.1")
+
+        throttle.record_success("a@test.com")
+
+        assert throttle.record_failure("a@test.com", "1.1.1.1") == 0
+
+    def test_ip_limit_disabled_by_default(self):
+        """Com max_ip_failures=0 só a conta é bloqueada (IP compartilhado atrás de proxy)."""
+        throttle = self._throttle(max_ip_failures=0)
+
+        for i in range(10):
+            throttle.record_failure(f"user{i}@test.com", "2.2.2.2")
+
+        assert throttle.check("outra@test.com", "2.2.2.2") == 0
+
+    def test_client_ip_from_trusted_proxy(self, mocker):
+        """Com TRUSTED_PROXY_COUNT o IP do throttling vem do X-Forwarded-For."""
+        from app import create_app
+        from app.services.login_throttle import MemoryThrottleStore
+        with patch.dict(os.environ, {"MONGODB_URI": "", "TRUSTED_PROXY_COUNT": "1"}):
+            proxied = create_app()
+        proxied.db = MockDatabase()
+        proxied.login_throttle = self._throttle(MemoryThrottleStore(), max_ip_failures=2)
+        mocker.patch("app.controllers.users_controller.verify_password", return_value=False)
+        client = proxied.test_client()
+
+        def login(email, ip):
+            return client.post("/api/users/auth", json={"email": email, "senha": "errada"},
+                               headers={"X-Forwarded-For": ip}, environ_base={"REMOTE_ADDR": "10.0.0.1"})
+
+        login("a@test.com", "1.1.1.1")
+        login("b@test.com", "1.1.1.1")
+
+        assert login("c@test.com", "1.1.1.1").status_code == 429
+        assert login("c@test.com", "2.2.2.2").status_code != 429
+
+    def test_mongo_store_is_shared_between_processes(self):
+        """Contadores no banco valem para todos os processos."""
+        from app.services.login_throttle import MongoThrottleStore
+        db = MockDatabase()
+        first, second = self._throttle(MongoThrottleStore(db)), self._throttle(MongoThrottleStore(db))
+
+        for _ in range(3):
+            first.record_failure("a@test.com", "1.1.1.1")
+
+        assert second.check("a@test.com", None) > 0
+
+    def test_locked_login_skips_bcrypt(self, app, client, mock_db, sample_user, mocker):
+        """Com a conta bloqueada, o login responde 429 sem verificar a senha."""
+        from app.services.login_throttle import MemoryThrottleStore
+        app.login_throttle = self._throttle(MemoryThrottleStore())
+        mock_db["users"].insert_one(sample_user)
+        verify = mocker.patch("app.controllers.users_controller.verify_password", return_value=False)
+        credentials = {"email": sample_user["email"], "senha": "errada"}
+
+        statuses = [client.post("/api/users/auth", json=credentials).status_code for _ in range(4)]
+
+        assert statuses == [401, 401, 401, 429]
+        assert verify.call_count == 3
+        response = client.post("/api/users/auth", json=credentials)
+        assert int(response.headers["Retry-After"]) > 0
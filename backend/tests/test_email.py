@@ -0,0 +1,200 @@
+"""
+Testes para a fila de envio de emails.
+"""
+import time
+import smtplib
+import pytest
+from unittest.mock import MagicMock
+
+from app.services import email_service
+from app.services.mail_queue import (
+    MailQueue,
+    MemoryMailStore,
+    SmtpConnection,
+    MAIL_SENT,
+    MAIL_FAILED,
+)
+
+
+def _wait_for_status(queue, mail_id, status, timeout=5.0):
+    """Aguarda o email chegar ao status esperado."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        mail = queue.get_status(mail_id)
+        if mail and mail["status"] == status:
+            return mail
+        time.sleep(0.01)
+    raise AssertionError(f"email {mail_id} não chegou a {status}: {queue.get_status(mail_id)}")
+
+
+@pytest.fixture
+def connection():
+    """Conexão SMTP falsa."""
+    return MagicMock(spec=SmtpConnection)
+
+
+@pytest.fixture
+def queue(connection):
+    """Fila em memória sem espera entre tentativas."""
+    mail_queue = MailQueue(MemoryMailStore(), connection, email_service.build_message,
+                           max_attempts=3, backoff_base=0, poll_interval=0.05)
+    yield mail_queue
+    mail_queue.shutdown()
+
+
+class TestSmtpConnection:
+    """Testes para a reutilização da conexão SMTP."""
+
+    def test_reuses_authenticated_connection(self, mocker):
+        """Vários emails usam uma única conexão, STARTTLS e login."""
+        smtp = mocker.patch("app.services.mail_queue.smtplib.SMTP")
+        conn = SmtpConnection("smtp.test", 587, "user", "senha")
+
+        for i in range(3):
+            conn.send(email_service.build_message(f"u{i}@test.com", "Assunto", "<p>oi</p>"))
+
+        assert smtp.call_count == 1
+        smtp.return_value.login.assert_called_once_with("user", "senha")
+        assert smtp.return_value.send_message.call_count == 3
+
+    def test_reconnects_when_server_disconnects(self, mocker):
+        """Sessão encerrada pelo servidor é refeita uma vez."""
+        smtp = mocker.patch("app.services.mail_queue.smtplib.SMTP")
+        smtp.return_value.send_message.side_effect = [None, smtplib.SMTPServerDisconnected(), None]
+        conn = SmtpConnection("smtp.test", 587, "user", "senha")
+
+        conn.send(email_service.build_message("a@test.com", "A", "<p>a</p>"))
+        conn.send(email_service.build_message("b@test.com", "B", "<p>b</p>"))
+
+        assert conn.connections_opened == 2
+        assert smtp.return_value.send_message.call_count == 3
+
+
+class TestMailQueue:
+    """Testes para o envio em segundo plano."""
+
+    def test_enqueued_mail_is_sent(self, queue, connection):
+        """Email enfileirado é enviado pela thread de envio."""
+        mail_id = queue.enqueue("cliente@test.com", "Bem-vindo", "<p>Olá</p>", "Olá")
+
+        mail = _wait_for_status(queue, mail_id, MAIL_SENT)
+
+        assert mail["attempts"] == 1
+        message = connection.send.call_args.args[0]
+        assert message["To"] == "cliente@test.com"
+
+    def test_failed_mail_is_retried(self, queue, connection):
+        """Falha temporária é repetida com backoff até o envio."""
+        connection.send.side_effect = [smtplib.SMTPConnectError(421, "ocupado"), None]
+
+        mail_id = queue.enqueue("cliente@test.com", "Assunto", "<p>Olá</p>")
+        mail = _wait_for_status(queue, mail_id, MAIL_SENT)
+
+        assert mail["attempts"] == 2
+        assert connection.send.call_count == 2
+
+    def test_permanent_error_is_not_retried(self, queue, connection):
+        """Destinatário recusado marca o email como erro sem novas tentativas."""
+        connection.send.side_effect = smtplib.SMTPRecipientsRefused({"x@test.com": (550, b"no")})
+
+        mail_id = queue.enqueue("x@test.com", "Assunto", "<p>Olá</p>")
+        mail = _wait_for_status(queue, mail_id, MAIL_FAILED)
+
+        assert mail["attempts"] == 1
+        assert connection.send.call_count == 1
+
+
+class TestSendEmail:
+    """Testes para send_email com e sem fila."""
+
+    def test_send_email_uses_queue(self, app, mocker, monkeypatch):
+        """Com fila habilitada, a requisição só enfileira o email."""
+        monkeypatch.setattr(email_service, "SMTP_USER", "user")
+        monkeypatch.setattr(email_service, "SMTP_PASSWORD", "senha")
+        smtp = mocker.patch("app.services.email_service.smtplib.SMTP")
+        app.mail_queue = MagicMock()
+        try:
+            with app.app_context():
+                assert email_service.send_email("a@test.com", "Assunto", "<p>oi</p>") is True
+        finally:
+            queue = app.mail_queue
+            app.mail_queue = None
+
+        queue.enqueue.assert_called_once()
+        smtp.assert_not_called()
+
+    def test_send_email_without_smtp_config(self, app):
+        """Sem SMTP configurado o email não é enviado nem enfileirado."""
+        with app.app_context():
+            assert email_service.send_email("a@test.com", "Assunto", "<p>oi</p>") is False
+
+
+class TestEmailTemplates:
+    """Testes para os templates de email pré-compilados."""
+
+    def test_all_templates_are_loaded(self):
+        """Cada email tem versão HTML e texto compiladas."""
+        names = email_service.email_templates.load()
+
+        assert names == ["account_deletion", "confirmation", "order_status", "password_reset", "welcome"]
+
+    def test_render_escapes_html_only(self):
+        """Variáveis são escapadas no HTML e mantidas no texto puro."""
+        html, text = email_service.email_templates.render("welcome", nome="<b>Ana</b>")
+
+        assert "&lt;b&gt;Ana&lt;/b&gt;" in html
+        assert "<b>Ana</b>" not in html
+        assert "Olá <b>Ana</b>!" in text
+
+    def test_unknown_template(self):
+        """Template inexistente gera KeyError."""
+        with pytest.raises(KeyError):
+            email_service.email_templates.render("inexistente")
+
+    def test_render_many_matches_render(self):
+        """Renderização em lote produz o mesmo conteúdo que a individual."""
+        contexts = [
+            email_service._order_status_context("Ana", 1, "enviado"),
+            email_service._order_status_context("Bia", 2, "status_novo"),
+        ]
+
+        rendered = email_service.email_templates.render_many("order_status", contexts)
+
+        assert rendered == [email_service.email_templates.render("order_status", **ctx) for ctx in contexts]
+        assert "Pedido Enviado" in rendered[0][1]
+        assert "Atualização do Pedido" in rendered[1][1]
+
+    def test_send_order_status_notifications(self, mocker):
+        """Notificações em lote retornam o resultado por destinatário."""
+        send = mocker.patch(
+            "app.services.email_service.send_emails",
+            return_value=[{"sent": True, "mail_id": "abc", "error": None}],
+        )
+
+        results = email_service.send_order_status_notifications([
+            {"to_email": "ana@test.com", "nome": "Ana", "order_id": 1, "status": "enviado"},
+            {"to_email": None, "nome": "Bia", "order_id": 2, "status": "enviado"},
+        ])
+
+        assert results == [
+            {"order_id": 1, "email": "ana@test.com", "sent": True, "mail_id": "abc", "error": None},
+            {"order_id": 2, "email": None, "sent": False, "mail_id": None, "error": "destinatário sem email"},
+        ]
+        emails = send.call_args.args[0]
+        assert len(emails) == 1
+        assert emails[0][1] == "🚚 Pedido Enviado - Pedido #1"
+
+    def test_send_emails_without_queue_uses_one_connection(self, app, mocker, monkeypatch):
+        """Sem fila, o lote inteiro é enviado por uma única sessão SMTP."""
+        monkeypatch.setattr(email_service, "SMTP_USER", "user")
+        monkeypatch.setattr(email_service, "SMTP_PASSWORD", "senha")
+        smtp = mocker.patch("app.services.mail_queue.smtplib.SMTP")
+
+        with app.app_context():
+            results = email_service.send_emails([
+                (f"u{i}@test.com", "Assunto", "<p>oi</p>", "oi") for i in range(3)
+            ])
+
+        assert [r["sent"] for r in results] == [True, True, True]
+        assert smtp.call_count == 1
+        assert smtp.return_value.send_message.call_count == 3
@@ -4,6 +4,7 @@ Testes para rotas de favoritos.
 import pytest
 import json
 from datetime import datetime
+from unittest.mock import MagicMock, patch
 
 
 class TestFavoritesList:
@@ -244,3 +245,364 @@ class TestFavoriteCount:
             data = response.get_json()
             assert "count" in data
             assert data["count"] >= 1
+
+
+class TestFavoriteRoundTrips:
+    """Testes para as operações atômicas de favoritos."""
+
+    def _toggle(self, client, product_id):
+        return client.post(
+            "/api/favorites/toggle",
+            data=json.dumps({"product_id": product_id}),
+            content_type="application/json",
+            headers={"X-User-Id": "1"}
+        )
+
+    def test_duplicate_rejected_by_unique_index(self, client, mock_db, sample_product):
+        from app.models.favorite_model import ensure_indexes
+
+        ensure_indexes(mock_db)
+        mock_db["products"].insert_one(sample_product)
+        body = json.dumps({"product_id": sample_product["id"]})
+
+        first = client.post("/api/favorites", data=body, content_type="application/json",
+                            headers={"X-User-Id": "1"})
+        second = client.post("/api/favorites", data=body, content_type="application/json",
+                             headers={"X-User-Id": "1"})
+
+        assert first.status_code == 201
+        assert second.status_code == 409
+        assert len(mock_db["favorites"].data) == 1
+
+    def test_toggle_uses_single_write_and_cached_product_ids(self, client, mock_db, sample_product):
+        from app.models.favorite_model import ensure_indexes
+
+        ensure_indexes(mock_db)
+        mock_db["products"].insert_one(sample_product)
+        favorites = mock_db["favorites"]
+        products = mock_db["products"]
+
+        # Primeira chamada carrega o conjunto de IDs
+        assert self._toggle(client, sample_product["id"]).get_json()["is_favorited"] is True
+
+        with patch.object(products, "find_one", wraps=products.find_one) as product_lookup, \
+                patch.object(products, "find", wraps=products.find) as product_scan, \
+                patch.object(products, "update_one") as counter_update, \
+                patch.object(favorites, "find_one", wraps=favorites.find_one) as favorite_lookup:
+            removed = self._toggle(client, sample_product["id"]).get_json()
+            added = self._toggle(client, sample_product["id"])
+
+        assert removed["is_favorited"] is False
+        assert added.status_code == 201
+        assert counter_update.call_count == 2
+        product_lookup.assert_not_called()
+        product_scan.assert_not_called()
+        favorite_lookup.assert_not_called()
+        assert len(favorites.data) == 1
+
+    def test_new_product_found_after_cache_load(self, client, mock_db, sample_product):
+        mock_db["products"].insert_one(sample_product)
+        assert self._toggle(client, sample_product["id"]).status_code == 201
+
+        # Produto criado depois do cache: confirmado no banco
+        mock_db["products"].insert_one({**sample_product, "id": 999})
+        assert self._toggle(client, 999).status_code == 201
+        assert self._toggle(client, 12345).status_code == 404
+
+    def test_deleted_product_leaves_cache(self, mock_db, sample_product):
+        from app.utils.cache import product_exists, discard_cached_product_id
+
+        mock_db["products"].insert_one(sample_product)
+        assert product_exists(mock_db, sample_product["id"]) is True
+
+        mock_db["products"].delete_one({"id": sample_product["id"]})
+        discard_cached_product_id(sample_product["id"])
+
+        assert product_exists(mock_db, sample_product["id"]) is False
+
+
+class TestFavoriteBatchCheck:
+    """Testes para a verificação de favoritos em lote."""
+
+    def _check(self, client, product_ids, user="1"):
+        return client.post(
+            "/api/favorites/check",
+            data=json.dumps({"product_ids": product_ids}),
+            content_type="application/json",
+            headers={"X-User-Id": user}
+        )
+
+    def test_batch_check_uses_one_query(self, client, mock_db):
+        favorites = mock_db["favorites"]
+        for product_id in (1, 3):
+            favorites.insert_one({"user_id": "1", "product_id": product_id, "created_at": datetime.utcnow()})
+        favorites.insert_one({"user_id": "2", "product_id": 2, "created_at": datetime.utcnow()})
+
+        with patch.object(favorites, "find", wraps=favorites.find) as find:
+            response = self._check(client, [1, 2, 3, 4])
+
+        assert response.status_code == 200
+        assert response.get_json()["favorites"] == {"1": True, "2": False, "3": True, "4": False}
+        find.assert_called_once()
+        assert find.call_args[0][0] == {"user_id": "1", "product_id": {"$in": [1, 2, 3, 4]}}
+
+    def test_batch_check_validation(self, client, mock_db):
+        assert self._check(client, "1,2").status_code == 400
+        assert self._check(client, [1, "2"]).status_code == 400
+        assert self._check(client, list(range(101))).status_code == 400
+        assert self._check(client, []).get_json()["favorites"] == {}
+
+    def test_batch_check_requires_user(self, client, mock_db):
+        response = client.post("/api/favorites/check", data=json.dumps({"product_ids": [1]}),
+                               content_type="application/json")
+
+        assert response.status_code == 401
+
+    def test_product_listing_annotates_favorites(self, client, mock_db, sample_product):
+        mock_db["products"].insert_one(sample_product)
+        mock_db["products"].insert_one({**sample_product, "id": 2, "titulo": "Outro Produto"})
+        mock_db["favorites"].insert_one({"user_id": "1", "product_id": 2, "created_at": datetime.utcnow()})
+
+        annotated = client.get("/api/products?with_favorites=1", headers={"X-User-Id": "1"}).get_json()
+        plain = client.get("/api/products", headers={"X-User-Id": "1"}).get_json()
+        anonymous = client.get("/api/products?with_favorites=1").get_json()
+
+        assert {item["id"]: item["is_favorited"] for item in annotated["items"]} == {1: False, 2: True}
+        assert all("is_favorited" not in item for item in plain["items"])
+        assert all("is_favorited" not in item for item in anonymous["items"])
+
+
+class TestFavoritesPagination:
+    """Testes para a listagem paginada de favoritos."""
+
+    @pytest.fixture
+    def many_favorites(self, mock_db, sample_product):
+        from datetime import timedelta
+        base = datetime(2024, 1, 1)
+        # Inseridos do mais recente para o mais antigo (ordem da listagem)
+        for product_id in range(5, 0, -1):
+            mock_db["products"].insert_one({
+                **sample_product, "id": product_id,
+                "imagens": {"160": f"https://cdn/p{product_id}_160.jpg", "1200": f"https://cdn/p{product_id}_1200.jpg"},
+            })
+            mock_db["favorites"].insert_one({
+                "user_id": "1", "product_id": product_id,
+                "created_at": base + timedelta(minutes=product_id // 2),
+            })
+
+    def _list(self, client, query=""):
+        return client.get(f"/api/favorites?{query}", headers={"X-User-Id": "1"})
+
+    def test_cursor_pages_through_favorites(self, client, many_favorites):
+        first = self._list(client, "page_size=2").get_json()
+        assert [f["product_id"] for f in first["favorites"]] == [5, 4]
+        assert first["total"] == 5
+        assert first["favorites"][0]["product"]["id"] == 5
+
+        second = self._list(client, f"page_size=2&cursor={first['next_cursor']}").get_json()
+        assert [f["product_id"] for f in second["favorites"]] == [3, 2]
+
+        third = self._list(client, f"page_size=2&cursor={second['next_cursor']}").get_json()
+        assert [f["product_id"] for f in third["favorites"]] == [1]
+        assert third["next_cursor"] is None
+
+    def test_products_loaded_with_card_projection(self, client, mock_db, many_favorites):
+        from app.models.favorite_model import PRODUCT_CARD_PROJECTION
+
+        products = mock_db["products"]
+        with patch.object(products, "find", wraps=products.find) as find:
+            self._list(client, "page_size=3")
+
+        find.assert_called_once()
+        query, projection = find.call_args[0]
+        assert query == {"id": {"$in": [5, 4, 3]}}
+        assert projection == PRODUCT_CARD_PROJECTION
+        assert "descricao" not in projection
+        assert not any(key.startswith("imagens.1200") for key in projection)
+
+    def test_listing_index_covers_sort(self):
+        from pymongo.errors import OperationFailure
+        from app.models.favorite_model import ensure_indexes, FAVORITES_SORT
+
+        collection = MagicMock()
+        # Índice antigo (user_id, created_at) com o mesmo nome: conflito na primeira criação
+        def create_index(keys, **kwargs):
+            if kwargs.get("name") == "user_created" and not collection.drop_index.called:
+                raise OperationFailure("IndexKeySpecsConflict", code=86)
+        collection.create_index.side_effect = create_index
+
+        ensure_indexes({"favorites": collection})
+
+        collection.drop_index.assert_called_once_with("user_created")
+        keys, kwargs = collection.create_index.call_args_list[-2]
+        assert kwargs["name"] == "user_created"
+        assert keys[0] == [("user_id", 1), *FAVORITES_SORT]
+
+    def test_invalid_cursor_returns_400(self, client, many_favorites):
+        assert self._list(client, "cursor=invalido").status_code == 400
+
+    def test_lookup_option_runs_single_aggregation(self, client, mock_db):
+        favorites = mock_db["favorites"]
+        favorites.aggregate = MagicMock(return_value=[{
+            "_id": "mock_id_0", "user_id": "1", "product_id": 7,
+            "created_at": datetime(2024, 1, 1), "product": {"id": 7, "titulo": "Saia"},
+        }])
+
+        data = self._list(client, "lookup=1").get_json()
+
+        favorites.aggregate.assert_called_once()
+        pipeline = favorites.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {"user_id": "1"}}
+        assert pipeline[3]["$lookup"]["from"] == "products"
+        assert data["favorites"][0]["product"]["titulo"] == "Saia"
+
+
+class TestFavoriteCounts:
+    """Testes para o contador de favoritos dos produtos."""
+
+    def _toggle(self, client, product_id, user="1"):
+        return client.post(
+            "/api/favorites/toggle",
+            data=json.dumps({"product_id": product_id}),
+            content_type="application/json",
+            headers={"X-User-Id": user}
+        )
+
+    def test_counter_follows_add_and_remove(self, client, mock_db, sample_product):
+        from app.models.favorite_model import ensure_indexes
+
+        ensure_indexes(mock_db)
+        mock_db["products"].insert_one({**sample_product, "favorite_count": 0})
+        product = mock_db["products"].data[0]
+
+        self._toggle(client, sample_product["id"], user="1")
+        self._toggle(client, sample_product["id"], user="2")
+        assert product["favorite_count"] == 2
+
+        self._toggle(client, sample_product["id"], user="1")
+        client.delete(f"/api/favorites/{sample_product['id']}", headers={"X-User-Id": "2"})
+        assert product["favorite_count"] == 0
+
+    def test_duplicate_add_does_not_increment(self, client, mock_db, sample_product):
+        from app.models.favorite_model import ensure_indexes
+
+        ensure_indexes(mock_db)
+        mock_db["products"].insert_one({**sample_product, "favorite_count": 0})
+        body = json.dumps({"product_id": sample_product["id"]})
+
+        for _ in range(2):
+            client.post("/api/favorites", data=body, content_type="application/json",
+                        headers={"X-User-Id": "1"})
+
+        assert mock_db["products"].data[0]["favorite_count"] == 1
+
+    def test_clear_only_removes_favorites_it_counted(self, mock_db, sample_product, mocker):
+        from app.models import favorite_model
+
+        for product_id in (1, 2):
+            mock_db["products"].insert_one({**sample_product, "id": product_id, "favorite_count": 0})
+        favorite_model.add_favorite(mock_db, "1", 1)
+
+        # Favorito criado entre a leitura dos ids e a remoção
+        find = mock_db["favorites"].find
+        def find_then_add(*args, **kwargs):
+            rows = list(find(*args, **kwargs))
+            favorite_model.add_favorite(mock_db, "1", 2)
+            return rows
+        mocker.patch.object(mock_db["favorites"], "find", side_effect=find_then_add)
+
+        ok, _, removed = favorite_model.clear_user_favorites(mock_db, "1")
+
+        assert ok and removed == 1
+        assert [f["product_id"] for f in mock_db["favorites"].data] == [2]
+        assert [p["favorite_count"] for p in mock_db["products"].data] == [0, 1]
+
+    def test_put_cannot_overwrite_favorite_count(self, client, mock_db, sample_product, sample_category,
+                                                 admin_headers, mocker):
+        from app.services.storage_backend import MemoryStorageBackend
+        mocker.patch("app.services.storage.storage_service", MemoryStorageBackend())
+        mock_db["products"].insert_one({**sample_product, "favorite_count": 3})
+        mock_db["categories"].insert_one(sample_category)
+
+        response = client.put(f"/api/products/{sample_product['id']}", json={"favorite_count": 999},
+                              headers=admin_headers)
+
+        assert response.status_code == 200
+        assert mock_db["products"].data[0]["favorite_count"] == 3
+
+    def test_put_keeps_concurrent_favorite_increment(self, client, mock_db, sample_product, sample_category,
+                                                     admin_headers, mocker):
+        from app.services.storage_backend import MemoryStorageBackend
+        mocker.patch("app.services.storage.storage_service", MemoryStorageBackend())
+        mock_db["products"].insert_one({**sample_product, "favorite_count": 3})
+        mock_db["categories"].insert_one(sample_category)
+        products = mock_db["products"]
+
+        # Favorito ($inc) aplicado entre a leitura do produto e o $set da edição
+        update_one = products.update_one
+        def favorite_then_update(query, update, *args, **kwargs):
+            update_one({"id": sample_product["id"]}, {"$inc": {"favorite_count": 1}})
+            return update_one(query, update, *args, **kwargs)
+        mocker.patch.object(products, "update_one", side_effect=favorite_then_update)
+
+        response = client.put(f"/api/products/{sample_product['id']}", json={"titulo": "Título Novo"},
+                              headers=admin_headers)
+
+        assert response.status_code == 200
+        assert products.data[0]["favorite_count"] == 4
+
+    def test_recount_rewrites_only_divergent_products(self):
+        from app.models.favorite_model import recount_favorite_counts
+
+        favorites, products = MagicMock(), MagicMock()
+        favorites.aggregate.return_value = [{"_id": 1, "count": 3}, {"_id": 2, "count": 1}]
+        products.bulk_write.return_value.modified_count = 1
+        products.update_many.return_value.modified_count = 4
+
+        report = recount_favorite_counts({"favorites": favorites, "products": products})
+
+        products.bulk_write.assert_called_once()
+        ops = products.bulk_write.call_args[0][0]
+        assert [op._filter for op in ops] == [
+            {"id": 1, "favorite_count": {"$ne": 3}},
+            {"id": 2, "favorite_count": {"$ne": 1}},
+        ]
+        assert products.update_many.call_args[0][0] == {"id": {"$nin": [1, 2]}, "favorite_count": {"$ne": 0}}
+        assert report["updated"] == 1
+        assert report["zeroed"] == 4
+
+    def test_products_sorted_by_popularity(self, client, mock_db, sample_product):
+        from app.models.product_model import POPULAR_SORT
+        from tests.conftest import MockCursor
+
+        mock_db["products"].insert_one(sample_product)
+        with patch.object(MockCursor, "sort", autospec=True, side_effect=lambda self, *a, **k: self) as sort:
+            response = client.get("/api/products?sort=popular&categoria=Roupas")
+
+        assert response.status_code == 200
+        assert sort.call_args[0][1] == POPULAR_SORT
+
+    def test_favorite_reorders_cached_popular_search(self, client, mock_db, sample_product):
+        from tests.conftest import MockCursor
+        from app.utils.cache import _search_cache
+
+        def popular_sort(cursor, *args, **kwargs):
+            cursor.data.sort(key=lambda doc: (-doc.get("favorite_count", 0), doc["id"]))
+            return cursor
+
+        for product_id in (1, 2):
+            mock_db["products"].insert_one({**sample_product, "id": product_id, "favorite_count": 0})
+
+        with patch.object(MockCursor, "sort", autospec=True, side_effect=popular_sort):
+            ids = lambda: [item["id"] for item in client.get("/api/products?sort=popular").get_json()["items"]]
+            assert ids() == [1, 2]
+            client.get("/api/products?sort=titulo")
+            self._toggle(client, 2)
+            assert ids() == [2, 1]
+
+        # Só as buscas por popularidade são descartadas; as demais seguem em cache
+        cached_sorts = [result["params"]["sort"] for result in _search_cache.values()]
+        assert sorted(cached_sorts) == ["popular", "titulo"]
+
+    def test_invalid_sort_rejected(self, client, mock_db):
+        assert client.get("/api/products?sort=preco").status_code == 400
@@ -42,6 +42,22 @@ class TestHealthRoutes:
         # Verifica campos detalhados
         assert "data" in data
         assert "memory_usage" in data["data"]
+    
+    def test_health_reports_startup_metrics(self, client):
+        """Testa que health expõe tempos de import, create_app e primeira requisição."""
+        client.get("/")
+        response = client.get("/api/health")
+        
+        startup = response.get_json()["data"]["startup"]
+        assert startup["create_app_ms"] is not None
+        assert startup["first_request_ms"] is not None
+        assert "products_bp" in startup["blueprints_ms"]
+    
+    def test_health_reports_storage(self, client):
+        """Testa que health inclui o status do storage."""
+        response = client.get("/api/health")
+        
+        assert "status" in response.get_json()["data"]["storage"]
 
 
 class TestCORS:
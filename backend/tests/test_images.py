@@ -0,0 +1,542 @@
+"""
+Testes para o pipeline de imagens de produtos.
+"""
+import time
+import pytest
+from io import BytesIO
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from app.services.supabase_storage import SupabaseStorageService
+from app.services.storage_backend import (
+    StorageBackend,
+    LocalStorageBackend,
+    is_storage_path,
+    storage_path_product_id,
+    MemoryStorageBackend,
+    IMAGE_SIZES,
+    DERIVATIVE_EXT,
+)
+from app.services.image_queue import (
+    ImageQueue,
+    MemoryJobStore,
+    IMAGE_PLACEHOLDER_URL,
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_PENDING,
+)
+from app.services.storage_maintenance import DeletionQueue, collect_orphans
+from app.utils import clear_all_caches
+from app.utils.background import backoff_delay
+
+
+def _make_upload(width=2000, height=1500, mode="RGB", fmt="JPEG", content_type="image/jpeg"):
+    """Cria um FileStorage com uma imagem gerada em memória."""
+    buffer = BytesIO()
+    Image.new(mode, (width, height), (200, 30, 90)).save(buffer, format=fmt)
+    buffer.seek(0)
+    return FileStorage(stream=buffer, filename="foto.jpg", content_type=content_type)
+
+
+@pytest.fixture
+def storage():
+    """Serviço de storage com cliente Supabase falso."""
+    service = SupabaseStorageService()
+    service.client = MagicMock()
+    service.is_connected = True
+    service.client.storage.from_.return_value.upload.return_value = MagicMock(error=None)
+    service.client.storage.from_.return_value.remove.return_value = []
+    service.client.storage.from_.return_value.get_public_url.return_value = "https://cdn/img"
+    service.client.storage.from_.return_value.create_signed_url.side_effect = (
+        lambda path, expires_in: {"signedURL": f"https://cdn/sign/{path}"}
+    )
+    return service
+
+
+class TestImageDerivatives:
+    """Testes para geração das variações responsivas."""
+
+    def test_build_derivatives_generates_every_size(self, storage):
+        """Cada largura configurada gera uma variação limitada àquele tamanho."""
+        derivatives = storage._build_derivatives(_make_upload())
+
+        assert sorted(derivatives) == sorted(IMAGE_SIZES)
+        for size, content in derivatives.items():
+            image = Image.open(content)
+            assert max(image.size) <= size
+
+    def test_build_derivatives_keeps_small_images(self, storage):
+        """Imagens menores que a variação não são ampliadas."""
+        derivatives = storage._build_derivatives(_make_upload(width=100, height=80))
+
+        for content in derivatives.values():
+            assert Image.open(content).size == (100, 80)
+
+    def test_build_derivatives_accepts_transparency(self, storage):
+        """PNG com canal alfa é convertido sem erro."""
+        upload = _make_upload(mode="RGBA", fmt="PNG", content_type="image/png")
+
+        derivatives = storage._build_derivatives(upload)
+
+        assert len(derivatives) == len(IMAGE_SIZES)
+
+    def test_upload_image_set_returns_path_per_size(self, storage):
+        """Upload gera um mapa largura -> caminho no prefixo do produto, sem assinar URLs."""
+        success, paths = storage.upload_image_set(_make_upload(), 42)
+
+        assert success is True
+        assert set(paths) == {str(size) for size in IMAGE_SIZES}
+        for size, path in paths.items():
+            assert path.startswith("product_42/")
+            assert path.endswith(f"_{size}{DERIVATIVE_EXT}")
+        storage.client.storage.from_.return_value.create_signed_url.assert_not_called()
+
+    def test_upload_image_set_rejects_non_images(self, storage):
+        """Arquivos que não são imagem são rejeitados antes do processamento."""
+        upload = FileStorage(stream=BytesIO(b"abc"), filename="a.txt", content_type="text/plain")
+
+        success, message = storage.upload_image_set(upload, 1)
+
+        assert success is False
+        assert "imagem" in message
+
+    def test_delete_image_set_uses_single_remove(self, storage):
+        """Todas as variações são removidas em uma única chamada."""
+        urls = [
+            "https://x.supabase.co/storage/v1/object/sign/product-images/product_1/a_160.webp?token=t",
+            "https://x.supabase.co/storage/v1/object/public/product-images/product_1/a_480.webp",
+        ]
+
+        success, _ = storage.delete_image_set(urls)
+
+        assert success is True
+        storage.client.storage.from_.return_value.remove.assert_called_once_with(
+            ["product_1/a_160.webp", "product_1/a_480.webp"]
+        )
+
+
+def _wait_for(queue, job_id, timeout=5.0):
+    """Aguarda o job chegar a um estado final."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get_status(job_id)
+        if job and job["status"] in (JOB_DONE, JOB_FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} não finalizou")
+
+
+@pytest.fixture
+def fake_storage():
+    """Storage falso que devolve URLs fixas por largura."""
+    service = MagicMock()
+    service.upload_image_set.return_value = (True, {"160": "https://cdn/a_160", "1200": "https://cdn/a_1200"})
+    service.delete_image_set.return_value = (True, "ok")
+    return service
+
+
+@pytest.fixture
+def queue(mock_db, fake_storage):
+    """Fila com store em memória e sem espera entre tentativas."""
+    image_queue = ImageQueue(MemoryJobStore(), get_db=lambda: mock_db, storage=fake_storage,
+                             max_workers=1, max_attempts=2, backoff_base=0)
+    yield image_queue
+    image_queue.shutdown()
+
+
+class TestImageQueue:
+    """Testes para o processamento de imagens em segundo plano."""
+
+    def test_job_updates_product_and_replaces_old_images(self, queue, mock_db, fake_storage):
+        """Job concluído grava as URLs no produto e remove as antigas."""
+        job_id = queue.new_job_id()
+        mock_db.products.insert_one({"id": 5, "imagem": IMAGE_PLACEHOLDER_URL, "imagem_job": job_id})
+
+        queue.submit(b"raw", "foto.jpg", "image/jpeg", 5, replace_urls=["https://cdn/old"], job_id=job_id)
+        job = _wait_for(queue, job_id)
+
+        product = mock_db.products.find_one({"id": 5})
+        assert job["status"] == JOB_DONE
+        assert product["imagem"] == "https://cdn/a_1200"
+        assert product["imagem_status"] == JOB_DONE
+        fake_storage.delete_image_set.assert_called_once_with(["https://cdn/old"])
+
+    def test_superseded_job_discards_its_upload(self, queue, mock_db, fake_storage):
+        """Se outro job assumiu o produto, as imagens geradas são descartadas."""
+        mock_db.products.insert_one({"id": 5, "imagem": "https://cdn/new", "imagem_job": "outro"})
+
+        job = queue.submit(b"raw", "foto.jpg", "image/jpeg", 5)
+        _wait_for(queue, job["job_id"])
+
+        assert mock_db.products.find_one({"id": 5})["imagem"] == "https://cdn/new"
+        fake_storage.delete_image_set.assert_called_once_with(["https://cdn/a_160", "https://cdn/a_1200"])
+
+    def test_failed_job_is_retried_then_marked(self, queue, mock_db, fake_storage):
+        """Falhas são repetidas até o limite e o produto fica com status de erro."""
+        fake_storage.upload_image_set.return_value = (False, "storage fora do ar")
+        job_id = queue.new_job_id()
+        mock_db.products.insert_one({"id": 8, "imagem": IMAGE_PLACEHOLDER_URL, "imagem_job": job_id})
+
+        queue.submit(b"raw", "foto.jpg", "image/jpeg", 8, job_id=job_id)
+        job = _wait_for(queue, job_id)
+
+        assert job["status"] == JOB_FAILED
+        assert job["attempts"] == 2
+        assert fake_storage.upload_image_set.call_count == 2
+        assert mock_db.products.find_one({"id": 8})["imagem_status"] == JOB_FAILED
+
+    def test_done_job_invalidates_search_cache(self, queue, mock_db, mocker):
+        """Imagem aplicada limpa o cache da busca e atualiza as sugestões."""
+        invalidate = mocker.patch("app.services.image_queue.invalidate_search_cache")
+        refresh = mocker.patch("app.services.image_queue.refresh_product")
+        job_id = queue.new_job_id()
+        mock_db.products.insert_one({"id": 5, "imagem": IMAGE_PLACEHOLDER_URL, "imagem_job": job_id})
+
+        queue.submit(b"raw", "foto.jpg", "image/jpeg", 5, job_id=job_id)
+        _wait_for(queue, job_id)
+
+        invalidate.assert_called_once()
+        refresh.assert_called_once_with(mock_db, 5)
+
+    def test_resume_respects_next_attempt_at(self, queue, mocker):
+        """Jobs em backoff retomados após reinício esperam o horário agendado."""
+        now = datetime.utcnow()
+        queue.store.create({"job_id": "agora", "status": JOB_PENDING}, b"raw")
+        queue.store.create({"job_id": "depois", "status": JOB_PENDING,
+                            "next_attempt_at": now + timedelta(seconds=30)}, b"raw")
+        mocker.patch.object(queue.store, "list_pending", return_value=["agora", "depois"])
+        schedule = mocker.patch.object(queue, "_schedule")
+
+        assert queue.resume_pending() == 2
+
+        delays = {call.args[0]: call.args[1] for call in schedule.call_args_list}
+        assert delays["agora"] == 0
+        assert 25 < delays["depois"] <= 30
+
+    def test_backoff_delay_grows_and_is_capped(self):
+        """Atraso cresce exponencialmente e respeita o teto."""
+        assert backoff_delay(1, base=2) <= 2
+        assert backoff_delay(3, base=2) > 4
+        assert backoff_delay(20, base=2, cap=10) <= 10
+        assert backoff_delay(5, base=0) == 0
+
+
+class TestImageQueueRoutes:
+    """Testes das rotas quando a fila está habilitada."""
+
+    def test_create_product_returns_job(self, app, client, mock_db, queue, admin_headers, sample_category):
+        """Criação com imagem responde 202 com placeholder e id do job."""
+        clear_all_caches()
+        mock_db.categories.insert_one(sample_category)
+        mock_db.counters.insert_one({"_id": "products", "seq": 0})
+        app.image_queue = queue
+        try:
+            data = {
+                "titulo": "Vestido Floral",
+                "descricao": "Vestido floral de verão em ótimo estado",
+                "preco": "89.90",
+                "categoria": sample_category["name"],
+                "image": (BytesIO(b"raw"), "foto.jpg"),
+            }
+            response = client.post("/api/products/with-image", data=data, headers=admin_headers,
+                                   content_type="multipart/form-data")
+        finally:
+            app.image_queue = None
+
+        assert response.status_code == 202
+        body = response.get_json()
+        assert body["product"]["imagem"] == IMAGE_PLACEHOLDER_URL
+        job = _wait_for(queue, body["image_job"]["job_id"])
+        assert job["status"] == JOB_DONE
+        assert mock_db.products.find_one({"id": body["product"]["id"]})["imagem"] == "https://cdn/a_1200"
+
+    def test_job_status_endpoint(self, app, client, queue):
+        """Status do job pode ser consultado por polling."""
+        job = queue.submit(b"raw", "foto.jpg", "image/jpeg", 99)
+        _wait_for(queue, job["job_id"])
+        app.image_queue = queue
+        try:
+            found = client.get(f"/api/images/jobs/{job['job_id']}")
+            missing = client.get("/api/images/jobs/inexistente")
+        finally:
+            app.image_queue = None
+
+        assert found.status_code == 200
+        assert found.get_json()["job_id"] == job["job_id"]
+        assert missing.status_code == 404
+
+    def test_placeholder_is_svg(self, client):
+        """Placeholder é servido como SVG cacheável."""
+        response = client.get("/api/images/placeholder")
+
+        assert response.status_code == 200
+        assert response.mimetype == "image/svg+xml"
+
+
+class TestStorageBackends:
+    """Testes para os backends local e em memória."""
+
+    def test_memory_backend_roundtrip(self, app):
+        """Upload, listagem e remoção funcionam sem rede."""
+        backend = MemoryStorageBackend()
+
+        success, paths = backend.upload_image_set(_make_upload(), 3)
+        assert success is True
+
+        _, listed = backend.list_product_images(3)
+        assert sorted(listed) == sorted(f"/api/images/files/{p}" for p in paths.values())
+
+        backend.delete_image_set(listed)
+        assert backend.list_product_images(3) == (True, [])
+
+    def test_backends_implement_all_primitives(self):
+        """A interface é abstrata; backends incompletos falham ao instanciar."""
+        class Incompleto(StorageBackend):
+            def _upload_bytes(self, path, data, mime_type):
+                return True, path
+
+        with pytest.raises(TypeError):
+            StorageBackend()
+        with pytest.raises(TypeError):
+            Incompleto()
+        for backend in (MemoryStorageBackend, LocalStorageBackend, SupabaseStorageService):
+            assert not backend.__abstractmethods__
+
+    def test_storage_path_shape(self):
+        """Só caminhos no formato gerado pelos backends contam como caminho do storage."""
+        for value in ("product_7/abc_480.webp", "product_1700000000000/abc.jpg", "3f2a9c.jpg"):
+            assert is_storage_path(value)
+        for value in ("qualquer coisa", "javascript:alert(1)", "product_7/../x.jpg", "a/b/c.jpg",
+                      "https://cdn/x.jpg", "/api/images/files/x.jpg", "product_x/a.jpg", ""):
+            assert not is_storage_path(value)
+        assert storage_path_product_id("product_7/abc_480.webp") == 7
+        assert storage_path_product_id("3f2a9c.jpg") is None
+
+    def test_single_upload_returns_storage_path(self, client, mocker):
+        """Upload avulso devolve o caminho (salvo no produto) e uma URL de pré-visualização."""
+        clear_all_caches()
+        backend = MemoryStorageBackend(base_url="https://cdn/files")
+        mocker.patch("app.controllers.images_controller.storage_service", backend)
+        mocker.patch("app.services.storage.storage_service", backend)
+
+        response = client.post(
+            "/api/images/upload",
+            data={"image": (_make_upload(), "foto.jpg"), "product_id": "5"},
+            content_type="multipart/form-data",
+        )
+
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data["image_url"].startswith("product_5/")
+        assert data["image_url"] in backend.objects
+        assert data["preview_url"] == f"https://cdn/files/{data['image_url']}"
+        clear_all_caches()
+
+    def test_local_backend_writes_files(self, tmp_path):
+        """Backend local grava as variações no diretório configurado."""
+        backend = LocalStorageBackend(root=str(tmp_path), base_url="https://cdn.exemplo.com/img")
+
+        success, paths = backend.upload_image_set(_make_upload(), 9)
+
+        assert success is True
+        for path in paths.values():
+            assert (tmp_path / path).is_file()
+            url = backend.sign_urls([path])[path]
+            assert url == f"https://cdn.exemplo.com/img/{path}"
+            assert backend._extract_path(url) == path
+        assert backend.get_image_info(paths["160"])["size"] > 0
+
+    def test_local_backend_rejects_traversal(self, tmp_path):
+        """Caminhos fora do diretório de storage são recusados."""
+        backend = LocalStorageBackend(root=str(tmp_path))
+
+        assert backend._extract_path("/api/images/files/../segredo") is None
+        assert backend.send("../segredo") is None
+
+    def test_files_route_supports_range(self, app, client, tmp_path, mocker):
+        """Arquivos locais são servidos com suporte a Range."""
+        backend = LocalStorageBackend(root=str(tmp_path))
+        backend._upload_bytes("product_1/a.webp", b"0123456789", "image/webp")
+        mocker.patch("app.controllers.images_controller.storage_service", backend)
+
+        full = client.get("/api/images/files/product_1/a.webp")
+        partial = client.get("/api/images/files/product_1/a.webp", headers={"Range": "bytes=2-5"})
+        missing = client.get("/api/images/files/product_1/b.webp")
+
+        assert full.status_code == 200
+        assert full.data == b"0123456789"
+        assert partial.status_code == 206
+        assert partial.data == b"2345"
+        assert missing.status_code == 404
+
+
+class TestSupabaseLazyClient:
+    """Testes para a criação sob demanda do cliente Supabase."""
+
+    def test_client_created_on_first_use(self, monkeypatch, mocker):
+        """Construir o serviço não cria cliente nem faz chamadas de rede."""
+        monkeypatch.setenv("SUPABASE_URL", "https://x.supabase.co")
+        monkeypatch.setenv("SUPABASE_KEY", "chave")
+        create_client = mocker.patch("supabase.create_client")
+
+        service = SupabaseStorageService()
+        assert create_client.call_count == 0
+        assert service.get_connection_status()["initialized"] is False
+
+        assert service.is_available() is True
+        service.is_available()
+        assert create_client.call_count == 1
+        create_client.return_value.storage.from_.assert_not_called()
+
+    def test_check_connection_is_cached(self, storage):
+        """O teste de conectividade roda uma vez dentro do TTL."""
+        bucket = storage.client.storage.from_.return_value
+
+        first = storage.check_connection()
+        storage.check_connection()
+
+        assert first["probe"]["bucket_accessible"] is True
+        assert bucket.list.call_count == 1
+
+        storage.check_connection(max_age=0)
+        assert bucket.list.call_count == 2
+
+
+class TestImageUrlResolver:
+    """Testes para a geração de URLs sob demanda."""
+
+    def test_bulk_signing_uses_single_call(self, storage):
+        """create_signed_urls assina o lote em uma única chamada."""
+        bucket = storage.client.storage.from_.return_value
+        bucket.create_signed_urls.return_value = [
+            {"path": "product_1/a_160.webp", "signedURL": "https://cdn/sign/a", "error": None},
+        ]
+
+        urls = storage.sign_urls(["product_1/a_160.webp", "product_1/b_160.webp"])
+
+        bucket.create_signed_urls.assert_called_once()
+        assert urls["product_1/a_160.webp"] == "https://cdn/sign/a"
+        assert urls["product_1/b_160.webp"] == "https://cdn/img"
+
+    def test_listing_signs_once_and_caches(self, client, mock_db, mocker):
+        """Listar produtos gera no máximo uma chamada de assinatura; a seguinte vem do cache."""
+        clear_all_caches()
+        backend = MemoryStorageBackend(base_url="https://cdn/files")
+        sign = mocker.spy(backend, "sign_urls")
+        mocker.patch("app.services.storage.storage_service", backend)
+        for pid in range(1, 4):
+            mock_db.products.insert_one({
+                "id": pid, "titulo": f"Produto {pid}", "categoria": "Roupas",
+                "imagem": f"product_{pid}/x_1200.webp",
+                "imagens": {"160": f"product_{pid}/x_160.webp"},
+            })
+        mock_db.products.insert_one({"id": 4, "titulo": "Antigo", "imagem": "https://legado/img.jpg"})
+
+        # Documentos sem status: a listagem padrão mostra só os disponíveis
+        first = client.get("/api/products/?status=todos").get_json()["items"]
+        client.get("/api/products/?status=todos")
+
+        assert sign.call_count == 1
+        by_id = {p["id"]: p for p in first}
+        assert by_id[1]["imagem"] == "https://cdn/files/product_1/x_1200.webp"
+        assert by_id[1]["imagens"]["160"] == "https://cdn/files/product_1/x_160.webp"
+        assert by_id[4]["imagem"] == "https://legado/img.jpg"
+        clear_all_caches()
+
+
+def _old_object(backend, path, hours=3):
+    """Grava um objeto no backend em memória com data antiga."""
+    backend._upload_bytes(path, b"img", "image/webp")
+    data, mime, _ = backend.objects[path]
+    backend.objects[path] = (data, mime, datetime.utcnow() - timedelta(hours=hours))
+
+
+class TestStorageMaintenance:
+    """Testes para a fila de remoção em lote e o GC de imagens órfãs."""
+
+    def test_deletion_queue_flushes_in_batches(self, mocker):
+        """Remoções acumuladas são enviadas em lotes de batch_size."""
+        backend = MemoryStorageBackend()
+        for i in range(250):
+            backend._upload_bytes(f"product_1/{i}.webp", b"x", "image/webp")
+        remove = mocker.spy(backend, "_remove_paths")
+        queue = DeletionQueue(backend, batch_size=100, flush_interval=0)
+
+        queue.enqueue([f"product_1/{i}.webp" for i in range(250)])
+        result = queue.flush()
+
+        assert result == {"deleted": 250, "failed": 0}
+        assert remove.call_count == 3
+        assert backend.objects == {}
+
+    def test_deletion_queue_retries_failed_batch(self, mocker):
+        """Lote que falha volta para a fila até o limite de tentativas."""
+        backend = MemoryStorageBackend()
+        mocker.patch.object(backend, "_remove_paths", return_value=(False, "erro"))
+        queue = DeletionQueue(backend, flush_interval=0, max_attempts=2)
+
+        queue.enqueue(["product_1/a.webp", "/api/images/files/product_1/b.webp"])
+        queue.flush()
+        assert queue.pending() == 2
+
+        assert queue.flush() == {"deleted": 0, "failed": 2}
+        assert queue.pending() == 0
+
+    def test_collect_orphans_dry_run_and_apply(self, mock_db):
+        """GC relata e remove objetos sem produto, preservando os referenciados e os recentes."""
+        backend = MemoryStorageBackend()
+        _old_object(backend, "product_1/atual_1200.webp")
+        _old_object(backend, "product_1/antiga_1200.webp")
+        _old_object(backend, "product_2/x_1200.webp")
+        backend._upload_bytes("product_1/nova_1200.webp", b"img", "image/webp")
+        mock_db.products.insert_one({"id": 1, "imagem": "product_1/atual_1200.webp", "imagens": {}})
+
+        report = collect_orphans(mock_db, backend, dry_run=True)
+
+        # product_2 foi excluído: seu prefixo inteiro é órfão
+        assert sorted(report["orphans"]) == ["product_1/antiga_1200.webp", "product_2/x_1200.webp"]
+        assert report["orphan_prefixes"] == ["product_2/"]
+        assert report["skipped_recent"] == 1
+        assert len(backend.objects) == 4
+
+        report = collect_orphans(mock_db, backend, dry_run=False)
+
+        assert report["deleted"] == 2
+        assert sorted(backend.objects) == ["product_1/atual_1200.webp", "product_1/nova_1200.webp"]
+
+    def test_collect_orphans_keeps_cross_prefix_references(self, mock_db):
+        """Imagens referenciadas sob outro prefixo são mantidas; uploads avulsos não salvos são recolhidos."""
+        backend = MemoryStorageBackend()
+        _old_object(backend, "product_1700000000000/abc.jpg")
+        _old_object(backend, "product_1700000000001/perdida.jpg")
+        _old_object(backend, "product_8/copiada_480.webp")
+        _old_object(backend, "product_8/velha_480.webp")
+        _old_object(backend, "product_8/avulsa.jpg")
+        _old_object(backend, "outros/logo.png")
+        mock_db.products.insert_one({
+            "id": 7, "imagem": "product_1700000000000/abc.jpg",
+            "imagens": {"480": "product_8/copiada_480.webp"},
+        })
+        mock_db.products.insert_one({"id": 8, "imagem": "https://legado/img.jpg", "imagens": {}})
+
+        report = collect_orphans(mock_db, backend, dry_run=False)
+
+        assert sorted(report["orphans"]) == [
+            "product_1700000000001/perdida.jpg", "product_8/avulsa.jpg", "product_8/velha_480.webp",
+        ]
+        assert report["prefixes_skipped"] == 1
+        assert sorted(backend.objects) == [
+            "outros/logo.png", "product_1700000000000/abc.jpg", "product_8/copiada_480.webp",
+        ]
+
+    def test_gc_endpoint_requires_admin(self, client, admin_headers, mocker):
+        """Endpoint de GC exige admin e retorna o relatório."""
+        mocker.patch("app.controllers.images_controller.storage_service", MemoryStorageBackend())
+        assert client.post("/api/images/gc").status_code == 401
+
+        response = client.post("/api/images/gc", json={"dry_run": True}, headers=admin_headers)
+
+        assert response.status_code == 200
+        assert response.get_json()["dry_run"] is True
@@ -221,6 +221,116 @@ class TestOrderStatusUpdate:
         assert response.status_code == 404
 
 
+class TestOrderBulkStatusUpdate:
+    """Testes para atualização de status em lote."""
+    
+    def _insert_orders(self, mock_db, sample_order, statuses):
+        for order_id, status in enumerate(statuses, start=1):
+            mock_db["orders"].insert_one({**sample_order, "id": order_id, "user_id": order_id, "status": status})
+            mock_db["users"].insert_one({"id": order_id, "nome": f"Cliente {order_id}", "email": f"c{order_id}@test.com"})
+    
+    def test_bulk_update_and_notify(self, client, mock_db, sample_order, admin_headers, mocker):
+        """Atualiza vários pedidos e notifica apenas os que mudaram."""
+        self._insert_orders(mock_db, sample_order, ["confirmado", "confirmado", "enviado"])
+        notify = mocker.patch(
+            "app.controllers.order_controller.send_order_status_notifications",
+            side_effect=lambda items: [
+                {"order_id": n["order_id"], "email": n["to_email"], "sent": True,
+                 "mail_id": f"mail-{n['order_id']}", "error": None}
+                for n in items
+            ],
+        )
+        
+        response = client.put(
+            "/api/orders/status",
+            data=json.dumps({"order_ids": [1, 2, 3, 99], "status": "enviado"}),
+            content_type="application/json",
+            headers=admin_headers,
+        )
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["updated"] == [1, 2]
+        assert data["unchanged"] == [3]
+        assert data["not_found"] == [99]
+        assert [n["email"] for n in data["notifications"]] == ["c1@test.com", "c2@test.com"]
+        notify.assert_called_once()
+        
+        orders = {o["id"]: o for o in mock_db["orders"].data}
+        assert orders[1]["status"] == "enviado"
+        assert orders[1]["status_notification"]["sent"] is True
+        assert orders[1]["status_notification"]["mail_id"] == "mail-1"
+        assert orders[2]["status_notification"]["mail_id"] == "mail-2"
+        assert "status_notification" not in orders[3]
+    
+    def test_bulk_update_reports_only_changed_orders(self, client, mock_db, sample_order, admin_headers, mocker):
+        """Pedido alterado por outro processo entre a leitura e o update não é notificado."""
+        self._insert_orders(mock_db, sample_order, ["confirmado", "confirmado"])
+        notify = mocker.patch(
+            "app.controllers.order_controller.send_order_status_notifications",
+            side_effect=lambda items: [
+                {"order_id": n["order_id"], "email": n["to_email"], "sent": True, "mail_id": None, "error": None}
+                for n in items
+            ],
+        )
+        orders = mock_db["orders"]
+        update_many = orders.update_many
+        def concurrent_update(*args, **kwargs):
+            orders.find_one({"id": 2}).update(status="enviado", updated_at=datetime(2020, 1, 1))
+            return update_many(*args, **kwargs)
+        mocker.patch.object(orders, "update_many", side_effect=concurrent_update)
+        
+        response = client.put(
+            "/api/orders/status",
+            json={"order_ids": [1, 2], "status": "enviado"},
+            headers=admin_headers,
+        )
+        
+        data = response.get_json()
+        assert data["updated"] == [1]
+        assert data["unchanged"] == [2]
+        assert [n["order_id"] for n in notify.call_args[0][0]] == [1]
+        assert "status_notification" not in orders.find_one({"id": 2})
+    
+    def test_bulk_update_without_notification(self, client, mock_db, sample_order, admin_headers, mocker):
+        """Com notify=false nenhum email é enviado."""
+        self._insert_orders(mock_db, sample_order, ["confirmado"])
+        notify = mocker.patch("app.controllers.order_controller.send_order_status_notifications")
+        
+        response = client.put(
+            "/api/orders/status",
+            data=json.dumps({"order_ids": [1], "status": "em_preparacao", "notify": False}),
+            content_type="application/json",
+            headers=admin_headers,
+        )
+        
+        assert response.status_code == 200
+        assert response.get_json()["notifications"] == []
+        notify.assert_not_called()
+    
+    def test_bulk_update_invalid_payload(self, client, mock_db, admin_headers):
+        """IDs e status são validados."""
+        for payload in ({"order_ids": [1], "status": "invalido"}, {"order_ids": [], "status": "enviado"},
+                        {"order_ids": ["1"], "status": "enviado"}):
+            response = client.put(
+                "/api/orders/status",
+                data=json.dumps(payload),
+                content_type="application/json",
+                headers=admin_headers,
+            )
+            assert response.status_code == 400
+    
+    def test_bulk_update_requires_admin(self, client, mock_db):
+        """Sem token de administrador a rota é negada."""
+        response = client.put(
+            "/api/orders/status",
+            data=json.dumps({"order_ids": [1], "status": "enviado"}),
+            content_type="application/json",
+        )
+        
+        assert response.status_code == 401
+
+
 class TestOrderCancel:
     """Testes para cancelamento de pedidos."""
     
@@ -197,6 +197,74 @@ class TestProductUpdate:
         assert response.status_code == 200
 
 
+class TestProductImageUpdate:
+    """Testes para troca de imagem via PUT."""
+
+    @pytest.fixture(autouse=True)
+    def memory_storage(self, mocker):
+        from app.services.storage_backend import MemoryStorageBackend
+        mocker.patch("app.services.storage.storage_service", MemoryStorageBackend())
+
+    def test_new_imagem_drops_old_variants(self, client, mock_db, sample_product, sample_category,
+                                           admin_headers, mocker):
+        schedule = mocker.patch("app.routes.products_routes.schedule_image_deletion")
+        mock_db["products"].insert_one({
+            **sample_product,
+            "imagem": "product_1/old_1200.webp",
+            "imagens": {"160": "product_1/old_160.webp", "1200": "product_1/old_1200.webp"},
+        })
+        mock_db["categories"].insert_one(sample_category)
+
+        response = client.put("/api/products/1", json={"imagem": "product_1/nova.jpg"}, headers=admin_headers)
+
+        assert response.status_code == 200
+        stored = mock_db["products"].find_one({"id": 1})
+        assert stored["imagem"] == "product_1/nova.jpg"
+        assert "imagens" not in stored
+        assert sorted(schedule.call_args[0][0]) == ["product_1/old_1200.webp", "product_1/old_160.webp"]
+
+    def test_same_imagem_keeps_variants(self, client, mock_db, sample_product, sample_category,
+                                        admin_headers, mocker):
+        schedule = mocker.patch("app.routes.products_routes.schedule_image_deletion")
+        variants = {"160": "product_1/old_160.webp"}
+        mock_db["products"].insert_one({**sample_product, "imagem": "product_1/old_1200.webp", "imagens": variants})
+        mock_db["categories"].insert_one(sample_category)
+
+        response = client.put("/api/products/1", json={"titulo": "Novo título"}, headers=admin_headers)
+
+        assert response.status_code == 200
+        assert mock_db["products"].find_one({"id": 1})["imagens"] == variants
+        schedule.assert_not_called()
+
+
+    def test_rejects_other_products_image(self, client, mock_db, sample_product, sample_category,
+                                          admin_headers, mocker):
+        schedule = mocker.patch("app.routes.products_routes.schedule_image_deletion")
+        mock_db["products"].insert_one({**sample_product, "imagem": "product_1/atual.jpg"})
+        mock_db["categories"].insert_one(sample_category)
+
+        for imagem in ("product_9/x.webp", "javascript:alert(1)", "qualquer coisa"):
+            response = client.put("/api/products/1", json={"imagem": imagem}, headers=admin_headers)
+            assert response.status_code == 400
+            assert "imagem" in response.get_json()["errors"]
+        assert mock_db["products"].find_one({"id": 1})["imagem"] == "product_1/atual.jpg"
+        schedule.assert_not_called()
+
+    def test_legacy_prefix_kept_and_not_deleted(self, client, mock_db, sample_product, sample_category,
+                                                admin_headers, mocker):
+        schedule = mocker.patch("app.routes.products_routes.schedule_image_deletion")
+        mock_db["products"].insert_one({**sample_product, "imagem": "product_1700000000000/antiga.jpg"})
+        mock_db["categories"].insert_one(sample_category)
+
+        # Editar outro campo não invalida o caminho já salvo
+        assert client.put("/api/products/1", json={"titulo": "Novo título"}, headers=admin_headers).status_code == 200
+
+        # Trocar a imagem não remove objetos de outro prefixo (ficam para o GC)
+        assert client.put("/api/products/1", json={"imagem": "product_1/nova.jpg"},
+                          headers=admin_headers).status_code == 200
+        schedule.assert_not_called()
+
+
 class TestProductDelete:
     """Testes para exclusão de produtos."""
     
@@ -232,3 +300,364 @@ class TestProductsByCategory:
         
         # Retorna 404 quando não há produtos
         assert response.status_code == 404
+
+
+class TestProductCreateWithImage:
+    """Testes para criação de produto com upload de imagem."""
+    
+    @pytest.fixture
+    def image_upload(self):
+        """Retorna arquivo de imagem JPEG pequeno."""
+        from io import BytesIO
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new("RGB", (50, 50), (10, 20, 30)).save(buffer, format="JPEG")
+        buffer.seek(0)
+        return buffer
+    
+    @pytest.fixture
+    def form_data(self):
+        """Retorna campos de formulário válidos."""
+        return {
+            "titulo": "Vestido Floral",
+            "descricao": "Vestido floral de seda em ótimo estado",
+            "preco": "120.00",
+            "categoria": "Roupas",
+        }
+    
+    def _prepare_db(self, mock_db, sample_category):
+        from app.utils.cache import clear_all_caches
+        clear_all_caches()
+        mock_db["counters"].insert_one({"name": "products", "seq": 6})
+        mock_db["categories"].insert_one(sample_category)
+    
+    def test_uploads_once_under_real_id(self, client, mock_db, sample_category,
+                                        admin_headers, image_upload, form_data, mocker):
+        """Imagem é enviada uma única vez, já no prefixo do id definitivo."""
+        self._prepare_db(mock_db, sample_category)
+        upload = mocker.patch(
+            "app.routes.products_routes.storage_service.upload_image_set",
+            return_value=(True, {"160": "https://cdn/p7_160.webp", "1200": "https://cdn/p7_1200.webp"}),
+        )
+        delete = mocker.patch("app.routes.products_routes.storage_service.delete_image_set")
+        
+        response = client.post(
+            "/api/products/with-image",
+            data={**form_data, "image": (image_upload, "foto.jpg", "image/jpeg")},
+            content_type="multipart/form-data",
+            headers=admin_headers,
+        )
+        
+        assert response.status_code == 201
+        upload.assert_called_once()
+        assert upload.call_args.args[1] == 7
+        delete.assert_not_called()
+        product = response.get_json()["product"]
+        assert product["id"] == 7
+        assert product["imagem"] == "https://cdn/p7_1200.webp"
+        assert product["imagens"]["160"] == "https://cdn/p7_160.webp"
+    
+    def test_invalid_product_skips_upload(self, client, mock_db, sample_category,
+                                          admin_headers, image_upload, form_data, mocker):
+        """Produto inválido é rejeitado antes de qualquer upload."""
+        self._prepare_db(mock_db, sample_category)
+        upload = mocker.patch("app.routes.products_routes.storage_service.upload_image_set")
+        form_data["descricao"] = "curta"
+        
+        response = client.post(
+            "/api/products/with-image",
+            data={**form_data, "image": (image_upload, "foto.jpg", "image/jpeg")},
+            content_type="multipart/form-data",
+            headers=admin_headers,
+        )
+        
+        assert response.status_code == 400
+        upload.assert_not_called()
+    
+    def test_rejects_oversized_image(self, client, mock_db, sample_category,
+                                     admin_headers, form_data, mocker):
+        """Arquivos acima de 5MB são recusados."""
+        from io import BytesIO
+        self._prepare_db(mock_db, sample_category)
+        upload = mocker.patch("app.routes.products_routes.storage_service.upload_image_set")
+        big_file = BytesIO(b"\0" * (5 * 1024 * 1024 + 1))
+        
+        response = client.post(
+            "/api/products/with-image",
+            data={**form_data, "image": (big_file, "foto.jpg", "image/jpeg")},
+            content_type="multipart/form-data",
+            headers=admin_headers,
+        )
+        
+        assert response.status_code == 400
+        assert "5MB" in response.get_json()["errors"]["image"]
+        upload.assert_not_called()
+
+
+class TestProductSearch:
+    """Testes para a busca com filtros, facetas e cache."""
+
+    @pytest.fixture
+    def catalog(self, mock_db, sample_product):
+        products = [
+            {"id": 1, "titulo": "Vestido Floral", "preco": 40.0, "categoria": "Roupas", "tamanho": "M", "marca": "Farm"},
+            {"id": 2, "titulo": "Bolsa Couro", "preco": 150.0, "categoria": "Bolsas", "tamanho": "U", "marca": "Arezzo"},
+            {"id": 3, "titulo": "Vestido Longo", "preco": 90.0, "categoria": "Roupas", "tamanho": "G", "marca": "Farm",
+             "status": "vendido"},
+        ]
+        for overrides in products:
+            mock_db["products"].insert_one({**sample_product, **overrides})
+        return mock_db
+
+    def _ids(self, response):
+        return sorted(item["id"] for item in response.get_json()["items"])
+
+    def test_filters_by_price_range(self, client, catalog):
+        response = client.get("/api/products?preco_min=50&preco_max=200&status=todos")
+
+        assert response.status_code == 200
+        assert self._ids(response) == [2, 3]
+        assert response.get_json()["pagination"]["total"] == 2
+
+    def test_filters_by_status_size_and_brand(self, client, catalog):
+        assert self._ids(client.get("/api/products?status=disponivel")) == [1, 2]
+        assert self._ids(client.get("/api/products?tamanho=M,G&status=todos")) == [1, 3]
+        assert self._ids(client.get("/api/products?marca=Farm&status=disponivel")) == [1]
+
+    def test_rejects_inverted_price_range(self, client, catalog):
+        response = client.get("/api/products?preco_min=100&preco_max=10")
+
+        assert response.status_code == 400
+        assert "preco_min" in response.get_json()["errors"]
+
+    def test_text_search_uses_configured_language(self, catalog):
+        from app.services.product_search import build_filters, normalize_search_params
+
+        params = normalize_search_params({"q": "  Vestido   LONGO ", "marca": "Farm"})
+        base, category, price = build_filters(params)
+
+        assert params["q"] == "vestido longo"
+        assert params["sort"] == "relevancia"
+        assert base["$text"] == {"$search": "vestido longo", "$language": "portuguese"}
+        assert base["marca"] == "Farm"
+        assert category == {} and price == {}
+
+    def test_results_are_cached_until_product_write(self, client, catalog, admin_headers):
+        client.get("/api/products?categoria=Roupas")
+        catalog["products"].data.append({"id": 9, "titulo": "Saia", "categoria": "Roupas", "preco": 10.0,
+                                         "status": "disponivel"})
+
+        # Escrita direta no banco não invalida: resultado servido do cache
+        assert self._ids(client.get("/api/products?categoria=Roupas")) == [1]
+
+        client.delete("/api/products/2", headers=admin_headers)
+        assert self._ids(client.get("/api/products?categoria=Roupas")) == [1, 9]
+
+    def test_facets_come_from_one_aggregation(self, client, catalog):
+        from unittest.mock import patch
+
+        facet_result = [{
+            "items": [{"id": 1, "titulo": "Vestido Floral", "categoria": "Roupas"}],
+            "total": [{"count": 1}],
+            "categorias": [{"_id": "Roupas", "count": 2}, {"_id": "Bolsas", "count": 1}],
+            "precos": [{"_id": 0.0, "count": 1}, {"_id": 50.0, "count": 1}, {"_id": "acima", "count": 1}],
+        }]
+        with patch.object(type(catalog["products"]), "aggregate", create=True,
+                          return_value=iter(facet_result)) as aggregate:
+            response = client.get("/api/products?facets=1&categoria=Roupas&preco_max=100")
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["pagination"]["total"] == 1
+        assert data["facets"]["categorias"][0] == {"categoria": "Roupas", "count": 2}
+        assert data["facets"]["precos"] == [
+            {"min": 0.0, "max": 50.0, "count": 1},
+            {"min": 50.0, "max": 100.0, "count": 1},
+            {"min": 500.0, "max": None, "count": 1},
+        ]
+
+        pipeline = aggregate.call_args[0][0]
+        facet = pipeline[-1]["$facet"]
+        # A faceta de categoria ignora o próprio filtro e a de preço ignora o filtro de preço
+        assert facet["categorias"][0] == {"$match": {"preco": {"$lte": 100.0}}}
+        assert facet["precos"][0] == {"$match": {"categoria": "Roupas"}}
+        assert facet["items"][0] == {"$match": {"categoria": "Roupas", "preco": {"$lte": 100.0}}}
+
+
+class TestProductSuggest:
+    """Testes para o autocomplete em memória."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_index(self):
+        from app.services.autocomplete import suggestion_index
+        suggestion_index.rebuild([])
+        suggestion_index.loaded = False
+        yield suggestion_index
+
+    @pytest.fixture
+    def catalog(self, mock_db, sample_product):
+        products = [
+            {"id": 1, "titulo": "Vestido Floral", "categoria": "Roupas"},
+            {"id": 2, "titulo": "Vestido Longo de Seda", "categoria": "Roupas"},
+            {"id": 3, "titulo": "Bolsa de Couro", "categoria": "Bolsas"},
+            {"id": 4, "titulo": "Vestido Vendido", "categoria": "Roupas", "status": "vendido"},
+        ]
+        for overrides in products:
+            mock_db["products"].insert_one({**sample_product, **overrides})
+        return mock_db
+
+    def _suggest(self, client, prefix, **params):
+        response = client.get("/api/products/suggest", query_string={"prefix": prefix, **params})
+        assert response.status_code == 200
+        return response.get_json()["suggestions"]
+
+    def test_prefix_match_skips_sold_products(self, client, catalog):
+        suggestions = self._suggest(client, "ves")
+
+        assert [s["id"] for s in suggestions] == [1, 2]
+        assert all(s["tipo"] == "produto" for s in suggestions)
+
+    def test_matches_categories_and_accents(self, client, catalog):
+        suggestions = self._suggest(client, "BÓL")
+
+        assert suggestions[0] == {"tipo": "categoria", "texto": "Bolsas"}
+        assert {"tipo": "produto", "texto": "Bolsa de Couro", "id": 3} in suggestions
+
+    def test_tolerates_typos(self, client, catalog):
+        assert [s["id"] for s in self._suggest(client, "vetsido")] == [1, 2]
+        assert [s["id"] for s in self._suggest(client, "vestido sed")] == [2]
+
+    def test_limit_and_validation(self, client, catalog):
+        assert len(self._suggest(client, "vestido", limit=1)) == 1
+        assert client.get("/api/products/suggest").status_code == 400
+        assert client.get("/api/products/suggest?prefix=a&limit=500").status_code == 400
+
+    def test_incremental_updates(self, fresh_index):
+        fresh_index.rebuild([{"id": 1, "titulo": "Saia Jeans", "categoria": "Roupas"}])
+        nodes_before = fresh_index.stats()["nodes"]
+
+        fresh_index.add_product({"id": 2, "titulo": "Sapato Social", "categoria": "Calçados"})
+        assert [s["texto"] for s in fresh_index.suggest("sa")] == ["Saia Jeans", "Sapato Social"]
+        assert fresh_index.suggest("calc") == [{"tipo": "categoria", "texto": "Calçados"}]
+
+        fresh_index.add_product({"id": 2, "titulo": "Sapato Social", "categoria": "Calçados", "status": "vendido"})
+        assert fresh_index.suggest("sapato") == []
+        assert fresh_index.suggest("calc") == []
+        # Nós das palavras removidas são liberados
+        assert fresh_index.stats()["nodes"] == nodes_before
+
+
+class TestSoldProducts:
+    """Testes para a listagem padrão sem vendidos e o arquivamento."""
+
+    @pytest.fixture
+    def catalog(self, mock_db, sample_product):
+        from datetime import timedelta
+        now = datetime.utcnow()
+        products = [
+            {"id": 1, "titulo": "Vestido Floral"},
+            {"id": 2, "titulo": "Vestido Antigo", "status": "vendido", "vendido_em": now - timedelta(days=40)},
+            {"id": 3, "titulo": "Vestido Recente", "status": "vendido", "vendido_em": now - timedelta(days=1)},
+            {"id": 4, "titulo": "Vestido Legado", "status": "vendido"},
+        ]
+        for overrides in products:
+            mock_db["products"].insert_one({**sample_product, **overrides})
+        return mock_db
+
+    def _ids(self, response):
+        return sorted(item["id"] for item in response.get_json()["items"])
+
+    def test_listing_defaults_to_available(self, client, catalog):
+        response = client.get("/api/products")
+
+        assert self._ids(response) == [1]
+        assert response.get_json()["pagination"]["total"] == 1
+        assert self._ids(client.get("/api/products?status=vendido")) == [2, 3, 4]
+        assert self._ids(client.get("/api/products?status=todos")) == [1, 2, 3, 4]
+        assert self._ids(client.get("/api/products/category/Roupas")) == [1]
+        assert self._ids(client.get("/api/products/category/Roupas?status=todos")) == [1, 2, 3, 4]
+
+    def test_archives_only_old_sales(self, catalog):
+        from app.services.product_archive import archive_sold_products
+
+        report = archive_sold_products(catalog)
+
+        assert report["archived"] == 2
+        assert sorted(p["id"] for p in catalog["products"].data) == [1, 3]
+        archived = catalog["products_archive"].data
+        assert sorted(p["id"] for p in archived) == [2, 4]
+        assert all("arquivado_em" in p for p in archived)
+        # Segunda execução não tem o que mover
+        assert archive_sold_products(catalog)["archived"] == 0
+
+    def test_cancel_during_archive_drops_archive_copy(self, catalog, mocker):
+        from app.services.product_archive import archive_sold_products
+        products = catalog["products"]
+
+        # Pedido cancelado entre a cópia para o arquivo e a remoção da coleção principal
+        delete_many = products.delete_many
+        def cancel_then_delete(query, *args, **kwargs):
+            products.find_one({"id": 2})["status"] = "disponivel"
+            return delete_many(query, *args, **kwargs)
+        mocker.patch.object(products, "delete_many", side_effect=cancel_then_delete)
+
+        report = archive_sold_products(catalog)
+
+        assert report["archived"] == 1
+        assert products.find_one({"id": 2})["status"] == "disponivel"
+        assert [p["id"] for p in catalog["products_archive"].data] == [4]
+
+    def test_archived_product_still_served_by_id(self, client, catalog):
+        from app.services.product_archive import archive_sold_products
+        archive_sold_products(catalog)
+
+        response = client.get("/api/products/2")
+
+        assert response.status_code == 200
+        assert response.get_json()["status"] == "vendido"
+
+    def test_restore_on_cancel(self, catalog):
+        from app.services.product_archive import archive_sold_products, restore_archived_product
+        archive_sold_products(catalog)
+
+        assert restore_archived_product(catalog, 2) is True
+        restored = catalog["products"].find_one({"id": 2})
+        assert restored["status"] == "disponivel"
+        assert "vendido_em" not in restored and "arquivado_em" not in restored
+        assert catalog["products_archive"].find_one({"id": 2}) is None
+        assert restore_archived_product(catalog, 2) is False
+
+    def test_gc_keeps_archived_images(self, catalog):
+        from unittest.mock import MagicMock
+        from app.services.product_archive import archive_sold_products
+        from app.services.storage_maintenance import referenced_paths
+
+        catalog["products"].find_one({"id": 2})["imagem"] = "product_2/x_800.webp"
+        archive_sold_products(catalog)
+
+        references = referenced_paths(catalog, MagicMock())
+
+        assert references[2] == {"product_2/x_800.webp"}
+
+    def test_put_status_tracks_vendido_em(self, client, catalog, sample_category, admin_headers, mocker):
+        from app.services.storage_backend import MemoryStorageBackend
+        mocker.patch("app.services.storage.storage_service", MemoryStorageBackend())
+        catalog["categories"].insert_one(sample_category)
+
+        assert client.put("/api/products/1", json={"status": "vendido"}, headers=admin_headers).status_code == 200
+        sold_at = catalog["products"].find_one({"id": 1})["vendido_em"]
+        assert isinstance(sold_at, datetime)
+
+        # Editar um produto já vendido mantém a data da venda
+        client.put("/api/products/1", json={"titulo": "Vestido Floral Novo"}, headers=admin_headers)
+        assert catalog["products"].find_one({"id": 1})["vendido_em"] == sold_at
+
+        client.put("/api/products/1", json={"status": "disponivel"}, headers=admin_headers)
+        assert "vendido_em" not in catalog["products"].find_one({"id": 1})
+
+    def test_rejects_unknown_status(self, client, catalog):
+        assert client.get("/api/products?status=foo").status_code == 400
+        response = client.get("/api/products/category/Roupas?status=foo")
+        assert response.status_code == 400
+        assert "status" in response.get_json()["errors"]
+        assert self._ids(client.get("/api/products/category/Roupas?status=disponivel,vendido")) == [1, 2, 3, 4]
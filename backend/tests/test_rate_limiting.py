@@ -0,0 +1,134 @@
+"""
+Testes para o rate limiting (storage em lote e limites por blueprint).
+"""
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app import create_app
+from app.services.rate_limiting import BatchedMongoStorage, apply_blueprint_limits
+from tests.conftest import MockDatabase
+
+
+class TestBatchedMongoStorage:
+    """Testes para o storage de contadores com envio em lote."""
+
+    def test_incr_counts_locally_without_collection(self):
+        storage = BatchedMongoStorage(flush_interval=0)
+
+        assert storage.incr("k", 60) == 1
+        assert storage.incr("k", 60) == 2
+        assert storage.get("k") == 2
+        assert storage.get_expiry("k") > time.time()
+        assert storage.flush() == 0
+
+    def test_incr_does_not_touch_database(self):
+        collection = MagicMock()
+        storage = BatchedMongoStorage(collection=collection, flush_interval=0)
+
+        started = time.perf_counter()
+        for _ in range(1000):
+            storage.incr("k", 60)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        collection.bulk_write.assert_not_called()
+        collection.find_one_and_update.assert_not_called()
+        assert elapsed_ms / 1000 < 1
+
+    def test_flush_sends_one_bulk_write(self):
+        collection = MagicMock()
+        collection.find.return_value = [
+            {"_id": "a", "count": 7, "expire_at": None},
+            {"_id": "b", "count": 1, "expire_at": None},
+        ]
+        storage = BatchedMongoStorage(collection=collection, flush_interval=0)
+
+        for _ in range(5):
+            storage.incr("a", 60)
+        storage.incr("b", 60)
+
+        assert storage.flush() == 2
+        collection.bulk_write.assert_called_once()
+        ops = collection.bulk_write.call_args[0][0]
+        assert len(ops) == 2
+        assert collection.bulk_write.call_args[1]["ordered"] is False
+
+        # Base local passa a refletir o valor global (outros workers incluídos)
+        assert storage.get("a") == 7
+        assert storage.incr("a", 60) == 8
+
+        # Só as chaves com hits pendentes são enviadas
+        collection.bulk_write.reset_mock()
+        assert storage.flush() == 1
+        assert len(collection.bulk_write.call_args[0][0]) == 1
+        collection.bulk_write.reset_mock()
+        assert storage.flush() == 0
+        collection.bulk_write.assert_not_called()
+
+    def test_flush_error_keeps_counting(self):
+        collection = MagicMock()
+        collection.bulk_write.side_effect = Exception("down")
+        storage = BatchedMongoStorage(collection=collection, flush_interval=0)
+
+        storage.incr("k", 60)
+        assert storage.flush() == 0
+        assert storage.stats["errors"] == 1
+        assert storage.incr("k", 60) == 2
+
+    def test_counter_resets_after_expiry(self):
+        storage = BatchedMongoStorage(flush_interval=0)
+
+        storage.incr("k", 60)
+        with patch("app.services.rate_limiting.time.time", return_value=time.time() + 61):
+            assert storage.get("k") == 0
+            assert storage.incr("k", 60) == 1
+
+    def test_lazy_collection_is_resolved_on_flush(self):
+        collection = MagicMock()
+        collection.find.return_value = []
+        source = MagicMock(return_value=collection)
+        storage = BatchedMongoStorage(collection_factory=source, flush_interval=0)
+
+        storage.incr("k", 60)
+        source.assert_not_called()
+        storage.flush()
+        collection.create_index.assert_called_once()
+        collection.bulk_write.assert_called_once()
+
+
+class TestBlueprintLimits:
+    """Testes para limites configurados por blueprint."""
+
+    @pytest.fixture
+    def limited_app(self):
+        env = {"MONGODB_URI": "", "RATELIMIT_CATEGORIES": "2 per minute"}
+        with patch.dict(os.environ, env):
+            test_app = create_app()
+        test_app.db = MockDatabase()
+        test_app.config["TESTING"] = True
+        return test_app
+
+    def test_blueprint_limit_from_env(self, limited_app):
+        if limited_app.limiter is None:
+            pytest.skip("Flask-Limiter não instalado")
+        client = limited_app.test_client()
+
+        statuses = [client.get("/api/categories").status_code for _ in range(3)]
+
+        assert statuses[-1] == 429
+        assert 429 not in statuses[:2]
+
+    def test_health_is_exempt_by_default(self):
+        limiter = MagicMock()
+        app = MagicMock()
+        health, users = MagicMock(), MagicMock()
+        app.blueprints = {"health": health, "users": users}
+
+        with patch.dict(os.environ, {"RATELIMIT_USERS": "10 per minute"}):
+            applied = apply_blueprint_limits(limiter, app)
+
+        assert applied == {"health": "exempt", "users": "10 per minute"}
+        limiter.exempt.assert_called_once_with(health)
+        limiter.limit.assert_called_once_with("10 per minute")
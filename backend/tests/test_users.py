@@ -4,6 +4,7 @@ Testes para rotas de usuários.
 import pytest
 import json
 from datetime import datetime
+from unittest.mock import MagicMock, patch
 
 
 class TestUsersList:
@@ -284,3 +285,177 @@ class TestUserInfo:
         
         # Pode retornar 200 ou 401 dependendo da implementação
         assert response.status_code in [200, 401, 404]
+
+
+class TestUserSearch:
+    """Testes para a busca de usuários por prefixo."""
+
+    def test_build_name_tokens_normalizes_accents(self):
+        from app.models.user_model import build_name_tokens
+
+        assert build_name_tokens("  João da Silva-Araújo ") == ["joao", "da", "silva", "araujo"]
+
+    def test_single_term_uses_anchored_prefix(self):
+        from app.models.user_model import build_search_filter
+
+        query = build_search_filter("Jo.ão*")
+
+        assert query == {"$or": [
+            {"nome_tokens": {"$regex": r"^jo\.ao\*"}},
+            {"email": {"$regex": r"^jo\.ao\*"}},
+        ]}
+
+    def test_multiple_words_use_text_index(self):
+        from app.models.user_model import build_search_filter
+
+        assert build_search_filter("maria  silva") == {"$text": {"$search": '"maria" "silva"'}}
+        assert build_search_filter("   ") == {}
+
+    def test_update_refreshes_name_tokens(self):
+        from app.models.user_model import prepare_user_update
+
+        update = prepare_user_update({"nome": "Ana Luíza"})
+
+        assert update["nome_tokens"] == ["ana", "luiza"]
+        assert "nome_tokens" not in prepare_user_update({"telefone": "11999999999"})
+
+    def test_search_endpoint_matches_prefix(self, client, mock_db, sample_user, admin_headers):
+        mock_db["users"].insert_one({**sample_user, "nome_tokens": ["usuario", "teste"]})
+        mock_db["users"].insert_one({
+            **sample_user, "id": 3, "nome": "Outra Pessoa", "email": "outra@email.com",
+            "nome_tokens": ["outra", "pessoa"],
+        })
+
+        by_name = client.get("/api/users?search=Tes", headers=admin_headers).get_json()
+        by_email = client.get("/api/users?search=outra@", headers=admin_headers).get_json()
+
+        assert [u["id"] for u in by_name["items"]] == [1]
+        assert "nome_tokens" not in by_name["items"][0]
+        assert [u["id"] for u in by_email["items"]] == [3]
+
+
+class TestUserListPagination:
+    """Testes para a listagem paginada de usuários."""
+
+    @pytest.fixture
+    def many_users(self, mock_db, sample_user):
+        from datetime import timedelta
+        base = datetime(2024, 1, 1)
+        # Inseridos do mais recente para o mais antigo (ordem da listagem)
+        for i in range(5, 0, -1):
+            mock_db["users"].insert_one({
+                **sample_user, "id": i, "email": f"u{i}@email.com",
+                "reset_token": "segredo",
+                "data_criacao": base + timedelta(minutes=i // 2),
+            })
+
+    def test_cursor_pages_through_all_users(self, client, many_users, admin_headers):
+        first = client.get("/api/users?cursor=&page_size=2", headers=admin_headers).get_json()
+        assert [u["id"] for u in first["items"]] == [5, 4]
+        assert "total" not in first["pagination"]
+
+        second = client.get(
+            f"/api/users?cursor={first['pagination']['next_cursor']}&page_size=2", headers=admin_headers
+        ).get_json()
+        assert [u["id"] for u in second["items"]] == [3, 2]
+
+        third = client.get(
+            f"/api/users?cursor={second['pagination']['next_cursor']}&page_size=2", headers=admin_headers
+        ).get_json()
+        assert [u["id"] for u in third["items"]] == [1]
+        assert third["pagination"]["next_cursor"] is None
+
+    def test_invalid_cursor_returns_400(self, client, many_users, admin_headers):
+        response = client.get("/api/users?cursor=invalido", headers=admin_headers)
+
+        assert response.status_code == 400
+
+    def test_page_size_is_capped(self, client, mock_db, admin_headers):
+        response = client.get("/api/users?page_size=100000", headers=admin_headers)
+
+        assert response.get_json()["pagination"]["page_size"] == 100
+
+    def test_listing_uses_projection_without_secrets(self, client, mock_db, admin_headers):
+        from app.models.user_model import USER_LIST_PROJECTION
+
+        find = MagicMock(wraps=mock_db["users"].find)
+        with patch.object(mock_db["users"], "find", find):
+            client.get("/api/users", headers=admin_headers)
+
+        projection = find.call_args[0][1]
+        assert projection == USER_LIST_PROJECTION
+        for secret in ("senha_hash", "token_confirmacao", "reset_token", "deletion_code"):
+            assert secret not in projection
+
+
+class TestUserSummary:
+    """Testes para o resumo materializado de usuários."""
+
+    def _group(self, users):
+        counts = {}
+        for user in users:
+            key = (user["tipo"], user["ativo"])
+            counts[key] = counts.get(key, 0) + 1
+        return [{"_id": {"tipo": t, "ativo": a}, "count": c} for (t, a), c in counts.items()]
+
+    def test_summary_reconciles_once_then_reads_counters(self, client, mock_db, sample_user):
+        users = mock_db["users"]
+        users.insert_one(sample_user)
+        users.insert_one({**sample_user, "id": 2, "email": "b@email.com", "ativo": False})
+        users.aggregate = MagicMock(side_effect=lambda pipeline: self._group(users.data))
+
+        data = client.get("/api/users/summary").get_json()
+        assert data["summary"] == {"Administrador": 0, "Cliente": 1}
+        assert data["inactive"]["Cliente"] == 1
+        assert data["total"] == 1
+        assert data["reconciled_at"] is not None
+
+        client.get("/api/users/summary")
+        users.aggregate.assert_called_once()
+
+    def test_counters_follow_user_changes(self, client, mock_db, sample_user):
+        from app.services.user_stats import record_user_change, get_user_stats, reconcile_user_stats
+
+        mock_db["users"].aggregate = MagicMock(return_value=[])
+        reconcile_user_stats(mock_db)
+
+        record_user_change(mock_db, None, sample_user)
+        record_user_change(mock_db, sample_user, {**sample_user, "ativo": False})
+        record_user_change(mock_db, None, {**sample_user, "tipo": "Administrador"})
+        record_user_change(mock_db, {**sample_user, "tipo": "Administrador"}, None)
+
+        stats = get_user_stats(mock_db)
+        assert stats["ativos"] == {"Administrador": 0, "Cliente": 0}
+        assert stats["inativos"]["Cliente"] == 1
+        assert stats["updated_at"] >= stats["reconciled_at"]
+
+    def test_reconcile_corrects_drift(self, mock_db, sample_user):
+        from app.services.user_stats import record_user_change, reconcile_user_stats
+
+        users = mock_db["users"]
+        users.aggregate = MagicMock(return_value=[])
+        reconcile_user_stats(mock_db)
+        # Usuário inserido fora da API: o contador não viu a mudança
+        users.insert_one(sample_user)
+        users.aggregate = MagicMock(side_effect=lambda pipeline: self._group(users.data))
+
+        report = reconcile_user_stats(mock_db)
+
+        assert report["drift"] == {"ativos:Cliente": 1}
+        assert report["counts"]["ativos:Cliente"] == 1
+
+    def test_confirm_email_records_activation(self, client, mock_db, sample_user):
+        mock_db["users"].insert_one({
+            **sample_user, "ativo": False, "email_confirmado": False,
+            "token_confirmacao": "tok", "token_expiracao": None,
+        })
+
+        with patch("app.controllers.users_controller.send_welcome_email"), \
+                patch("app.controllers.users_controller.record_user_change") as record:
+            response = client.get("/api/users/confirm-email/tok")
+
+        assert response.status_code == 200
+        record.assert_called_once()
+        before, after = record.call_args[0][1:]
+        assert before["id"] == after["id"] == sample_user["id"]
+        assert after["ativo"] is True